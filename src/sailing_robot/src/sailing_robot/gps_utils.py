@@ -1,3 +1,8 @@
+from __future__ import division
+
+from collections import namedtuple
+import ctypes
+import math
 import os
 import struct
 import sys
@@ -51,6 +56,286 @@ def ubx_checksum(msg):
         b = (b + a) & 0xff
     return struct.pack('BB', a, b)
 
+class UBXChecksumError(ValueError):
+    pass
+
+# UBX message IDs (class, id)
+NAV_SOL = b'\x01\x06'
+NAV_PVT = b'\x01\x07'
+CFG_MSG = b'\x06\x01'
+CFG_RATE = b'\x06\x08'
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+
+def ecef_to_geodetic(x, y, z):
+    """Convert ECEF coordinates in m to (latitude, longitude, altitude).
+
+    Uses Bowring's formula, which is good to well under a mm near the surface.
+    """
+    p = math.hypot(x, y)
+    theta = math.atan2(z * WGS84_A, p * WGS84_B)
+    st, ct = math.sin(theta), math.cos(theta)
+    lat = math.atan2(z + WGS84_EP2 * WGS84_B * st ** 3,
+                     p - WGS84_E2 * WGS84_A * ct ** 3)
+    lon = math.atan2(y, x)
+    sin_lat = math.sin(lat)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    if abs(lat) < math.radians(89):
+        alt = p / math.cos(lat) - n
+    else:
+        alt = z / sin_lat - n * (1 - WGS84_E2)
+    return math.degrees(lat), math.degrees(lon), alt
+
+def ecef_to_ned_velocity(vx, vy, vz, lat, lon):
+    """Rotate an ECEF velocity into (north, east, down) at lat, lon (degrees)"""
+    sl, cl = math.sin(math.radians(lat)), math.cos(math.radians(lat))
+    so, co = math.sin(math.radians(lon)), math.cos(math.radians(lon))
+    v_n = -sl * co * vx - sl * so * vy + cl * vz
+    v_e = -so * vx + co * vy
+    v_d = -cl * co * vx - cl * so * vy - sl * vz
+    return v_n, v_e, v_d
+
+_NavPvtBase = namedtuple('NavPvt', [
+    'iTOW', 'year', 'month', 'day', 'hour', 'min', 'sec', 'valid', 'tAcc',
+    'nano', 'fixType', 'flags', 'flags2', 'numSV', 'lon', 'lat', 'height',
+    'hMSL', 'hAcc', 'vAcc', 'velN', 'velE', 'velD', 'gSpeed', 'headMot',
+    'sAcc', 'headAcc', 'pDOP'])
+
+class NavPvt(_NavPvtBase):
+    """Decoded UBX NAV-PVT (navigation position velocity time solution)
+
+    Fields have the names and units from the u-blox protocol spec. Only the
+    first 78 bytes of the payload are decoded, which covers what we use and
+    is the same in all protocol versions that have this message.
+    """
+    __slots__ = ()
+    STRUCT = struct.Struct('<IHBBBBBBIiBBBBiiiiIIiiiiiIIH')
+
+    @property
+    def fix_ok(self):
+        return bool(self.flags & 0x01) and self.fixType in (2, 3, 4)
+
+    @property
+    def time_valid(self):
+        return bool(self.valid & 0x02)
+
+    def position(self):
+        """(latitude, longitude, altitude above mean sea level in m)"""
+        return self.lat * 1e-7, self.lon * 1e-7, self.hMSL * 1e-3
+
+    def position_accuracy(self):
+        """(horizontal, vertical) accuracy estimates in m"""
+        return self.hAcc * 1e-3, self.vAcc * 1e-3
+
+    def ground_velocity(self):
+        """(speed in m/s, heading of motion in degrees)"""
+        return self.gSpeed * 1e-3, self.headMot * 1e-5
+
+_NavSolBase = namedtuple('NavSol', [
+    'iTOW', 'fTOW', 'week', 'gpsFix', 'flags', 'ecefX', 'ecefY', 'ecefZ',
+    'pAcc', 'ecefVX', 'ecefVY', 'ecefVZ', 'sAcc', 'pDOP', 'reserved1', 'numSV',
+    'reserved2'])
+
+class NavSol(_NavSolBase):
+    """Decoded UBX NAV-SOL (navigation solution, in ECEF coordinates)
+
+    Fields match msg/NaVSOL.msg.
+    """
+    __slots__ = ()
+    STRUCT = struct.Struct('<IihBBiiiIiiiIHBBI')
+
+    @property
+    def fix_ok(self):
+        return bool(self.flags & 0x01) and self.gpsFix in (2, 3, 4)
+
+    def position(self):
+        """(latitude, longitude, altitude above the ellipsoid in m)"""
+        return ecef_to_geodetic(self.ecefX * 1e-2, self.ecefY * 1e-2,
+                                self.ecefZ * 1e-2)
+
+    def position_accuracy(self):
+        """(horizontal, vertical) accuracy estimates in m
+
+        NAV-SOL only gives a 3D accuracy, so it's used for both.
+        """
+        return self.pAcc * 1e-2, self.pAcc * 1e-2
+
+    def ground_velocity(self, lat=None, lon=None):
+        """(speed in m/s, heading of motion in degrees)
+
+        Pass lat & lon if you already have them, to save converting the
+        position again.
+        """
+        if lat is None:
+            lat, lon, _ = self.position()
+        v_n, v_e, _ = ecef_to_ned_velocity(self.ecefVX * 1e-2, self.ecefVY * 1e-2,
+                                           self.ecefVZ * 1e-2, lat, lon)
+        return math.hypot(v_n, v_e), math.degrees(math.atan2(v_e, v_n)) % 360
+
+UBX_DECODERS = {
+    NAV_PVT: NavPvt,
+    NAV_SOL: NavSol,
+}
+
+def decode_ubx(frame):
+    """Decode a complete UBX frame, including the sync chars and checksum
+
+    Returns a NavPvt or NavSol object, or None for messages we don't decode,
+    including ones with a payload too short for their class & id (e.g. an
+    empty poll request echoed back). Raises UBXChecksumError if a frame
+    we'd decode is corrupted.
+    """
+    cls = UBX_DECODERS.get(bytes(frame[2:4]))
+    if cls is None:
+        return None
+    if ubx_checksum(frame[2:-2]) != bytes(frame[-2:]):
+        raise UBXChecksumError("Bad checksum in UBX message {!r}".format(frame))
+    if len(frame) - 8 < cls.STRUCT.size:
+        return None
+    return cls._make(cls.STRUCT.unpack_from(frame, 6))
+
+def cfg_msg(msg_id, rate):
+    """UBX CFG-MSG to set how often a message is sent on the current port.
+
+    msg_id is class & id as 2 bytes, e.g. NAV_PVT. rate is per navigation
+    solution, with 0 to turn the message off.
+    """
+    return UBXMessage(CFG_MSG, payload=msg_id + struct.pack('B', rate))
+
+# Messages that can be turned on or off in a GPS profile.
+# The NMEA messages are the ones a u-blox receiver sends by default.
+NMEA_MSG_IDS = {
+    'GGA': b'\xf0\x00', 'GLL': b'\xf0\x01', 'GSA': b'\xf0\x02',
+    'GSV': b'\xf0\x03', 'RMC': b'\xf0\x04', 'VTG': b'\xf0\x05',
+    'ZDA': b'\xf0\x08',
+}
+UBX_MSG_IDS = {'NAV-PVT': NAV_PVT, 'NAV-SOL': NAV_SOL}
+
+# Rough size of each message in bytes, to estimate the data rate.
+# GSV is usually sent as 3-4 sentences.
+APPROX_MSG_BYTES = {
+    'GGA': 75, 'GLL': 50, 'GSA': 65, 'GSV': 250, 'RMC': 70, 'VTG': 40,
+    'ZDA': 38, 'NAV-PVT': 100, 'NAV-SOL': 60,
+}
+
+# The highest navigation rate our receiver supports
+MAX_RATE_HZ = 10
+
+# What the receiver sends if the params don't say otherwise
+DEFAULT_GPS_RATE = 5
+DEFAULT_GPS_MESSAGES = {'GGA': 1, 'VTG': 1, 'ZDA': 8}
+
+def cfg_rate(rate_hz):
+    """UBX CFG-RATE to set the navigation solution rate, aligned to GPS time"""
+    if not 0 < rate_hz <= MAX_RATE_HZ:
+        raise ValueError("GPS rate must be between 0 and {} Hz, not {}"
+                         .format(MAX_RATE_HZ, rate_hz))
+    meas_rate_ms = int(round(1000 / rate_hz))
+    return UBXMessage(CFG_RATE, payload=struct.pack('<HHH', meas_rate_ms, 1, 1))
+
+def gps_profile(rate_hz, messages):
+    """UBX messages to set the rate and which messages the receiver sends
+
+    messages is a dict of message names (e.g. 'GGA', 'NAV-PVT') to how often
+    to send them, per navigation solution. The standard NMEA messages not
+    mentioned are turned off.
+    """
+    unknown = set(messages) - set(NMEA_MSG_IDS) - set(UBX_MSG_IDS)
+    if unknown:
+        raise ValueError("Unknown GPS messages: {}".format(sorted(unknown)))
+    msgs = [cfg_rate(rate_hz)]
+    for name in sorted(NMEA_MSG_IDS):
+        msgs.append(cfg_msg(NMEA_MSG_IDS[name], messages.get(name, 0)))
+    for name in sorted(UBX_MSG_IDS):
+        if name in messages:
+            msgs.append(cfg_msg(UBX_MSG_IDS[name], messages[name]))
+    return msgs
+
+def profile_bytes_per_second(rate_hz, messages):
+    """Estimate how much data the receiver will send with a profile"""
+    per_solution = sum(APPROX_MSG_BYTES[name] / rate
+                       for name, rate in messages.items() if rate)
+    return per_solution * rate_hz
+
+def fix_age(hour, minute, second, now):
+    """Seconds between a fix's UTC time of day and now (a UTC datetime)
+
+    The fix only has a time of day, so this assumes it was in the last
+    12 hours. It's only meaningful if the system clock is synchronised.
+    """
+    fix_s = hour * 3600 + minute * 60 + second
+    now_s = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond * 1e-6
+    return (now_s - fix_s + 43200) % 86400 - 43200
+
+class UbloxDDC(object):
+    """Read and write a u-blox receiver over I2C (which u-blox call DDC)
+
+    Rather than reading the data stream one byte per bus transaction, this
+    asks the receiver how many bytes it has waiting (registers 0xFD & 0xFE),
+    then reads them in as few transfers as possible. With an smbus2 bus,
+    that's a single i2c_rdwr transfer into a buffer allocated up front;
+    with the older smbus module, it's 32 byte block reads into a
+    preallocated bytearray.
+
+    read() returns a memoryview which is only valid until the next read.
+    """
+    BYTES_AVAILABLE_REG = 0xFD   # and 0xFE for the low byte
+    DATA_STREAM_REG = 0xFF
+    SMBUS_BLOCK_SIZE = 32
+
+    def __init__(self, bus, address=0x42, max_read=1024):
+        self.bus = bus
+        self.address = address
+        self.max_read = max_read
+        self._buf = bytearray(max_read)
+        self._view = memoryview(self._buf)
+        self._i2c_msg = None
+        if hasattr(bus, 'i2c_rdwr'):
+            from smbus2 import i2c_msg
+            self._i2c_msg = i2c_msg
+            self._read_msg = i2c_msg.read(address, max_read)
+
+    def bytes_available(self):
+        hi, lo = self.bus.read_i2c_block_data(self.address,
+                                              self.BYTES_AVAILABLE_REG, 2)
+        n = (hi << 8) | lo
+        # Some firmware versions report 0xFFFF briefly at startup
+        return 0 if n == 0xFFFF else n
+
+    def read(self):
+        """Read the data waiting in the receiver, up to max_read bytes"""
+        n = min(self.bytes_available(), self.max_read)
+        if n == 0:
+            return self._view[:0]
+
+        if self._i2c_msg is not None:
+            # After reading 0xFE, the register address stays on 0xFF, so we
+            # can read the stream without writing an address first.
+            msg = self._read_msg
+            msg.len = n
+            self.bus.i2c_rdwr(msg)
+            self._buf[:n] = ctypes.string_at(msg.buf, n)
+        else:
+            for i in range(0, n, self.SMBUS_BLOCK_SIZE):
+                size = min(self.SMBUS_BLOCK_SIZE, n - i)
+                self._buf[i:i + size] = bytearray(self.bus.read_i2c_block_data(
+                    self.address, self.DATA_STREAM_REG, size))
+        return self._view[:n]
+
+    def write(self, data):
+        """Send a message, e.g. a serialised UBXMessage, to the receiver"""
+        data = bytearray(data)
+        if self._i2c_msg is not None:
+            self.bus.i2c_rdwr(self._i2c_msg.write(self.address, data))
+        else:
+            # SMBus block writes send the first byte as a 'register' address
+            self.bus.write_i2c_block_data(self.address, data[0], list(data[1:]))
+
 def get_port():
     """The serial port for the GPS has different names on raspi 2 and 3.
     """
@@ -70,48 +355,104 @@ class UbxNmeaParser(object):
     supply newly read data, and .get_msgs() to get an iterator of bytes and
     pynmea2.NMEASentence objects representing messages already received.
     
-    At present, we're only interested in the content of the NMEA messages, so
-    we leave the UBX messages as raw bytes rather than attempting to parse them.
-    This may change in the future.
+    UBX messages are returned as raw bytes, unless decode_ubx is True. Then
+    the messages decode_ubx() understands (NAV-PVT and NAV-SOL) come out as
+    NavPvt and NavSol objects, and others still as bytes.
+
+    Data is kept in a single bytearray with a read cursor, so taking a message
+    doesn't copy the rest of the buffer. Consumed bytes are discarded in one
+    go once they make up most of the buffer. Searches for the end of an
+    incomplete message resume where the last search stopped, so data arriving
+    a few bytes at a time isn't scanned over and over.
     """
-    def __init__(self):
-        self.buf = b''
+    # Discard consumed data once there's at least this much of it
+    COMPACT_THRESHOLD = 4096
+
+    def __init__(self, decode_ubx=False):
+        self.decode_ubx = decode_ubx
+        self.reset()
+
+    def reset(self):
+        """Throw away all buffered data"""
+        self._buf = bytearray()
+        self._pos = 0   # Start of the unconsumed data
+        self._scan = 0  # Searches from _pos have already covered up to here
+
+    @property
+    def buf(self):
+        """The data received but not yet returned as a message"""
+        return bytes(self._buf[self._pos:])
+
+    @buf.setter
+    def buf(self, value):
+        self.reset()
+        self._buf += value
 
     def feed(self, data):
-        self.buf += data
+        if self._pos >= self.COMPACT_THRESHOLD and self._pos * 2 >= len(self._buf):
+            del self._buf[:self._pos]
+            self._scan -= self._pos
+            self._pos = 0
+        self._buf += data
 
-    def _take_chunk(self, n):
-        c, self.buf = self.buf[:n], self.buf[n:]
+    @property
+    def buffered_bytes(self):
+        """How many bytes have been received but not yet returned"""
+        return len(self._buf) - self._pos
+
+    def _take_chunk(self, end):
+        c = bytes(self._buf[self._pos:end])
+        self._pos = self._scan = end
         return c
 
     def _take_nmea(self):
-        crlf_ix = self.buf.find(b'\r\n')
+        # The terminator can't be before the '$', so resume from there at least
+        crlf_ix = self._buf.find(b'\r\n', max(self._scan - 1, self._pos + 1))
         if crlf_ix == -1:
+            self._scan = len(self._buf)
             return None   # Don't have a complete message yet
         data = self._take_chunk(crlf_ix + 2)
-        return NMEASentence.parse(data)
+        return NMEASentence.parse(data.decode('ascii'))
 
     def _take_ubx(self):
-        if len(self.buf) < 6:
+        pos = self._pos
+        if len(self._buf) - pos < 6:
             return None    # Don't have the length yet
-        payload_length = struct.unpack('<H', self.buf[4:6])[0]
+        payload_length = self._buf[pos + 4] | (self._buf[pos + 5] << 8)
         msg_length = payload_length + 8
-        if len(self.buf) >= msg_length:
-            return self._take_chunk(msg_length)
+        if len(self._buf) - pos >= msg_length:
+            frame = self._take_chunk(pos + msg_length)
+            if self.decode_ubx:
+                return decode_ubx(frame) or frame
+            return frame
+
+    def _take_junk(self):
+        # Anything up to the next start marker is returned as a chunk. If
+        # there's no marker yet, wait for more data.
+        start = max(self._scan - 1, self._pos + 1)
+        nmea_start = self._buf.find(b'$', start)
+        ubx_start = self._buf.find(b'\xb5b', start,
+                                   nmea_start if nmea_start != -1 else len(self._buf))
+        if ubx_start != -1:
+            return self._take_chunk(ubx_start)
+        elif nmea_start != -1:
+            return self._take_chunk(nmea_start)
+        self._scan = len(self._buf)
+        return None
 
     def _next_msg(self):
-        nmea_start = self.buf.find(b'$')
-        ubx_start = self.buf.find(b'\xb5b')
-        if nmea_start == 0:
+        buf, pos = self._buf, self._pos
+        if pos >= len(buf):
+            return None
+        first = buf[pos]
+        if first == 0x24:    # '$'
             return self._take_nmea()
-        elif ubx_start == 0:
-            return self._take_ubx()
-        elif (nmea_start > 0) and (ubx_start > 0):
-            return self._take_chunk(min(nmea_start, ubx_start))
-        elif nmea_start > 0:
-            return self._take_chunk(nmea_start)
-        elif ubx_start > 0:
-            return self._take_chunk(ubx_start)
+        elif first == 0xb5:
+            if pos + 1 >= len(buf):
+                return None   # Don't know if this is a UBX message yet
+            if buf[pos + 1] == 0x62:   # 'b'
+                return self._take_ubx()
+        return self._take_junk()
 
     def get_msgs(self):
         return iter(self._next_msg, None)
@@ -1,15 +1,13 @@
 from collections import deque
 import LatLon23 as ll
-import math
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point
 
-from .navigation import angleSum
+from .laylines import LAYLINE_EXTENT, LayTriangleCache, between_laylines
 from .taskbase import TaskBase
 from .heading_planning import TackVoting
 
-# For calculations, lay lines don't extend to infinity.
-# This is in m; 10km should be plenty for our purposes.
-LAYLINE_EXTENT = 10000
+# LAYLINE_EXTENT lives in laylines now, and is still available from here
+__all__ = ['HeadingPlan', 'LAYLINE_EXTENT']
 
 class HeadingPlan(TaskBase):
     def __init__(self, nav,
@@ -32,6 +30,7 @@ class HeadingPlan(TaskBase):
         x, y = self.nav.latlon_to_utm(waypoint.lat.decimal_degree, waypoint.lon.decimal_degree)
         self.waypoint_xy = Point(x, y)
         self.target_area = self.waypoint_xy.buffer(target_radius)
+        self._lay_triangle_cache = LayTriangleCache()
         self.sailing_state = 'normal'  # sailing state can be 'normal','switch_to_port_tack' or  'switch_to_stbd_tack'
         self.tack_voting = TackVoting(50, 35)
         self.tack_voting_radius = tack_voting_radius
@@ -94,7 +93,7 @@ class HeadingPlan(TaskBase):
         if wp_wind_angle * boat_wind_angle > 0:
             # These two have the same sign, so we're on the better tack already
             self.tack_voting.vote(on_port_tack)
-        elif self.nav.position_xy.within(self.lay_triangle()):
+        elif self.between_laylines():
             # We're between the laylines; stick to our current tack for now
             self.tack_voting.vote(on_port_tack)
         else:
@@ -127,18 +126,20 @@ class HeadingPlan(TaskBase):
         self.debug_pub('dbg_goal_wind_angle', goal_wind_angle)
         return state, self.nav.wind_angle_to_heading(goal_wind_angle)
 
+    def between_laylines(self):
+        """Is the boat between the lay lines for the current waypoint?"""
+        return between_laylines(self.nav.position_x, self.nav.position_y,
+                                self.waypoint_xy.x, self.waypoint_xy.y,
+                                self.nav.absolute_wind_direction(),
+                                self.nav.beating_angle)
+
     def lay_triangle(self):
         """Calculate the lay lines for the current waypoint.
-        
+
         This returns a shapely Polygon with the two lines extended to
-        LAYLINE_EXTENT (10km).
+        LAYLINE_EXTENT (10km). It's only needed for visualisation, so the
+        polygon is cached until the wind shifts noticeably.
         """
-        downwind = angleSum(self.nav.absolute_wind_direction(), 180)
-        x0, y0 = self.waypoint_xy.x, self.waypoint_xy.y
-        l1 = math.radians(angleSum(downwind, -self.nav.beating_angle))
-        x1 = x0 + (LAYLINE_EXTENT * math.sin(l1))
-        y1 = y0 + (LAYLINE_EXTENT * math.cos(l1))
-        l2 = math.radians(angleSum(downwind, self.nav.beating_angle))
-        x2 = x0 + (LAYLINE_EXTENT * math.sin(l2))
-        y2 = y0 + (LAYLINE_EXTENT * math.cos(l2))
-        return Polygon([(x0, y0), (x1, y1), (x2, y2)])
+        return self._lay_triangle_cache.get(
+            self.waypoint_xy.x, self.waypoint_xy.y,
+            self.nav.absolute_wind_direction(), self.nav.beating_angle)
@@ -0,0 +1,256 @@
+"""Rudder and sail demands worked out together, one tick at a time.
+
+HelmingEngine does what the helming node's loop does, without ROS: in the
+normal sailing state it steers to the goal heading with the PID controller,
+and during a tack or jibe it runs the manoeuvre procedures, choosing which to
+try with a ProcedureSelector. Each tick takes one snapshot of the inputs and
+gives both demands from it:
+
+    engine = HelmingEngine.from_params(rospy.get_param('rudder'),
+                                       rospy.get_param('procedure'), sail_table)
+    inputs = HelmInputs('normal', heading=90, goal_heading=100,
+                        wind_direction_apparent=45)
+    rudder, sailsheet = engine.tick(inputs)
+
+Procedures are timed with *clock*, so the engine can run in simulated time.
+"""
+from __future__ import division
+
+from collections import namedtuple
+import time
+
+from .navigation import angle_subtract
+from .pid_control import PID, saturation
+from .procedure_selector import ProcedureSelector
+
+# Sheet control
+WIND      = object()
+SHEET_IN  = object()
+SHEET_OUT = object()
+
+# Rudder control
+PID_GOAL_HEADING  = object()
+PID_ANGLE_TO_WIND = object() # set an angle to the wind, 0 being going torward the wind, can be either 0/360 or -180/180
+RUDDER_FULL_LEFT  = object() # the boat is going to the left
+RUDDER_FULL_RIGHT = object() # the boat is going to the right
+
+HelmInputs = namedtuple('HelmInputs', ['sailing_state', 'heading',
+                                       'goal_heading', 'wind_direction_apparent'])
+
+def sheet(control, offset=0.0):
+    """Sail command for a procedure: WIND (with offset), SHEET_IN/OUT or a value"""
+    return control, offset
+
+def rudder(control, angle_to_wind=0):
+    """Rudder command for a procedure"""
+    return control, angle_to_wind
+
+
+class ProcedureBase(object):
+    """A manoeuvre. loop() gives the (sheet, rudder) commands for one tick."""
+    def __init__(self, sailing_state, timeout, clock=time.time):
+        self.clock = clock
+        self.start_time = clock()
+        self.timeout = timeout
+        self.sailing_state = sailing_state
+
+    def has_failed(self):
+        """
+        Am I out of time?
+        """
+        return self.EnlapsedTime() > self.timeout
+
+    def EnlapsedTime(self):
+        return self.clock() - self.start_time
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class TackBasic(ProcedureBase):
+    """
+    Basic Tack procedure
+    """
+    def loop(self):
+        if self.sailing_state == "switch_to_port_tack":
+            return sheet(WIND), rudder(RUDDER_FULL_RIGHT)
+        else:
+            return sheet(WIND), rudder(RUDDER_FULL_LEFT)
+
+
+class JibeBasic(ProcedureBase):
+    """
+    Basic Jibe procedure
+    """
+    def loop(self):
+        # sheet out a bit more than what is given by the look up table
+        if self.sailing_state == "switch_to_port_tack":
+            return sheet(WIND, offset=+0.2), rudder(RUDDER_FULL_LEFT)
+        else:
+            return sheet(WIND, offset=+0.2), rudder(RUDDER_FULL_RIGHT)
+
+
+class TackSheetOut(ProcedureBase):
+    """
+    Tack procedure where we sheet out a bit
+
+    When sheeted in completely the jib has too much power and tacking becomes impossible
+    in some strong conditions. Hence sheeting out is needed, however if the sails are out
+    too much the boat will not have enough power to tack
+    """
+    def loop(self):
+        # sheet out a bit more than what is given by the look up table
+        if self.sailing_state == "switch_to_port_tack":
+            return sheet(WIND, offset=+0.2), rudder(RUDDER_FULL_RIGHT)
+        else:
+            return sheet(WIND, offset=+0.2), rudder(RUDDER_FULL_LEFT)
+
+
+class Tack_IncreaseAngleToWind(ProcedureBase):
+    """
+    More advance Tack procedure, building speed for 4s by going less upwind
+    """
+    beating_angle = 80
+
+    def loop(self):
+        if self.EnlapsedTime() < 4:
+            if self.sailing_state == "switch_to_port_tack":
+                return sheet(WIND), rudder(PID_ANGLE_TO_WIND, angle_to_wind=self.beating_angle)
+            else:
+                return sheet(WIND), rudder(PID_ANGLE_TO_WIND, angle_to_wind=360-self.beating_angle)
+        else:
+            if self.sailing_state == "switch_to_port_tack":
+                return sheet(WIND), rudder(RUDDER_FULL_RIGHT)
+            else:
+                return sheet(WIND), rudder(RUDDER_FULL_LEFT)
+
+
+def default_procedures(jibe_to_turn=False):
+    """Procedures in the order to try them before anything is known"""
+    if jibe_to_turn:
+        return [JibeBasic, TackBasic, TackSheetOut, Tack_IncreaseAngleToWind]
+    return [TackBasic, TackSheetOut, Tack_IncreaseAngleToWind, JibeBasic]
+
+
+class HelmingEngine(object):
+    """Rudder angle and sailsheet demands from one snapshot of the inputs.
+
+    on_event(event, procedure) is called with 'start', 'success' and 'fail'
+    as procedures run; context() gives the conditions to key the procedure
+    statistics by. Set record_results to False (e.g. under remote control)
+    to stop attempts from being recorded.
+    """
+    def __init__(self, sail_table, controller, max_angle, procedures,
+                 timeout=15, selector=None, clock=time.time, on_event=None,
+                 context=None):
+        self.sail_table = sail_table
+        self.controller = controller
+        self.max_angle = max_angle
+        self.procedures = dict((P.__name__, P) for P in procedures)
+        self.timeout = timeout
+        if selector is None:
+            selector = ProcedureSelector([P.__name__ for P in procedures],
+                                         cost_scale=1.5*timeout)
+        self.selector = selector
+        self.clock = clock
+        self.on_event = on_event or (lambda event, procedure: None)
+        self.context = context or (lambda: ())
+        self.record_results = True
+
+        self.order = list(selector.names)
+        self.procedure_context = self.context()
+        self.current_procedure_id = 0
+        self.current_procedure = None
+
+    @classmethod
+    def from_params(cls, rudder_params, procedure_params, sail_table,
+                    rate=None, clock=time.time, **kwargs):
+        """Engine from the 'rudder' and 'procedure' parameter groups
+
+        e.g. rospy.get_param('rudder'), rospy.get_param('procedure')
+        """
+        timeout = procedure_params.get('timeout', 15)
+        procedures = default_procedures(procedure_params.get('jibe_to_turn', False))
+        if 'selector' not in kwargs:
+            kwargs['selector'] = ProcedureSelector(
+                [P.__name__ for P in procedures],
+                method=procedure_params.get('selector', 'ucb1'),
+                cost_scale=1.5*timeout,
+                exploration=procedure_params.get('exploration_coefficient', 1.0),
+                max_count=10)
+        return cls(sail_table, PID.from_params(rudder_params, rate, clock),
+                   rudder_params['maxAngle'], procedures, timeout=timeout,
+                   clock=clock, **kwargs)
+
+    def tick(self, inputs, dt=None):
+        """Returns (rudder angle, normalised sailsheet) for a HelmInputs"""
+        if inputs.sailing_state == 'normal':
+            if self.current_procedure is not None:
+                # The manoeuvre is finished according to the high level
+                self._finish('success', self.current_procedure.EnlapsedTime())
+            sheet_cmd, rudder_cmd = sheet(WIND), rudder(PID_GOAL_HEADING)
+        else:
+            sheet_cmd, rudder_cmd = self._run_procedure(inputs.sailing_state)
+
+        return (self._rudder_angle(rudder_cmd, inputs, dt),
+                self._sheet_normalized(sheet_cmd, inputs))
+
+    def _run_procedure(self, sailing_state):
+        if self.current_procedure is None or \
+                self.current_procedure.sailing_state != sailing_state:
+            # We just decided to switch tack
+            self.procedure_context = self.context()
+            self.order = self.selector.rank(self.procedure_context)
+            self.current_procedure_id = 0
+            self._start(sailing_state)
+        elif self.current_procedure.has_failed():
+            self._finish('fail', 1.5*self.timeout)
+            # if time out we start the next procedure in the list
+            self.current_procedure_id = (self.current_procedure_id + 1) % len(self.order)
+            self._start(sailing_state)
+        return self.current_procedure.loop()
+
+    def _start(self, sailing_state):
+        P = self.procedures[self.order[self.current_procedure_id]]
+        self.current_procedure = P(sailing_state, self.timeout, self.clock)
+        self.on_event('start', self.current_procedure)
+
+    def _finish(self, event, cost):
+        if self.record_results:
+            self.selector.update(self.procedure_context,
+                                 str(self.current_procedure), cost)
+            self.on_event(event, self.current_procedure)
+        self.current_procedure = None
+
+    def _sheet_normalized(self, sheet_cmd, inputs):
+        control, offset = sheet_cmd
+        if control is WIND:
+            wind_direction = inputs.wind_direction_apparent % 360
+            if wind_direction > 180:
+                wind_direction = 360 - wind_direction
+            value = self.sail_table.interpolate_sail_setting(wind_direction) + offset
+        elif control is SHEET_IN:
+            value = 0
+        elif control is SHEET_OUT:
+            value = 1
+        else:
+            value = control
+        # be sure we don't publish values above 1 and below 0
+        return min(max(value, 0), 1)
+
+    def _rudder_angle(self, rudder_cmd, inputs, dt):
+        control, angle_to_wind = rudder_cmd
+        if control is PID_GOAL_HEADING:
+            rawangle = -self.controller.update_PID(
+                angle_subtract(inputs.heading, inputs.goal_heading), dt,
+                inputs.heading)
+        elif control is PID_ANGLE_TO_WIND:
+            # The error goes the other way to the wind direction
+            rawangle = -self.controller.update_PID(
+                angle_subtract(angle_to_wind, inputs.wind_direction_apparent), dt,
+                -inputs.wind_direction_apparent)
+        elif control is RUDDER_FULL_LEFT:
+            rawangle = self.max_angle
+        else:
+            rawangle = -self.max_angle
+        return int(saturation(rawangle, -self.max_angle, self.max_angle))
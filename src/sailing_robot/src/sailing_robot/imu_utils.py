@@ -8,7 +8,32 @@ First follow the procedure to enable I2C on R-Pi.
 4. Connect the I2C device to the SDA and SCL pins of the Raspberry Pi and detect it using the command "i2cdetect -y 1".  It should show up as 1D (typically) or 1E (if the jumper is set).
 """
 
-from smbus import SMBus
+import struct
+import time
+import numpy as np
+
+try:
+    from smbus import SMBus
+except ImportError:
+    # smbus2 is a pure Python replacement with the same interface
+    from smbus2 import SMBus
+
+# Accelerometer: 0.061 mg per bit at +/- 2g, to m/s^2
+ACC_SCALE = 0.061e-3 * 9.8
+
+def acc_to_base_frame(samples):
+    """Raw accelerometer readings (x, y, z, or rows of them) to m/s^2 in the
+    base frame, as published on minimu/data and minimu/acceleration_batch"""
+    acc = np.array(samples, dtype=float) * ACC_SCALE
+    acc[..., 1:] *= -1   # convert from IMU to base frame
+    return acc
+
+def acc_batch_rows(times, samples):
+    """Accelerations from the FIFO as an array of rows of (time, x, y, z)"""
+    rows = np.empty((len(samples), 4))
+    rows[:, 0] = times
+    rows[:, 1:] = acc_to_base_frame(samples)
+    return rows
 
 def twos_comp_combine(msb, lsb):
     twos_comp = 256*msb + lsb
@@ -91,10 +116,73 @@ LGD_FIELDS = {
     'GYRO_Z': (LGD_GYRO_Z_MSB, LGD_GYRO_Z_LSB),
 }
 
+# Block reads ----------------------------------------------------------
+
+# Setting the top bit of the register address makes both chips step through
+# the following registers, so one block read gets all three axes (X, Y, Z,
+# each LSB then MSB).
+AUTO_INCREMENT = 0x80
+XYZ_STRUCT = struct.Struct('<hhh')
+
+# Output data rates (Hz) -> register bits, from the datasheets
+LSM_ACC_ODR_BITS = {3.125: 0b0001, 6.25: 0b0010, 12.5: 0b0011, 25: 0b0100,
+                    50: 0b0101, 100: 0b0110, 200: 0b0111, 400: 0b1000}
+LSM_MAG_ODR_BITS = {3.125: 0b000, 6.25: 0b001, 12.5: 0b010, 25: 0b011,
+                    50: 0b100, 100: 0b101}
+
+# FIFO ---------------------------------------------------------------
+
+# Both chips have a 32 sample FIFO with the same control registers. On the
+# LSM303D it only holds accelerometer samples, not the magnetometer.
+LSM_FIFO_CTRL = 0x2E
+LSM_FIFO_SRC = 0x2F
+LSM_FIFO_EN = 0b01000000  # in LSM_CTRL_0
+LGD_FIFO_CTRL = 0x2E
+LGD_FIFO_SRC = 0x2F
+LGD_FIFO_EN = 0b01000000  # in LGD_CTRL_5
+
+FIFO_MODE_BYPASS = 0b000 << 5
+FIFO_MODE_STREAM = 0b010 << 5
+FIFO_SRC_OVERRUN = 0b01000000
+FIFO_SRC_LEVEL_MASK = 0b00011111
+FIFO_DEPTH = 32
+
+# L3GD20H output data rates (Hz) -> CTRL1 DR bits, with LOW_ODR off
+LGD_ODR_BITS = {100: 0b00, 200: 0b01, 400: 0b10, 800: 0b11}
+
+class FifoClock(object):
+    """Timestamps for samples drained from a FIFO running at a fixed rate
+
+    Samples are assumed to be evenly spaced at 1/odr. Each block follows on
+    from the last, unless that's more than a sample period away from when
+    the read says they were taken (e.g. after the FIFO overran), in which
+    case the newest sample is taken to be from the time of the read.
+    """
+    def __init__(self, odr):
+        self.dt = 1.0 / odr
+        self.next_t = None
+
+    def stamp(self, n, t_read):
+        first = t_read - (n - 1) * self.dt
+        if self.next_t is not None and abs(self.next_t - first) <= self.dt:
+            first = self.next_t
+        times = first + self.dt * np.arange(n)
+        if n:
+            self.next_t = times[-1] + self.dt
+        return times
+
+def odr_for_rate(rate, odr_bits):
+    """The slowest output data rate at least as fast as sampling at rate"""
+    candidates = [odr for odr in odr_bits if odr >= rate]
+    if not candidates:
+        raise ValueError("Can't sample at {} Hz; the fastest rate is {} Hz"
+                         .format(rate, max(odr_bits)))
+    return min(candidates)
+
 class ImuReader(object):
-    def __init__(self, bus_num, lsm_addr, lgd_addr):
+    def __init__(self, bus_num, lsm_addr, lgd_addr, bus=None):
         self.bus_num = bus_num
-        self.bus = SMBus(bus_num)
+        self.bus = SMBus(bus_num) if bus is None else bus
         self.lsm_addr = lsm_addr
         self.lgd_addr = lgd_addr
     
@@ -109,11 +197,26 @@ class ImuReader(object):
         else:
             raise Exception('No L3GD20H detected on bus on I2C bus %d.' % self.bus_num)
 
-    def configure_for_reading(self):
+    def configure_for_reading(self, rate=None):
+        """Turn on the sensors.
+
+        By default, the accelerometer runs at 50 Hz and the magnetometer at
+        6.25 Hz. If you'll sample faster than that, pass the sampling rate
+        and the output data rates will be raised to match.
+        """
+        acc_odr, mag_odr = 50, 6.25
+        if rate is not None:
+            mag_odr = odr_for_rate(rate, LSM_MAG_ODR_BITS)
+            # The magnetometer can only do 100 Hz if the accelerometer is faster than 50 Hz
+            acc_odr = odr_for_rate(max(rate, 50 if mag_odr < 100 else 100),
+                                   LSM_ACC_ODR_BITS)
+
         b = self.bus
-        b.write_byte_data(self.lsm_addr, LSM_CTRL_1, 0b1010111) # enable accelerometer, 50 hz sampling
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_1, # enable accelerometer, set sampling rate
+                          (LSM_ACC_ODR_BITS[acc_odr] << 4) | 0b111)
         b.write_byte_data(self.lsm_addr, LSM_CTRL_2, 0x00) #set +/- 2g full scale
-        b.write_byte_data(self.lsm_addr, LSM_CTRL_5, 0b01100100) #high resolution mode, thermometer off, 6.25hz ODR
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_5, #high resolution mode, thermometer off, set ODR
+                          0b01100000 | (LSM_MAG_ODR_BITS[mag_odr] << 2))
         b.write_byte_data(self.lsm_addr, LSM_CTRL_6, 0b00100000) # set +/- 4 gauss full scale
         b.write_byte_data(self.lsm_addr, LSM_CTRL_7, 0x00) #get magnetometer out of low power mode
 
@@ -143,3 +246,85 @@ class ImuReader(object):
         return (self.read_lgd_field('GYRO_X'),
                 self.read_lgd_field('GYRO_Y'),
                 self.read_lgd_field('GYRO_Z'))
+
+    def configure_fifo(self, acc_odr=100, gyro_odr=100, mag_odr=12.5):
+        """Turn on the sensors with the accelerometer and gyro FIFOs in stream mode
+
+        Use read_acc_fifo() and read_gyro_fifo() to get the queued samples.
+        They need draining at least every 32 samples (0.32 s at 100 Hz).
+        The magnetometer isn't buffered; read it with read_mag_field_block().
+        """
+        if mag_odr >= 100 and acc_odr <= 50:
+            raise ValueError("Magnetometer at 100 Hz needs accelerometer > 50 Hz")
+        b = self.bus
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_1, (LSM_ACC_ODR_BITS[acc_odr] << 4) | 0b111)
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_2, 0x00) #set +/- 2g full scale
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_5, 0b01100000 | (LSM_MAG_ODR_BITS[mag_odr] << 2))
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_6, 0b00100000) # set +/- 4 gauss full scale
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_7, 0x00) #get magnetometer out of low power mode
+        b.write_byte_data(self.lsm_addr, LSM_CTRL_0, LSM_FIFO_EN)
+        # Switching through bypass mode clears anything left in the FIFO
+        b.write_byte_data(self.lsm_addr, LSM_FIFO_CTRL, FIFO_MODE_BYPASS)
+        b.write_byte_data(self.lsm_addr, LSM_FIFO_CTRL, FIFO_MODE_STREAM)
+
+        b.write_byte_data(self.lgd_addr, LGD_CTRL_1, (LGD_ODR_BITS[gyro_odr] << 6) | 0x0F)
+        b.write_byte_data(self.lgd_addr, LGD_CTRL_5, LGD_FIFO_EN)
+        b.write_byte_data(self.lgd_addr, LGD_FIFO_CTRL, FIFO_MODE_BYPASS)
+        b.write_byte_data(self.lgd_addr, LGD_FIFO_CTRL, FIFO_MODE_STREAM)
+
+        self.acc_clock = FifoClock(acc_odr)
+        self.gyro_clock = FifoClock(gyro_odr)
+
+    def read_fifo(self, addr, src_reg, first_reg):
+        """Drain a FIFO, returning an (n, 3) array of raw X, Y, Z samples
+
+        With the FIFO on, auto-increment reads wrap from the last output
+        register back to the first, so consecutive samples come out of one
+        block read. SMBus limits those to 32 bytes, so we take 5 samples at
+        a time.
+        """
+        src = self.bus.read_byte_data(addr, src_reg)
+        n = FIFO_DEPTH if (src & FIFO_SRC_OVERRUN) else (src & FIFO_SRC_LEVEL_MASK)
+        data = bytearray()
+        for i in range(0, n, 5):
+            size = 6 * min(5, n - i)
+            data += bytearray(self.bus.read_i2c_block_data(
+                                    addr, first_reg | AUTO_INCREMENT, size))
+        return np.frombuffer(bytes(data), dtype='<i2').reshape(-1, 3)
+
+    def read_acc_fifo(self):
+        """Drain the accelerometer FIFO: returns (times, samples)
+
+        times is an array of n timestamps (from time.time()), and samples an
+        (n, 3) array of raw readings.
+        """
+        samples = self.read_fifo(self.lsm_addr, LSM_FIFO_SRC, LSM_ACC_X_LSB)
+        return self.acc_clock.stamp(len(samples), time.time()), samples
+
+    def read_gyro_fifo(self):
+        """Drain the gyro FIFO: returns (times, samples) like read_acc_fifo()"""
+        samples = self.read_fifo(self.lgd_addr, LGD_FIFO_SRC, LGD_GYRO_X_LSB)
+        return self.gyro_clock.stamp(len(samples), time.time()), samples
+
+    def read_xyz(self, addr, first_reg):
+        """Read X, Y & Z from one sensor in a single block read"""
+        data = self.bus.read_i2c_block_data(addr, first_reg | AUTO_INCREMENT, 6)
+        return XYZ_STRUCT.unpack(bytearray(data))
+
+    def read_mag_field_block(self):
+        return self.read_xyz(self.lsm_addr, LSM_MAG_X_LSB)
+
+    def read_acceleration_block(self):
+        return self.read_xyz(self.lsm_addr, LSM_ACC_X_LSB)
+
+    def read_gyro_block(self):
+        return self.read_xyz(self.lgd_addr, LGD_GYRO_X_LSB)
+
+    def read_all(self):
+        """Read magnetometer, accelerometer & gyro in three bus transactions
+
+        Returns three (x, y, z) tuples of raw readings: mag, acc, gyro.
+        """
+        return (self.read_mag_field_block(),
+                self.read_acceleration_block(),
+                self.read_gyro_block())
@@ -0,0 +1,47 @@
+"""Summary statistics for timing measurements, e.g. latencies in seconds"""
+from __future__ import division
+
+from collections import deque
+
+class LatencyWindow(object):
+    """Keeps the last *size* samples and reports percentiles over them.
+
+    Adding a sample is O(1); the summary sorts the window, so call it
+    occasionally (e.g. once every few seconds) rather than every sample.
+    """
+    def __init__(self, size=500):
+        self.samples = deque(maxlen=size)
+        self.total_count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total_count += 1
+
+    def __len__(self):
+        return len(self.samples)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Returns a dict with n, mean, max and pNN for each percentile.
+
+        Percentiles use the nearest-rank method. Returns None if there are no
+        samples yet.
+        """
+        if not self.samples:
+            return None
+        s = sorted(self.samples)
+        n = len(s)
+        res = {'n': n, 'mean': sum(s) / n, 'max': s[-1]}
+        for p in percentiles:
+            rank = max(int(-(-p * n // 100)), 1)   # ceil(p*n/100)
+            res['p%d' % p] = s[rank - 1]
+        return res
+
+def format_summary(name, summary, scale=1e3, unit='ms'):
+    """One line description of a LatencyWindow summary, for logging"""
+    if summary is None:
+        return '{}: no samples'.format(name)
+    pcts = sorted(k for k in summary if k.startswith('p'))
+    return '{}: n={} mean={:.1f}{unit} {} max={:.1f}{unit}'.format(
+        name, summary['n'], summary['mean'] * scale,
+        ' '.join('{}={:.1f}{}'.format(k, summary[k] * scale, unit) for k in pcts),
+        summary['max'] * scale, unit=unit)
@@ -0,0 +1,94 @@
+"""Lay line geometry shared by the waypoint tasks.
+
+The lay lines run downwind from a waypoint at +/- beating_angle either side of
+the downwind direction. Between them, the boat can reach the waypoint on its
+current tack, so there's no need to tack yet.
+"""
+
+import math
+from shapely.geometry import Polygon
+
+from .navigation import angleSum, angleAbsDistance
+
+# For calculations, lay lines don't extend to infinity.
+# This is in m; 10km should be plenty for our purposes.
+LAYLINE_EXTENT = 10000
+
+# Rebuild the cached lay triangle when the absolute wind direction has moved
+# by more than this, in degrees.
+LAY_TRIANGLE_WIND_THRESHOLD = 2.0
+
+def _layline_vectors(wind_direction, beating_angle):
+    """Unit vectors (x, y) along both lay lines and the downwind direction"""
+    downwind = angleSum(wind_direction, 180)
+    l1 = math.radians(angleSum(downwind, -beating_angle))
+    l2 = math.radians(angleSum(downwind, beating_angle))
+    dw = math.radians(downwind)
+    return ((math.sin(l1), math.cos(l1)),
+            (math.sin(l2), math.cos(l2)),
+            (math.sin(dw), math.cos(dw)))
+
+def between_laylines(x, y, wp_x, wp_y, wind_direction, beating_angle,
+                     extent=LAYLINE_EXTENT):
+    """Is the point (x, y) between the lay lines of a waypoint at (wp_x, wp_y)?
+
+    This gives the same answer as testing whether the point is within
+    lay_triangle(), using two cross products against the lay line rays (and a
+    projection for the far edge of the triangle) instead of building a
+    polygon.
+
+    wind_direction is the absolute wind direction in degrees.
+    """
+    (ax, ay), (bx, by), (dx, dy) = _layline_vectors(wind_direction,
+                                                    beating_angle)
+    vx = x - wp_x
+    vy = y - wp_y
+    # The point is inside the angle if it's on the same side of each ray as
+    # the other ray is.
+    side = ax * by - ay * bx
+    c1 = ax * vy - ay * vx
+    c2 = vx * by - vy * bx
+    if side > 0:
+        inside_angle = c1 > 0 and c2 > 0
+    else:
+        inside_angle = c1 < 0 and c2 < 0
+    if not inside_angle:
+        return False
+
+    # Far edge of the triangle, joining the ends of the two lay lines
+    far_edge = extent * math.cos(math.radians(beating_angle))
+    return (vx * dx + vy * dy) < far_edge
+
+def lay_triangle(wp_x, wp_y, wind_direction, beating_angle,
+                 extent=LAYLINE_EXTENT):
+    """Calculate the lay lines for a waypoint.
+
+    This returns a shapely Polygon with the two lines extended to
+    LAYLINE_EXTENT (10km).
+    """
+    (ax, ay), (bx, by), _ = _layline_vectors(wind_direction, beating_angle)
+    return Polygon([(wp_x, wp_y),
+                    (wp_x + extent * ax, wp_y + extent * ay),
+                    (wp_x + extent * bx, wp_y + extent * by)])
+
+class LayTriangleCache(object):
+    """Keeps a lay triangle polygon for visualisation.
+
+    The polygon is only rebuilt when the waypoint or beating angle changes,
+    or when the wind direction has moved by more than *threshold* degrees.
+    """
+    def __init__(self, threshold=LAY_TRIANGLE_WIND_THRESHOLD):
+        self.threshold = threshold
+        self.polygon = None
+        self._key = None
+        self._wind_direction = None
+
+    def get(self, wp_x, wp_y, wind_direction, beating_angle):
+        key = (wp_x, wp_y, beating_angle)
+        if (self.polygon is None) or (key != self._key) or \
+                angleAbsDistance(wind_direction, self._wind_direction) > self.threshold:
+            self.polygon = lay_triangle(wp_x, wp_y, wind_direction,
+                                        beating_angle)
+            self._key = key
+            self._wind_direction = wind_direction
+        return self.polygon
@@ -0,0 +1,186 @@
+"""Monte-Carlo evaluation of a course with the fast-time simulator.
+
+Runs the same waypoint file many times with randomised wind direction, wind
+noise and water stream, spread over a pool of processes, and prints a
+summary table:
+
+    python -m sailing_robot.montecarlo default.yaml simulator.yaml \\
+        sailsettings_laser.yaml Calshot_TriangleRace.yaml -n 500 -j 8
+
+Each run is seeded from --seed and its index, so results are reproducible
+whatever the number of processes. With --profile, the time taken by each step
+of TasksRunner.calculate_state_and_goal is reported over all runs.
+"""
+from __future__ import division, print_function
+
+import multiprocessing
+import time
+import numpy as np
+
+from .profiling import PhaseProfiler
+from .sim import FastTimeSimulation, load_params
+
+# Parameters shared by all runs in a worker process, set by _init_worker
+_params = None
+_duration = None
+_dt = None
+_quiet = True
+_profile = False
+
+def _init_worker(params, duration, dt, quiet, profile=False):
+    global _params, _duration, _dt, _quiet, _profile
+    _params = params
+    _duration = duration
+    _dt = dt
+    _quiet = quiet
+    _profile = profile
+
+def random_conditions(rng, wind_direction_range=(0, 360),
+                      noise_direction_max=20, water_stream_max=0.5):
+    """Pick the randomised conditions for one run"""
+    return {
+        'wind_direction': rng.uniform(*wind_direction_range),
+        'noise_direction_range': rng.uniform(0, noise_direction_max),
+        'water_stream_speed': rng.uniform(0, water_stream_max),
+        'water_stream_direction': rng.uniform(0, 360),
+    }
+
+def run_one(job):
+    """Simulate one run. job is (index, seed, conditions); returns a dict.
+
+    When profiling, the dict has the run's PhaseProfiler as 'profile'.
+    """
+    index, seed, conditions = job
+    res = dict(conditions, index=index, finished=False, error=None,
+               time=np.nan, tacks=0, safety_zone_excursions=0, profile=None)
+    try:
+        sim = FastTimeSimulation.from_params(
+            _params, rng=np.random.RandomState(seed), quiet=_quiet, **conditions)
+        if _profile:
+            res['profile'] = sim.tasks_runner.enable_profiling(PhaseProfiler())
+        r = sim.run(_duration, dt=_dt)
+    except Exception as e:
+        res['error'] = '{}: {}'.format(type(e).__name__, e)
+        return res
+
+    res.update(finished=r.finished, time=r.time, tacks=r.tacks,
+               safety_zone_excursions=r.safety_zone_excursions)
+    return res
+
+def run_many(params, n_runs, processes=None, seed=0, duration=3600, dt=None,
+             quiet=True, profile=False, **condition_kwargs):
+    """Run n_runs randomised simulations in a process pool.
+
+    processes=None uses one process per core; processes=1 runs everything
+    in this process, which is handy for debugging. Returns a list of result dicts, ordered by run index.
+    """
+    if dt is None:
+        dt = 1.0 / params.get('config/rate', 10)
+    rng = np.random.RandomState(seed)
+    jobs = []
+    for i in range(n_runs):
+        conditions = random_conditions(rng, **condition_kwargs)
+        jobs.append((i, seed * 100003 + i, conditions))
+
+    initargs = (params, duration, dt, quiet, profile)
+    if processes == 1:
+        _init_worker(*initargs)
+        results = [run_one(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, initargs)
+        try:
+            chunksize = max(1, n_runs // (4 * (processes or multiprocessing.cpu_count())))
+            results = list(pool.imap_unordered(run_one, jobs, chunksize))
+        finally:
+            pool.close()
+            pool.join()
+
+    return sorted(results, key=lambda r: r['index'])
+
+def summarise(results, sectors=8):
+    """Aggregate results by wind direction sector, plus an overall row.
+
+    Returns a list of (label, stats dict) pairs.
+    """
+    width = 360 / sectors
+    groups = [('{:3.0f}-{:3.0f}'.format(i * width, (i + 1) * width), [])
+              for i in range(sectors)]
+    for r in results:
+        groups[int(r['wind_direction'] // width) % sectors][1].append(r)
+    groups.append(('all', results))
+
+    rows = []
+    for label, rs in groups:
+        if not rs:
+            continue
+        finished = [r for r in rs if r['finished']]
+        times = np.array([r['time'] for r in finished])
+        rows.append((label, {
+            'runs': len(rs),
+            'finished': len(finished),
+            'failures': len(rs) - len(finished),
+            'errors': sum(r['error'] is not None for r in rs),
+            'time_mean': times.mean() if len(times) else np.nan,
+            'time_p90': np.percentile(times, 90) if len(times) else np.nan,
+            'tacks_mean': np.mean([r['tacks'] for r in rs]),
+            'excursions': sum(r['safety_zone_excursions'] for r in rs),
+        }))
+    return rows
+
+def format_summary(rows):
+    header = '{:>9} {:>5} {:>8} {:>8} {:>6} {:>9} {:>9} {:>6} {:>10}'.format(
+        'wind', 'runs', 'finished', 'failures', 'errors', 'time_mean',
+        'time_p90', 'tacks', 'excursions')
+    lines = [header, '-' * len(header)]
+    for label, s in rows:
+        lines.append('{:>9} {:5d} {:8d} {:8d} {:6d} {:9.1f} {:9.1f} {:6.1f} {:10d}'
+                     .format(label, s['runs'], s['finished'], s['failures'],
+                             s['errors'], s['time_mean'], s['time_p90'],
+                             s['tacks_mean'], s['excursions']))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Evaluate a course over many randomised simulated runs")
+    parser.add_argument('params', nargs='+', help="parameter YAML files")
+    parser.add_argument('-n', '--runs', type=int, default=100)
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=3600,
+                        help="simulated seconds before a run counts as failed")
+    parser.add_argument('--dt', type=float, default=None)
+    parser.add_argument('--noise-direction-max', type=float, default=20,
+                        help="max. wind direction noise (degrees)")
+    parser.add_argument('--water-stream-max', type=float, default=0.5,
+                        help="max. water stream speed (m/s)")
+    parser.add_argument('--sectors', type=int, default=8,
+                        help="wind direction sectors in the summary table")
+    parser.add_argument('--profile', action='store_true',
+                        help="time each step of TasksRunner.calculate_state_and_goal")
+    args = parser.parse_args(argv)
+
+    params = load_params(*args.params)
+    t0 = time.time()
+    results = run_many(params, args.runs, processes=args.processes,
+                       seed=args.seed, duration=args.duration, dt=args.dt,
+                       profile=args.profile,
+                       noise_direction_max=args.noise_direction_max,
+                       water_stream_max=args.water_stream_max)
+    elapsed = time.time() - t0
+
+    print(format_summary(summarise(results, args.sectors)))
+    print("\n{} runs in {:.1f}s".format(len(results), elapsed))
+    if args.profile:
+        profiler = PhaseProfiler()
+        for r in results:
+            if r['profile'] is not None:
+                profiler.merge(r['profile'])
+        print('\n'.join(profiler.report()))
+    for r in results:
+        if r['error']:
+            print("Run {} failed: {}".format(r['index'], r['error']))
+
+if __name__ == '__main__':
+    main()
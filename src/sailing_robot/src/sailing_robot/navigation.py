@@ -1,9 +1,24 @@
 """Common navigation machinery used by different modules"""
 
+from collections import deque
 import math
+import numpy as np
 from LatLon23 import LatLon
 from pyproj import Proj
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point
+
+from .safety_zone import SafetyZoneIndex
+from . import navigation_vec as vec
+
+try:
+    from shapely import contains_xy
+except ImportError:
+    # Shapely < 2.0
+    from shapely.vectorized import contains as contains_xy
+
+# vec (navigation_vec) is re-exported, for the array versions of the functions
+__all__ = ['Navigation', 'angleSum', 'angleAbsDistance', 'angle_subtract',
+           'angle_average', 'RunningCircularMean', 'vec']
 
 class Navigation(object):
     """Common navigation machinery used by different modules.
@@ -26,30 +41,83 @@ class Navigation(object):
             the bounding box.
         """
         self.projection = Proj(proj='utm', zone=utm_zone, ellps='WGS84')
-        self.position_ll = ll = LatLon(50.8, 1.02)
-        x, y = self.latlon_to_utm(ll.lat.decimal_degree, ll.lon.decimal_degree)
-        self.position_xy = Point(x, y)
+        self.set_position(50.8, 1.02)
         self.heading = 0.
         self.wind_direction = 0.
         self.beating_angle = beating_angle
         self.safety_zone_ll = safety_zone_ll
         self.safety_zone_margin = safety_zone_margin
+        self.safety_zone_distance = None
         if safety_zone_ll:
-            self.safety_zone = Polygon([
-                self.latlon_to_utm(*p) for p in safety_zone_ll
-            ])
-            self.safety_zone_inner = self.safety_zone.buffer(-safety_zone_margin)
+            self.safety_zone_index = SafetyZoneIndex(
+                [self.latlon_to_utm(*p) for p in safety_zone_ll],
+                safety_zone_margin)
+            self.safety_zone = self.safety_zone_index.zone
+            self.safety_zone_inner = self.safety_zone_index.inner
         else:
+            self.safety_zone_index = None
             self.safety_zone = self.safety_zone_inner = None
     
     def update_position(self, msg):
-        self.position_ll = LatLon(msg.latitude, msg.longitude)
-        x, y = self.latlon_to_utm(msg.latitude, msg.longitude)
-        self.position_xy = Point(x, y)
+        self.set_position(msg.latitude, msg.longitude)
+
+    def set_position(self, lat, lon):
+        """Store a new position as plain floats.
+
+        This runs for every GPS fix, so it avoids building any objects. The
+        LatLon and Point views (position_ll, position_xy) are only created if
+        something asks for them.
+        """
+        self.position_lat = lat
+        self.position_lon = lon
+        self.position_x, self.position_y = self.projection(lon, lat)
+        self._position_ll = None
+        self._position_xy = None
+
+    @property
+    def position_ll(self):
+        """Current position as a LatLon object"""
+        if self._position_ll is None:
+            self._position_ll = LatLon(self.position_lat, self.position_lon)
+        return self._position_ll
+
+    @position_ll.setter
+    def position_ll(self, ll):
+        self.position_lat = ll.lat.decimal_degree
+        self.position_lon = ll.lon.decimal_degree
+        self._position_ll = ll
+
+    @property
+    def position_xy(self):
+        """Current position as a shapely Point in UTM coordinates"""
+        if self._position_xy is None:
+            self._position_xy = Point(self.position_x, self.position_y)
+        return self._position_xy
+
+    @position_xy.setter
+    def position_xy(self, p):
+        # Accept a shapely Point or an (x, y) pair
+        if hasattr(p, 'x'):
+            self.position_x, self.position_y = p.x, p.y
+            self._position_xy = p
+        else:
+            # The getter makes a Point from the floats when it's needed
+            self.position_x, self.position_y = p
+            self._position_xy = None
 
     def latlon_to_utm(self, lat, lon):
         """Returns (x, y) coordinates in metres"""
         return self.projection(lon, lat)
+
+    def latlon_to_utm_many(self, lat, lon):
+        """Convert arrays of lat/lon to UTM in a single projection call.
+
+        Returns an (N, 2) array of (x, y) coordinates in metres.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        x, y = self.projection(lon, lat)
+        return np.column_stack((x, y))
     
     def utm_to_latlon(self, x, y):
         """Returns a LatLon object"""
@@ -94,27 +162,58 @@ class Navigation(object):
         0 : Comfortably inside the safety zone (or no safety zone specified)
         1 : Inside the safety zone, but in the margin
         2 : Outside the safety zone
+
+        The signed distance to the edge of the zone (positive inside) is
+        stored in self.safety_zone_distance.
         """
-        if self.safety_zone is None:
+        if self.safety_zone_index is None:
             return 0
 
-        if self.position_xy.within(self.safety_zone_inner):
-            return 0
-        if self.position_xy.within(self.safety_zone):
-            return 1
-        return 2
+        status, self.safety_zone_distance = self.safety_zone_index.check(
+                                            self.position_x, self.position_y)
+        return status
+
+    def check_safety_zone_many(self, xy):
+        """Vectorised check_safety_zone for an (N, 2) array of x/y positions.
+
+        Returns an array of ints, with the same meaning as check_safety_zone().
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        res = np.zeros(len(xy), dtype=int)
+        if self.safety_zone is None:
+            return res
+
+        x, y = xy[:, 0], xy[:, 1]
+        res[~contains_xy(self.safety_zone, x, y)] = 2
+        in_margin = (res == 0) & ~contains_xy(self.safety_zone_inner, x, y)
+        res[in_margin] = 1
+        return res
 
     def distance_and_heading(self, wp):
         """Calculate the distance and heading from current position to wp.
 
         wp should both be a shapely.geometry.Point object
         """
-        dx = wp.x - self.position_xy.x
-        dy = wp.y - self.position_xy.y
+        dx = wp.x - self.position_x
+        dy = wp.y - self.position_y
         d = (dx**2 + dy**2) ** 0.5
         h = math.degrees(math.atan2(dx, dy)) % 360
         return d, h
 
+    @staticmethod
+    def distance_and_heading_many(xy, wp):
+        """Distance and heading to wp from each row of an (N, 2) x/y array.
+
+        wp should be a shapely.geometry.Point object. Returns two arrays:
+        distances in metres and headings in degrees (0-360).
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        dx = wp.x - xy[:, 0]
+        dy = wp.y - xy[:, 1]
+        d = np.hypot(dx, dy)
+        h = np.degrees(np.arctan2(dx, dy)) % 360
+        return d, h
+
 ################
 # General utility functions
 ################
@@ -148,3 +247,49 @@ def angle_average(angle_list):
     """
     return math.degrees(math.atan2(sum([ math.sin(math.radians(x)) for x in angle_list]),
                                    sum([ math.cos(math.radians(x)) for x in angle_list]))) % 360
+
+class RunningCircularMean(object):
+    """Average of the last *size* angles, updated in O(1) per new angle
+
+    This gives the same result as angle_average() over the window, but keeps
+    running sums of the sines and cosines instead of recalculating them.
+    Adding and subtracting floats lets rounding errors build up, so the sums
+    are recalculated from scratch every *resync_every* pushes (by default,
+    once per window length).
+    """
+    def __init__(self, size, resync_every=None):
+        self.size = size
+        self.resync_every = resync_every or size
+        self.values = deque()
+        self.sum_sin = 0.
+        self.sum_cos = 0.
+        self._since_resync = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, angle):
+        """Add an angle in degrees, dropping the oldest if the window is full"""
+        r = math.radians(angle)
+        s, c = math.sin(r), math.cos(r)
+        self.values.append((s, c))
+        self.sum_sin += s
+        self.sum_cos += c
+        if len(self.values) > self.size:
+            old_s, old_c = self.values.popleft()
+            self.sum_sin -= old_s
+            self.sum_cos -= old_c
+
+        self._since_resync += 1
+        if self._since_resync >= self.resync_every:
+            self.resync()
+
+    def resync(self):
+        """Recalculate the sums from the stored values"""
+        self.sum_sin = math.fsum(s for s, _ in self.values)
+        self.sum_cos = math.fsum(c for _, c in self.values)
+        self._since_resync = 0
+
+    def mean(self):
+        """The average angle in degrees, 0 <= result < 360"""
+        return math.degrees(math.atan2(self.sum_sin, self.sum_cos)) % 360
@@ -0,0 +1,34 @@
+"""Array versions of the angle functions in navigation
+
+These take NumPy arrays (or anything np.asarray accepts, including scalars)
+and work elementwise, with the same wrap-around rules as the scalar
+functions of the same names. They're also available as navigation.vec, e.g.
+
+    from sailing_robot.navigation import vec
+    errors = vec.angle_subtract(headings, goal_headings)
+"""
+import numpy as np
+
+def angleSum(a, b):
+    """Add angles in degrees, returning values mod 360"""
+    return np.mod(np.add(a, b), 360)
+
+def angleAbsDistance(a, b):
+    """Magnitude of the difference between angles, between 0 and 180"""
+    a = np.asarray(a)
+    b = np.asarray(b)
+    return np.minimum(np.mod(a - b, 360), np.mod(b - a, 360))
+
+def angle_subtract(a, b):
+    """Difference between angles, between -180 (if a<b) and +180 (if a>b)"""
+    res = np.mod(np.subtract(a, b), 360)
+    return np.where(res > 180, res - 360, res)
+
+def angle_average(angles, axis=-1):
+    """Average angle along an axis (the result is % 360)
+
+    Like navigation.angle_average, an empty set of angles averages to 0.
+    """
+    r = np.radians(angles)
+    return np.degrees(np.arctan2(np.sin(r).sum(axis=axis),
+                                 np.cos(r).sum(axis=axis))) % 360
@@ -4,8 +4,13 @@ This is a mostly literal C++ -> Python translation of the ROS
 control_toolbox Pid class: http://ros.org/wiki/control_toolbox.
 """
 
+from __future__ import division
+
 import time
 import math
+import numpy as np
+
+from . import navigation_vec
 
 #*******************************************************************
 # Translated from pid.cpp by Nathan Sprague
@@ -72,9 +77,20 @@ class PID(object):
     given:
 
     $ p_{error} = p_{state} - p_{target} $.
+
+    Options beyond the original class:
+
+    - The time between updates comes from *clock* (time.time by default,
+      rospy.get_time to follow simulated time), or is always *fixed_dt*.
+    - With derivative_on_measurement, the derivative is taken of p_state
+      rather than the error, so changing the target doesn't kick the output.
+    - d_filter_tau (s) low-pass filters the derivative, for noisy sensors.
+    - diff(a, b) replaces a - b in the derivative, e.g. to wrap angles.
     """
 
-    def __init__(self, p_gain, i_gain, d_gain, i_max, i_min):
+    def __init__(self, p_gain, i_gain, d_gain, i_max, i_min, clock=time.time,
+                 fixed_dt=None, derivative_on_measurement=False,
+                 d_filter_tau=0.0, diff=None):
         """Constructor, zeros out Pid values when created and
         initialize Pid-gains and integral term limits.
 
@@ -84,10 +100,47 @@ class PID(object):
           d_gain     The derivative gain.
           i_max      The integral upper limit.
           i_min      The integral lower limit.
+          clock      Function giving the time in seconds, used if dt is
+                     not passed to update_PID and fixed_dt is None.
+          fixed_dt   Time step in seconds to use for every update.
+          derivative_on_measurement
+                     Use the p_state passed to update_PID for the
+                     derivative, rather than the error.
+          d_filter_tau
+                     Time constant in seconds of a first order low-pass
+                     filter on the derivative (0 for no filter).
+          diff       Function giving the difference of two values, a - b,
+                     for the derivative. It must work elementwise on arrays
+                     for simulate().
         """
         self.set_gains(p_gain, i_gain, d_gain, i_max, i_min)
+        self._clock = clock
+        self.fixed_dt = fixed_dt
+        self.derivative_on_measurement = derivative_on_measurement
+        self.d_filter_tau = d_filter_tau
+        self._diff = diff
         self.reset()
 
+    @classmethod
+    def from_params(cls, rudder, rate=None, clock=time.time):
+        """Rudder controller from the 'rudder' parameter group.
+
+        rudder/control/Kp, Ki and Kd are required. Optional:
+        rudder/control/fixed_step (use 1/rate as dt),
+        rudder/control/derivative_on_measurement and
+        rudder/control/d_filter_tau. Differences are taken as angles.
+        """
+        control = rudder['control']
+        fixed_dt = None
+        if control.get('fixed_step', False) and rate:
+            fixed_dt = 1.0 / rate
+        return cls(control['Kp'], control['Ki'], control['Kd'],
+                   rudder['maxAngle'], -rudder['maxAngle'], clock=clock,
+                   fixed_dt=fixed_dt,
+                   derivative_on_measurement=control.get('derivative_on_measurement', False),
+                   d_filter_tau=control.get('d_filter_tau', 0.0),
+                   diff=navigation_vec.angle_subtract)
+
     def reset(self):
         """  Reset the state of this PID controller """
         self._p_error_last = 0.0 # Save position state for derivative
@@ -97,6 +150,7 @@ class PID(object):
         self._i_error = 0.0 # Integator error.
         self._cmd = 0.0 # Command to send.
         self._last_time = None # Used for automatic calculation of dt.
+        self._p_state_last = None # For the derivative on measurement.
 
     def set_gains(self, p_gain, i_gain, d_gain, i_max, i_min):
         """ Set PID gains for the controller.
@@ -174,21 +228,26 @@ class PID(object):
         result += "cmd:     " + str(self.cmd) + "\n"
         return result
 
-    def update_PID(self, p_error, dt=None):
+    def update_PID(self, p_error, dt=None, p_state=None):
         """  Update the Pid loop with nonuniform time step size.
 
         Parameters:
           p_error  Error since last call (p_state - p_target)
           dt       Change in time since last call, in seconds, or None.
-                   If dt is None, then the system clock will be used to
-                   calculate the time since the last update.
+                   If dt is None, then fixed_dt is used, or the clock
+                   to calculate the time since the last update.
+          p_state  The measured value, needed for the derivative on
+                   measurement.
         """
         if dt == None:
-            cur_time = time.time()
-            if self._last_time is None:
+            if self.fixed_dt is not None:
+                dt = self.fixed_dt
+            else:
+                cur_time = self._clock()
+                if self._last_time is None:
+                    self._last_time = cur_time
+                dt = cur_time - self._last_time
                 self._last_time = cur_time
-            dt = cur_time - self._last_time
-            self._last_time = cur_time
 
         self._p_error = p_error # this is pError = pState-pTarget
         if dt == 0 or math.isnan(dt) or math.isinf(dt):
@@ -212,9 +271,22 @@ class PID(object):
             self._i_error = i_term / self._i_gain
 
         # Calculate the derivative error
-        self._d_error = (self._p_error - self._p_error_last) / dt
+        if self.derivative_on_measurement and p_state is not None:
+            if self._p_state_last is None:
+                d_error = 0.0
+            else:
+                d_error = self._difference(p_state, self._p_state_last) / dt
+            self._p_state_last = p_state
+        else:
+            d_error = self._difference(self._p_error, self._p_error_last) / dt
         self._p_error_last = self._p_error
 
+        if self.d_filter_tau > 0:
+            alpha = dt / (self.d_filter_tau + dt)
+            self._d_error += alpha * (d_error - self._d_error)
+        else:
+            self._d_error = d_error
+
         # Calculate derivative contribution to command
         d_term = self._d_gain * self._d_error
 
@@ -222,6 +294,86 @@ class PID(object):
 
         return self._cmd
 
+    def _difference(self, a, b):
+        if self._diff is None:
+            return a - b
+        return float(self._diff(a, b))
+
+    def simulate(self, errors, dt, p_states=None):
+        """Commands for a whole sequence of errors at a fixed time step.
+
+        This gives the same results as calling update_PID(errors[k], dt,
+        p_states[k]) in turn on a freshly reset controller, using NumPy
+        for the whole sequence at once. It's for tuning the gains on
+        recorded errors; the controller's own state is not changed.
+        """
+        e = np.asarray(errors, dtype=float)
+        n = len(e)
+        if n == 0:
+            return np.zeros(0)
+        diff = self._diff if self._diff is not None else np.subtract
+
+        p_term = self._p_gain * e
+
+        if self._i_gain != 0:
+            lo, hi = sorted([self._i_min / self._i_gain,
+                             self._i_max / self._i_gain])
+            i_term = self._i_gain * _clamped_cumsum(dt * e, lo, hi)
+        else:
+            i_term = np.zeros(n)
+
+        if self.derivative_on_measurement and p_states is not None:
+            x = np.asarray(p_states, dtype=float)
+            d_error = np.zeros(n)
+            d_error[1:] = diff(x[1:], x[:-1]) / dt
+        else:
+            d_error = diff(e, np.concatenate(([0.0], e[:-1]))) / dt
+
+        if self.d_filter_tau > 0:
+            from scipy.signal import lfilter
+            alpha = dt / (self.d_filter_tau + dt)
+            d_error = lfilter([alpha], [1, alpha - 1], d_error)
+
+        return -p_term - i_term - self._d_gain * d_error
+
+def _clamped_cumsum(steps, lo, hi, min_block=16, max_block=4096):
+    """Running sum of steps starting from 0, clamped to [lo, hi] at each step.
+
+    Between touching one limit and the other, the sum can only be held at
+    one of them, which has a closed form using a running maximum. So this
+    takes one NumPy pass for each swing from one limit to the other. Passes
+    look ahead over a block of steps which doubles while there are no swings,
+    so frequent swings don't mean scanning the whole sequence each time.
+    """
+    n = len(steps)
+    out = np.empty(n)
+    start = 0
+    x0 = 0.0
+    upper = True   # Which limit might be holding the sum back
+    block = min_block
+    while start < n:
+        s = x0 + np.cumsum(steps[start:start + block])
+        if upper:
+            x = s - np.maximum.accumulate(np.maximum(s - hi, 0))
+            crossed = np.flatnonzero(x < lo)
+        else:
+            x = s + np.maximum.accumulate(np.maximum(lo - s, 0))
+            crossed = np.flatnonzero(x > hi)
+        if len(crossed) == 0:
+            out[start:start + len(x)] = x
+            x0 = x[-1]
+            start += len(x)
+            block = min(block * 2, max_block)
+            continue
+        k = crossed[0]
+        out[start:start + k] = x[:k]
+        x0 = lo if upper else hi
+        out[start + k] = x0
+        start += k + 1
+        upper = not upper
+        block = min_block
+    return out
+
 if __name__ == "__main__":
     controller = PID(1.0, 2.0, 3.0, 1.0, -1.0)
     print(controller)
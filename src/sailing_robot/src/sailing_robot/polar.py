@@ -0,0 +1,180 @@
+"""Boat speed polars: boat speed against true wind angle and wind speed.
+
+A polar is loaded from a parameter YAML file like polar_laser.yaml:
+
+    polar/twa: [0, 30, ...]        # true wind angles, 0-180 degrees
+    polar/tws: [0, 1, ...]         # true wind speeds [m/s]
+    polar/boat_speed:              # one row for each wind speed
+      - [0, 0, ...]
+      - [0.06, 0.36, ...]
+    polar/above_max_tws: clamp     # or scale
+
+Between the table entries, speeds are interpolated linearly. On construction
+this is done once onto a regular grid, so that looking up a speed is a
+bilinear interpolation in that grid with no searching. Above the highest wind
+speed in the table, the speed stays as it is there (clamp), or goes up in
+proportion to the wind speed (scale). The VMG-optimal angles upwind and
+downwind are also worked out for each wind speed in the grid.
+"""
+from __future__ import division
+
+import os.path
+import numpy as np
+
+# launch/parameters next to the Python source, when running from a checkout
+SOURCE_PARAMS_DIR = os.path.join(os.path.dirname(__file__), '..', '..',
+                                 'launch', 'parameters')
+
+def find_params_file(name):
+    """Path of a file in launch/parameters.
+
+    This looks in the source tree first, then asks rospkg where the
+    sailing_robot package is, for when the Python code is installed.
+    """
+    path = os.path.join(SOURCE_PARAMS_DIR, name)
+    if os.path.isfile(path):
+        return path
+    try:
+        import rospkg
+    except ImportError:
+        raise IOError("{} not found in {}, and rospkg is not available"
+                      .format(name, SOURCE_PARAMS_DIR))
+    pkg_dir = rospkg.RosPack().get_path('sailing_robot')
+    return os.path.join(pkg_dir, 'launch', 'parameters', name)
+
+def fold_angle(twa):
+    """Wind angle(s) in degrees, folded into 0-180 (port and starboard alike)"""
+    return np.abs((np.asarray(twa, dtype=float) + 180) % 360 - 180)
+
+class Polar(object):
+    def __init__(self, twa, tws, boat_speed, above_max_tws='clamp',
+                 twa_step=1.0, tws_step=0.25):
+        """twa and tws are increasing lists; boat_speed has one row per tws
+        and one column per twa. twa_step (degrees) and tws_step (m/s) set the
+        spacing of the precalculated grid.
+        """
+        twa = np.asarray(twa, dtype=float)
+        tws = np.asarray(tws, dtype=float)
+        boat_speed = np.asarray(boat_speed, dtype=float).reshape(len(tws), len(twa))
+        if above_max_tws not in ('clamp', 'scale'):
+            raise ValueError("above_max_tws should be 'clamp' or 'scale', not %r"
+                             % above_max_tws)
+        self.above_max_tws = above_max_tws
+        self.max_tws = float(tws[-1])
+
+        # Regular grid, with the source table interpolated onto it
+        self.twa_step = twa_step
+        self.tws_step = tws_step
+        self.grid_twa = np.arange(0, 180 + twa_step / 2, twa_step)
+        n_tws = max(int(np.ceil(self.max_tws / tws_step)), 1) + 1
+        self.grid_tws = np.arange(n_tws) * tws_step
+        by_angle = np.array([np.interp(self.grid_twa, twa, row) for row in boat_speed])
+        self.grid = np.array([np.interp(self.grid_tws, tws, col)
+                              for col in by_angle.T]).T
+        # Indexing lists is much quicker than numpy arrays for single lookups
+        self._grid_rows = self.grid.tolist()
+        self._n_twa = len(self.grid_twa)
+        self._n_tws = len(self.grid_tws)
+
+        # VMG-optimal angles for every wind speed in the grid
+        cos_twa = np.cos(np.radians(self.grid_twa))
+        up = self.grid * cos_twa
+        down = -up
+        upwind = self.grid_twa <= 90
+        downwind = ~upwind
+        self._beat_ix = np.argmax(np.where(upwind, up, -np.inf), axis=1)
+        self._run_ix = np.argmax(np.where(downwind, down, -np.inf), axis=1)
+        rows = np.arange(len(self.grid_tws))
+        self.beat_vmg = up[rows, self._beat_ix]
+        self.run_vmg = down[rows, self._run_ix]
+        # With no boat speed, there is no best angle
+        self.beat_angles = np.where(self.beat_vmg > 0,
+                                    self.grid_twa[self._beat_ix], np.nan)
+        self.run_angles = np.where(self.run_vmg > 0,
+                                   self.grid_twa[self._run_ix], np.nan)
+
+    @classmethod
+    def from_params(cls, polar_params, **kwargs):
+        """polar_params is the 'polar' group, e.g. rospy.get_param('polar')"""
+        return cls(polar_params['twa'], polar_params['tws'],
+                   polar_params['boat_speed'],
+                   above_max_tws=polar_params.get('above_max_tws', 'clamp'),
+                   **kwargs)
+
+    @classmethod
+    def from_yaml(cls, filename, **kwargs):
+        import yaml
+        with open(filename) as f:
+            params = yaml.safe_load(f)
+        group = dict((k[len('polar/'):], v) for k, v in params.items()
+                     if k.startswith('polar/'))
+        return cls.from_params(group, **kwargs)
+
+    def _tws_scale(self, tws):
+        if tws <= self.max_tws or self.above_max_tws == 'clamp':
+            return 1.0
+        return tws / self.max_tws
+
+    def speed(self, twa, tws):
+        """Boat speed for one true wind angle (degrees) and speed (m/s)"""
+        twa = abs((twa + 180) % 360 - 180)
+        x = twa / self.twa_step
+        i = min(int(x), self._n_twa - 2)
+        fx = x - i
+
+        y = min(max(tws, 0.0), self.max_tws) / self.tws_step
+        j = min(int(y), self._n_tws - 2)
+        fy = y - j
+
+        r0 = self._grid_rows[j]
+        r1 = self._grid_rows[j + 1]
+        s0 = r0[i] + fx * (r0[i + 1] - r0[i])
+        s1 = r1[i] + fx * (r1[i + 1] - r1[i])
+        return (s0 + fy * (s1 - s0)) * self._tws_scale(tws)
+
+    def speed_many(self, twa, tws):
+        """Boat speeds for arrays of wind angles and speeds (broadcast together)"""
+        twa, tws = np.broadcast_arrays(fold_angle(twa),
+                                       np.asarray(tws, dtype=float))
+        x = twa / self.twa_step
+        i = np.minimum(x.astype(int), len(self.grid_twa) - 2)
+        fx = x - i
+
+        y = np.clip(tws, 0.0, self.max_tws) / self.tws_step
+        j = np.minimum(y.astype(int), len(self.grid_tws) - 2)
+        fy = y - j
+
+        g = self.grid
+        s0 = g[j, i] + fx * (g[j, i + 1] - g[j, i])
+        s1 = g[j + 1, i] + fx * (g[j + 1, i + 1] - g[j + 1, i])
+        s = s0 + fy * (s1 - s0)
+        if self.above_max_tws == 'scale':
+            s *= np.where(tws > self.max_tws, tws / self.max_tws, 1.0)
+        return s
+
+    def _tws_row(self, tws):
+        return int(round(min(max(tws, 0.0), self.max_tws) / self.tws_step))
+
+    def beating_angle(self, tws):
+        """True wind angle with the best VMG upwind, in degrees (NaN if the
+        polar has no speed at this wind speed)"""
+        return float(self.beat_angles[self._tws_row(tws)])
+
+    def running_angle(self, tws):
+        """True wind angle with the best VMG downwind, in degrees"""
+        return float(self.run_angles[self._tws_row(tws)])
+
+    def vmg(self, tws):
+        """Best (upwind, downwind) VMG in m/s at this wind speed"""
+        row = self._tws_row(tws)
+        scale = self._tws_scale(tws)
+        return float(self.beat_vmg[row]) * scale, float(self.run_vmg[row]) * scale
+
+_laser_polar = None
+
+def laser_polar():
+    """The Laser polar from polar_laser.yaml, loaded the first time it's used"""
+    global _laser_polar
+    if _laser_polar is None:
+        _laser_polar = Polar.from_yaml(find_params_file('polar_laser.yaml'))
+    return _laser_polar
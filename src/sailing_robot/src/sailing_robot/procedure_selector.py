@@ -0,0 +1,170 @@
+"""Choosing which tack/jibe procedure to try, learning from past attempts.
+
+Each attempt at a manoeuvre gives a cost: the time the procedure took, or a
+penalty if it failed. ProcedureSelector keeps a running mean and variance of
+the cost for each procedure, separately for each combination of wind
+strength and sea state bucket, and ranks the procedures as a multi-armed
+bandit, balancing the ones known to be quick against ones which haven't been
+tried enough to know:
+
+- 'ucb1': lowest mean cost minus an exploration bonus, which shrinks as a
+  procedure is tried more. Untried procedures go first, in the given order.
+- 'thompson': sort by a cost drawn at random from what's known about each
+  procedure (a normal distribution around its mean, narrowing with more
+  attempts).
+
+The statistics can be saved to a JSON file and loaded again, so what was
+learnt carries over from one outing to the next.
+"""
+from __future__ import division
+
+import json
+import math
+import os
+import random
+from bisect import bisect_right
+
+class RunningStats(object):
+    """Mean and variance updated one value at a time (Welford's method).
+
+    With max_count, values are weighted as if there were never more than
+    max_count of them, so old results are gradually forgotten and the
+    statistics follow changes.
+    """
+    def __init__(self, count=0, mean=0.0, m2=0.0, max_count=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.max_count = max_count
+
+    @property
+    def n(self):
+        """The number of values the statistics stand for, up to max_count"""
+        if self.max_count is None:
+            return self.count
+        return min(self.count, self.max_count)
+
+    def add(self, x):
+        self.count += 1
+        n = self.n
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+        if self.count > n:
+            # Keep m2 consistent with n values, not count
+            self.m2 *= (n - 1) / n
+
+    @property
+    def variance(self):
+        n = self.n
+        return self.m2 / (n - 1) if n > 1 else float('nan')
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, d, max_count=None):
+        return cls(d['count'], d['mean'], d['m2'], max_count)
+
+def bucket(value, edges):
+    """Index of the bucket that value falls in, or None if it's unknown.
+
+    edges are the boundaries between buckets, so there are len(edges)+1.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return bisect_right(edges, value)
+
+class ProcedureSelector(object):
+    """Ranks procedures by name for a context, e.g. (wind bucket, sea bucket).
+
+    Costs are divided by cost_scale (e.g. the failure penalty), so that they
+    are about 0-1 for the exploration terms.
+    """
+    METHODS = ('ucb1', 'thompson')
+
+    def __init__(self, names, method='ucb1', cost_scale=1.0, exploration=1.0,
+                 max_count=None, prior_std=0.5, rng=None):
+        if method not in self.METHODS:
+            raise ValueError("Unknown method %r, should be one of %s"
+                             % (method, ', '.join(self.METHODS)))
+        self.names = list(names)
+        self.method = method
+        self.cost_scale = cost_scale
+        self.exploration = exploration
+        self.max_count = max_count
+        self.prior_std = prior_std
+        self.rng = rng or random.Random()
+        # {context key: {name: RunningStats}}
+        self.stats = {}
+        # Total attempts for each context key, for UCB1
+        self._totals = {}
+
+    @staticmethod
+    def _key(context):
+        return '/'.join('-' if c is None else str(c) for c in context)
+
+    def _context_stats(self, key):
+        if key not in self.stats:
+            self.stats[key] = {}
+            self._totals[key] = 0
+        return self.stats[key]
+
+    def update(self, context, name, cost):
+        """Record the cost of an attempt with the named procedure"""
+        key = self._key(context)
+        stats = self._context_stats(key)
+        if name not in stats:
+            stats[name] = RunningStats(max_count=self.max_count)
+        stats[name].add(cost / self.cost_scale)
+        self._totals[key] += 1
+
+    def rank(self, context):
+        """Names of the procedures, best to try first"""
+        key = self._key(context)
+        stats = self._context_stats(key)
+        scores = [self._score(stats.get(name), self._totals[key])
+                  for name in self.names]
+        order = sorted(range(len(self.names)), key=lambda i: (scores[i], i))
+        return [self.names[i] for i in order]
+
+    def _score(self, s, total):
+        """Lower is better"""
+        if self.method == 'ucb1':
+            if s is None or s.count == 0:
+                return float('-inf')
+            return s.mean - self.exploration * math.sqrt(2 * math.log(total) / s.count)
+
+        # Thompson sampling with a normal approximation
+        if s is None or s.count == 0:
+            return self.rng.gauss(0.5, self.prior_std)
+        # With max_count, the width stops narrowing at max_count attempts,
+        # so procedures are still tried again now and then
+        std = math.sqrt(s.variance) if s.n > 1 else self.prior_std
+        return self.rng.gauss(s.mean, std / math.sqrt(s.n))
+
+    def to_dict(self):
+        return dict((key, dict((name, s.to_dict()) for name, s in stats.items()))
+                    for key, stats in self.stats.items())
+
+    def load_dict(self, d):
+        for key, stats in d.items():
+            ctx = self._context_stats(key)
+            for name, s in stats.items():
+                ctx[name] = RunningStats.from_dict(s, self.max_count)
+            self._totals[key] = sum(s.count for s in ctx.values())
+
+    def save(self, filename):
+        """Write the statistics to a JSON file (replacing it atomically)"""
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+        os.rename(tmp, filename)
+
+    def load(self, filename):
+        """Load statistics saved before; a missing file is ignored."""
+        if not os.path.exists(filename):
+            return False
+        with open(filename) as f:
+            self.load_dict(json.load(f))
+        return True
@@ -0,0 +1,157 @@
+"""Timing the phases of a calculation which runs every tick.
+
+PhaseProfiler keeps a histogram of the time taken by each named phase, e.g.
+the steps of TasksRunner.calculate_state_and_goal (see
+TasksRunner.enable_profiling). The histograms have fixed, logarithmically
+spaced bins, so recording a time is a quick binary search, and percentiles
+can be read off at any time without sorting. With *window*, only the most
+recent times count (a rolling histogram); without, everything since the
+start does, and histograms from several runs can be merged.
+
+    profiler = PhaseProfiler(window=1000)
+    timer = profiler.start()
+    ...
+    timer.lap('planner')   # time since start() or the last lap()
+    timer.total()
+    print('\\n'.join(profiler.report()))
+"""
+from __future__ import division
+
+from bisect import bisect_right
+from collections import deque
+from timeit import default_timer
+
+from .latency import format_summary
+
+def log_edges(lowest=1e-7, highest=10.0, per_decade=10):
+    """Bin edges spaced evenly on a log scale, in seconds"""
+    edges = []
+    x = lowest
+    while x <= highest * (1 + 1e-9):
+        edges.append(x)
+        x *= 10 ** (1 / per_decade)
+    return edges
+
+DEFAULT_EDGES = log_edges()
+
+class RollingHistogram(object):
+    """Counts of values in bins between *edges*, plus one bin below the
+    first edge and one above the last."""
+    def __init__(self, edges=DEFAULT_EDGES, window=None):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.n = 0
+        self.sum = 0.
+        self.window = window
+        self._max = 0.
+        self._values = deque() if window else None
+
+    def add(self, value):
+        self.counts[bisect_right(self.edges, value)] += 1
+        self.n += 1
+        self.sum += value
+        if self._values is None:
+            if value > self._max:
+                self._max = value
+            return
+        self._values.append(value)
+        if self.n > self.window:
+            old = self._values.popleft()
+            self.counts[bisect_right(self.edges, old)] -= 1
+            self.n -= 1
+            self.sum -= old
+
+    @property
+    def max(self):
+        if self._values is None:
+            return self._max
+        return max(self._values) if self._values else 0.
+
+    def merge(self, other):
+        """Add the counts from another histogram with the same edges"""
+        if self._values is not None or other._values is not None:
+            raise ValueError("Only histograms without a window can be merged")
+        if other.edges != self.edges:
+            raise ValueError("Histograms have different bins")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.n += other.n
+        self.sum += other.sum
+        self._max = max(self._max, other._max)
+
+    def percentile(self, p):
+        """Estimated pth percentile, interpolating within a bin"""
+        if self.n == 0:
+            return float('nan')
+        rank = max(-(-p * self.n // 100), 1)   # ceil(p*n/100)
+        top = self.max
+        cum = 0
+        for i, c in enumerate(self.counts):
+            if c and cum + c >= rank:
+                lo = self.edges[i - 1] if i > 0 else 0.
+                hi = self.edges[i] if i < len(self.edges) else top
+                return min(lo + (rank - cum) / c * (hi - lo), top)
+            cum += c
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Like LatencyWindow.summary(): n, mean, max and pNN, or None"""
+        if self.n == 0:
+            return None
+        res = {'n': self.n, 'mean': self.sum / self.n, 'max': self.max}
+        for p in percentiles:
+            res['p%d' % p] = self.percentile(p)
+        return res
+
+class PhaseTimer(object):
+    """Times consecutive phases into a PhaseProfiler"""
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.clock = profiler.clock
+        self.started = self.last = self.clock()
+
+    def lap(self, phase):
+        """Record the time since the last lap (or the start) for *phase*"""
+        now = self.clock()
+        self.profiler.record(phase, now - self.last)
+        self.last = now
+
+    def total(self, phase='total'):
+        """Record the time from the start to the last lap"""
+        self.profiler.record(phase, self.last - self.started)
+
+class PhaseProfiler(object):
+    """A histogram of times for each phase, in the order first recorded"""
+    def __init__(self, window=None, edges=DEFAULT_EDGES, clock=default_timer):
+        self.window = window
+        self.edges = edges
+        self.clock = clock
+        self.phases = []
+        self.histograms = {}
+
+    def start(self):
+        """A PhaseTimer for one run through the phases"""
+        return PhaseTimer(self)
+
+    def record(self, phase, seconds):
+        try:
+            self.histograms[phase].add(seconds)
+        except KeyError:
+            self.phases.append(phase)
+            self.histograms[phase] = RollingHistogram(self.edges, self.window)
+            self.histograms[phase].add(seconds)
+
+    def merge(self, other):
+        """Add the times from another profiler, e.g. from another run"""
+        for phase in other.phases:
+            if phase not in self.histograms:
+                self.phases.append(phase)
+                self.histograms[phase] = RollingHistogram(self.edges, self.window)
+            self.histograms[phase].merge(other.histograms[phase])
+
+    def summary(self):
+        return dict((phase, h.summary()) for phase, h in self.histograms.items())
+
+    def report(self, scale=1e6, unit='us'):
+        """Lines of text with the statistics for each phase"""
+        return [format_summary(phase, self.histograms[phase].summary(),
+                               scale=scale, unit=unit)
+                for phase in self.phases]
@@ -1,13 +1,6 @@
-import math
-from shapely.geometry import Point, Polygon
-
-from .navigation import angleSum
+from .laylines import LayTriangleCache, between_laylines
 from .taskbase import TaskBase
 
-# For calculations, lay lines don't extend to infinity.
-# This is in m; 10km should be plenty for our purposes.
-LAYLINE_EXTENT = 10000
-
 class ReturnToSafetyZone(TaskBase):
     def __init__(self, nav):
         """Sail towards the centroid of the safety zone.
@@ -23,9 +16,9 @@ class ReturnToSafetyZone(TaskBase):
         convex shape (not something like a C shape).
         """
         self.nav = nav
-        self.waypoint_xy = self.nav.safety_zone.centroid
-        margin = self.nav.safety_zone_margin
-        self.safety_zone_double_margin = self.nav.safety_zone.buffer(-2*margin)
+        self.safety_zone_index = self.nav.safety_zone_index
+        self.waypoint_xy = self.safety_zone_index.centroid
+        self._lay_triangle_cache = LayTriangleCache()
         # sailing state can be 'normal','switch_to_port_tack' or  'switch_to_stbd_tack'
         self.sailing_state = 'normal'
 
@@ -34,7 +27,9 @@ class ReturnToSafetyZone(TaskBase):
 
     def check_end_condition(self):
         """Are we safe yet?"""
-        return self.nav.position_xy.within(self.safety_zone_double_margin)
+        d = self.safety_zone_index.signed_distance(self.nav.position_x,
+                                                   self.nav.position_y)
+        return d > 2 * self.safety_zone_index.margin
 
     debug_topics = [
         ('dbg_heading_to_waypoint', 'Float32'),
@@ -45,11 +40,7 @@ class ReturnToSafetyZone(TaskBase):
     def distance_heading_to_waypoint(self):
         """Calculate where we are relative to the waypoint, for debugging.
         """
-        dx = self.waypoint_xy.x - self.nav.position_xy.x
-        dy = self.waypoint_xy.y - self.nav.position_xy.y
-        d = (dx**2 + dy**2) ** 0.5
-        h = math.degrees(math.atan2(dx, dy)) % 360
-        return d, h
+        return self.nav.distance_and_heading(self.waypoint_xy)
 
     def calculate_state_and_goal(self):
         """Work out what we want the boat to do
@@ -90,7 +81,7 @@ class ReturnToSafetyZone(TaskBase):
         # If wp_wind_angle and boat_wind_angle have the same sign, we're on the better tack already
         # Or if we're between the laylines; stick to our current tack for now
         if (wp_wind_angle * boat_wind_angle > 0) \
-                or self.nav.position_xy.within(self.lay_triangle()):
+                or self.between_laylines():
             tack_now = False
         else:
             tack_now = True
@@ -115,18 +106,20 @@ class ReturnToSafetyZone(TaskBase):
         self.debug_pub('dbg_goal_wind_angle', goal_wind_angle)
         return state, self.nav.wind_angle_to_heading(goal_wind_angle)
 
+    def between_laylines(self):
+        """Is the boat between the lay lines for the current waypoint?"""
+        return between_laylines(self.nav.position_x, self.nav.position_y,
+                                self.waypoint_xy.x, self.waypoint_xy.y,
+                                self.nav.absolute_wind_direction(),
+                                self.nav.beating_angle)
+
     def lay_triangle(self):
         """Calculate the lay lines for the current waypoint.
-        
+
         This returns a shapely Polygon with the two lines extended to
-        LAYLINE_EXTENT (10km).
+        LAYLINE_EXTENT (10km). It's only needed for visualisation, so the
+        polygon is cached until the wind shifts noticeably.
         """
-        downwind = angleSum(self.nav.absolute_wind_direction(), 180)
-        x0, y0 = self.waypoint_xy.x, self.waypoint_xy.y
-        l1 = math.radians(angleSum(downwind, -self.nav.beating_angle))
-        x1 = x0 + (LAYLINE_EXTENT * math.sin(l1))
-        y1 = y0 + (LAYLINE_EXTENT * math.cos(l1))
-        l2 = math.radians(angleSum(downwind, self.nav.beating_angle))
-        x2 = x0 + (LAYLINE_EXTENT * math.sin(l2))
-        y2 = y0 + (LAYLINE_EXTENT * math.cos(l2))
-        return Polygon([(x0, y0), (x1, y1), (x2, y2)])
+        return self._lay_triangle_cache.get(
+            self.waypoint_xy.x, self.waypoint_xy.y,
+            self.nav.absolute_wind_direction(), self.nav.beating_angle)
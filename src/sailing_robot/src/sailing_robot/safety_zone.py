@@ -0,0 +1,68 @@
+"""Precomputed safety zone geometry for fast checks in the control loop"""
+
+from shapely.geometry import Point, Polygon
+from shapely.prepared import prep
+
+# Status codes returned by SafetyZoneIndex.check(); these match
+# Navigation.check_safety_zone()
+INSIDE = 0
+IN_MARGIN = 1
+OUTSIDE = 2
+
+class SafetyZoneIndex(object):
+    """Answers 'where are we relative to the safety zone?' cheaply.
+
+    The prepared polygon and its boundary are built once when the index is
+    created. Each check then does a bounding box test, one prepared
+    containment test and one distance to the boundary (in GEOS), rather than
+    full shapely predicates against several polygons.
+    """
+    def __init__(self, polygon, margin):
+        """
+        polygon : A shapely Polygon, or a list of (x, y) points, in metres.
+        margin : The safety buffer (in metres) to stay inside the zone.
+        """
+        if not isinstance(polygon, Polygon):
+            polygon = Polygon(polygon)
+        self.zone = polygon
+        self.margin = margin
+        self.inner = polygon.buffer(-margin)
+        self.centroid = polygon.centroid
+
+        self.prepared_zone = prep(self.zone)
+        self.boundary = polygon.boundary
+        self.bounds = polygon.bounds
+
+    def distance_to_boundary(self, x, y):
+        """Unsigned distance in metres from (x, y) to the zone boundary"""
+        return self.boundary.distance(Point(x, y))
+
+    def _contains_point(self, x, y, point):
+        minx, miny, maxx, maxy = self.bounds
+        if not (minx < x < maxx and miny < y < maxy):
+            return False
+        return self.prepared_zone.contains(point)
+
+    def contains(self, x, y):
+        """Is (x, y) strictly inside the zone?"""
+        return self._contains_point(x, y, Point(x, y))
+
+    def signed_distance(self, x, y):
+        """Distance to the zone edge: positive inside, negative outside"""
+        point = Point(x, y)
+        d = self.boundary.distance(point)
+        return d if self._contains_point(x, y, point) else -d
+
+    def check(self, x, y):
+        """Check a position against the safety zone.
+
+        Returns a pair (status, distance). status is INSIDE (0), IN_MARGIN (1)
+        or OUTSIDE (2), and distance is the signed distance to the edge of the
+        zone, as from signed_distance().
+        """
+        d = self.signed_distance(x, y)
+        if d > self.margin:
+            return INSIDE, d
+        elif d > 0:
+            return IN_MARGIN, d
+        return OUTSIDE, d
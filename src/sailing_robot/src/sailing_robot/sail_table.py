@@ -3,47 +3,74 @@
 
 from __future__ import division
 
+from bisect import bisect_right
+import numpy as np
+
 class SailTable(object):
-    def __init__(self, table_dict):
+    def __init__(self, table_dict, dense=False):
         """table_dict should be a mapping from wind direction (in degrees) to
         sail setting (0=fully in to 1=fully out).
         
         Because of the limitations of the YAML parameter files, the keys may be
         in strings.
+
+        With dense=True, the setting for every whole degree within the table is
+        precalculated, so that interpolate_sail_setting() takes the same time
+        however big the table is. The results are the same either way.
         """
         self.table = sorted([(int(k), v) for k,v in table_dict.items()])
-    
+
+        # Breakpoints, and the slope of the line from each one to the next.
+        # The last slope is 0, so directions past the end of the table get the
+        # last setting, while the first slope carries on below the table.
+        self.directions = [d for d, _ in self.table]
+        self.settings = [s for _, s in self.table]
+        self.slopes = []
+        for (d0, s0), (d1, s1) in zip(self.table, self.table[1:]):
+            self.slopes.append(0 if d1 == d0 else (s1 - s0) / (d1 - d0))
+        self.slopes.append(0)
+        self._directions_arr = np.array(self.directions, dtype=float)
+        self._settings_arr = np.array(self.settings, dtype=float)
+        self._slopes_arr = np.array(self.slopes, dtype=float)
+
+        self.dense = None
+        if dense:
+            # The breakpoints are whole degrees, so the slope is constant from
+            # each degree to the next and this is exact.
+            lo, hi = self.directions[0], self.directions[-1]
+            degrees = np.arange(lo, hi + 1)
+            self.dense = (lo, hi,
+                          self.interpolate_many(degrees).tolist(),
+                          self._slopes_arr[self._segments(degrees)].tolist())
+
+    def _segments(self, wind_directions):
+        ix = np.searchsorted(self._directions_arr, wind_directions, side='right')
+        return np.maximum(ix - 1, 0)
+
     def interpolate_sail_setting(self, wind_direction):
         """Turn a wind angle in degrees into a sail setting (0 to 1).
         
         Wind angle should be between 0 and 180, so e.g. 315 should be normalised
         to 45 before calling this.
         """
-        last_wind_direction, last_sail_setting = self.table[0]
-        
-        # Loop through the table to find which entries the current wind
-        # direction is between.
-        for next_wind_direction, next_sail_setting in self.table[1:]:
-            if next_wind_direction > wind_direction:
-                # It's in the interval (last_wind_direction, next_wind_direction)
-                if next_wind_direction == last_wind_direction:
-                    delta = 0   # Avoid division by 0
-                else:
-                    # Where are we within the interval?
-                    delta = (wind_direction - last_wind_direction) \
-                            / (next_wind_direction - last_wind_direction)
-                
-                # Interpolated value
-                return last_sail_setting + \
-                        delta * (next_sail_setting - last_sail_setting)
-            
-            # Haven't found the interval yet; update the lower bound for the
-            # next loop.
-            last_wind_direction, last_sail_setting = \
-                next_wind_direction, next_sail_setting
-        
-        # We ran past the end of the table
-        return last_sail_setting
+        if self.dense is not None:
+            lo, hi, settings, slopes = self.dense
+            if lo <= wind_direction < hi:
+                i = int(wind_direction - lo)
+                return settings[i] + slopes[i] * (wind_direction - lo - i)
+
+        # Find which entries the wind direction is between; below the first
+        # entry, use the first interval.
+        i = max(bisect_right(self.directions, wind_direction) - 1, 0)
+        return self.settings[i] + \
+                self.slopes[i] * (wind_direction - self.directions[i])
+
+    def interpolate_many(self, wind_directions):
+        """interpolate_sail_setting() for an array of wind angles at once"""
+        wind_directions = np.asarray(wind_directions, dtype=float)
+        i = self._segments(wind_directions)
+        return self._settings_arr[i] + \
+                self._slopes_arr[i] * (wind_directions - self._directions_arr[i])
 
 class SailData(object):
     def __init__(self, sail_table):
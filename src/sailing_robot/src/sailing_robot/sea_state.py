@@ -0,0 +1,139 @@
+"""Sea state from vertical acceleration, using its power spectrum.
+
+Rather than fitting one sinusoid (Wave_position) or counting peaks
+(wave_period), this keeps the last *window* seconds of readings and averages
+the spectra of overlapping segments (Welch's method). From the spectrum it
+estimates:
+
+- period: the dominant wave period in seconds
+- hs: a proxy for significant wave height in m, 4*sqrt(m0), where m0 is the
+  area under the displacement spectrum from half the dominant frequency up.
+  The IMU is fixed to the hull, so this is only a relative measure of how
+  rough it is.
+- confidence: the fraction of the acceleration power close to the dominant
+  frequency, from 0 to 1. Regular swell gives values near 1, a confused sea
+  lower ones.
+
+    est = SeaStateEstimator(rate=100)
+    est.update(acc_z)     # for every reading
+    est.estimate()        # occasionally; None until the window is full
+
+Adding a reading is cheap. The working arrays for the spectrum are allocated
+once; estimate() only allocates the FFT output and a few small arrays over
+the wave band, which is fine at the low rate it runs at.
+"""
+from __future__ import division
+
+from collections import namedtuple
+import numpy as np
+
+SeaState = namedtuple('SeaState', ['period', 'hs', 'confidence'])
+
+class SeaStateEstimator(object):
+    """Welch power spectrum of a rolling buffer of vertical acceleration.
+
+    rate is the reading rate in Hz. The buffer holds *window* seconds, split
+    into segments of *segment* seconds overlapping by half. Only wave
+    periods between min_period and max_period seconds are considered.
+    peak_width is the relative width (+/-) of the band around the dominant
+    frequency counted towards the confidence.
+    """
+    def __init__(self, rate=100, window=60, segment=20, min_period=1.0,
+                 max_period=20.0, peak_width=0.15):
+        self.rate = rate
+        self.size = int(round(window * rate))
+        self.nperseg = int(round(segment * rate))
+        if self.nperseg > self.size:
+            raise ValueError("segment must not be longer than window")
+        self.step = self.nperseg // 2
+        self.nsegments = (self.size - self.nperseg) // self.step + 1
+        self.peak_width = peak_width
+
+        # As in wave_period, readings are stored twice so the whole window
+        # is one contiguous slice.
+        self._buf = np.zeros(2 * self.size)
+        self.count = 0
+
+        # Precomputed window, its normalisation and the frequency band
+        self._window = np.hanning(self.nperseg)
+        self._scale = 1.0 / (rate * np.sum(self._window ** 2))
+        freqs = np.fft.rfftfreq(self.nperseg, 1.0 / rate)
+        self.df = freqs[1]
+        self._band = (freqs >= 1.0 / max_period) & (freqs <= 1.0 / min_period)
+        self.freqs = freqs[self._band]
+        # Acceleration -> displacement spectrum: divide by (2 pi f)^4
+        self._to_displacement = (2 * np.pi * self.freqs) ** -4.0
+
+        # Working arrays for estimate()
+        self._segments = np.empty((self.nsegments, self.nperseg))
+        self._means = np.empty((self.nsegments, 1))
+        self._power = np.empty((self.nsegments, len(freqs)))
+        self._imag2 = np.empty((self.nsegments, len(freqs)))
+        self._mean_power = np.empty(len(freqs))
+        self.spectrum = np.zeros(len(self.freqs))
+
+    def update(self, value):
+        i = self.count % self.size
+        self._buf[i] = self._buf[i + self.size] = value
+        self.count += 1
+
+    def extend(self, values):
+        """Add a batch of readings, e.g. from the IMU FIFO"""
+        for v in values:
+            self.update(v)
+
+    @property
+    def ready(self):
+        return self.count >= self.size
+
+    def _welch(self):
+        """Acceleration spectral density over the wave band, in (m/s^2)^2/Hz"""
+        start = self.count % self.size
+        window = self._buf[start:start + self.size]
+        segs = self._segments
+        for k in range(self.nsegments):
+            segs[k] = window[k * self.step:k * self.step + self.nperseg]
+        np.mean(segs, axis=1, keepdims=True, out=self._means)
+        segs -= self._means
+        segs *= self._window
+        spec = np.fft.rfft(segs, axis=1)
+        np.multiply(spec.real, spec.real, out=self._power)
+        np.multiply(spec.imag, spec.imag, out=self._imag2)
+        self._power += self._imag2
+        np.mean(self._power, axis=0, out=self._mean_power)
+        # One-sided spectrum: double all but the DC (and Nyquist) bins;
+        # those are outside the wave band anyway.
+        np.multiply(self._mean_power[self._band], 2 * self._scale,
+                    out=self.spectrum)
+        return self.spectrum
+
+    def estimate(self):
+        """Returns a SeaState, or None until the buffer has filled."""
+        if not self.ready:
+            return None
+        spec = self._welch()
+        total = spec.sum()
+        if total <= 0:
+            return SeaState(float('nan'), 0.0, 0.0)
+
+        # The peak is picked from the acceleration spectrum: converting to
+        # displacement amplifies sensor noise at low frequencies so much that
+        # it would swamp the waves.
+        peak = int(np.argmax(spec))
+        f_peak = self.freqs[peak]
+        if 0 < peak < len(spec) - 1:
+            # Parabolic interpolation between the bins around the peak
+            a, b, c = spec[peak - 1:peak + 2]
+            denom = a - 2 * b + c
+            if denom != 0:
+                f_peak += 0.5 * (a - c) / denom * self.df
+
+        near = np.abs(self.freqs - f_peak) <= max(self.peak_width * f_peak,
+                                                   self.df)
+        confidence = spec[near].sum() / total
+
+        # Likewise, only integrate displacement down to half the peak frequency
+        waves = self.freqs >= 0.5 * f_peak
+        m0 = np.sum(spec[waves] * self._to_displacement[waves]) * self.df
+        return SeaState(float(1.0 / f_peak), float(4 * np.sqrt(m0)),
+                        float(confidence))
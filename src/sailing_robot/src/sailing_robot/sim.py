@@ -0,0 +1,434 @@
+"""Boat simulation physics, and a headless fast-time simulator.
+
+The simulation_* nodes use the functions here to model the boat one piece at
+a time, each running at config/rate in wall-clock time. BoatSimulator
+advances all of the same states together with a single step(dt), and
+FastTimeSimulation drives TasksRunner and HelmingEngine with it directly,
+without ROS, as fast as the CPU allows.
+
+Run a course from the command line with e.g.:
+
+    python -m sailing_robot.sim default.yaml simulator.yaml \\
+        sailsettings_laser.yaml Calshot_TriangleRace.yaml
+
+Parameter files are loaded in order, later files overriding earlier ones.
+
+Tasks which use the wall clock (StationKeeping, StartTimer) still do so, and
+won't behave correctly in fast time.
+"""
+from __future__ import division, print_function
+
+import math
+import numpy as np
+
+from .helming_engine import HelmingEngine, HelmInputs
+from .navigation import Navigation
+from .polar import Polar, laser_polar
+from .profiling import PhaseProfiler
+from .sail_table import SailTable
+from .tasks import TasksRunner, tasks_from_wps
+
+################
+# Physics of the individual simulation nodes
+################
+
+def boat_speed(wind_direction_apparent, wind_speed_apparent, sailsheet,
+               sail_table, polar=None, velocity_coefficient=0.4,
+               velocity_minimum=0.5, coef_sailsheet_error=1, punishment=1):
+    """Boat speed (m/s) from the apparent wind and the sail setting.
+
+    The speed from the polar is reduced if the sailsheet is away from the
+    ideal setting in the sail table. A minimum speed is kept so the boat can
+    still tack, and the result is multiplied by the tacking punishment.
+    polar is a Polar (the Laser polar by default).
+    """
+    if polar is None:
+        polar = laser_polar()
+    # wind direction between 0 and 180 degree
+    wind_direction_180 = 180 - abs(wind_direction_apparent - 180)
+
+    sheet_normalized_ideal = sail_table.interpolate_sail_setting(wind_direction_180)
+    sailsheet_error_norm = abs(sailsheet - sheet_normalized_ideal)
+
+    velx = polar.speed(wind_direction_180, wind_speed_apparent) * velocity_coefficient \
+            * (1 - sailsheet_error_norm * coef_sailsheet_error)
+    if velx < velocity_minimum:
+        velx = velocity_minimum
+    return velx * punishment
+
+def heading_change(rudder, distance):
+    """Change of heading (degrees) after moving *distance* metres.
+
+    The boat moves on a circle defined by the keel and the rudder angle.
+    """
+    if rudder == 0:
+        return 0
+
+    Ay = -0.25    # -1/4 of the size of the boat [m]
+    r = 0.05      # radius of the rudder [m]
+    By = Ay*2
+    Cx = - r*math.sin(math.radians(rudder))
+    Cy = By - r*math.cos(math.radians(rudder))
+
+    d = distance
+
+    y = d
+    x = (-(-Cx**2-Cy**2+Ay*Cy+math.sqrt(Cx**4+Cy**4-2*Ay*Cy**3+Ay**2*Cy**2+2*Cx**2*Cy**2-4*Cx**2*d**2-2*Ay*Cx**2*Cy+4*Ay*Cx**2*d))/(2*Cx))
+
+    return -math.degrees(math.atan2(y, x)) + 90
+
+def position_change(heading, velocity_boat, water_stream_dir,
+                    water_stream_speed, dt):
+    """Movement (dx, dy) in metres over dt seconds.
+
+    velocity_boat is the (forward, sideways) velocity in the boat reference
+    system, in m/s. The water stream direction is where it comes from.
+    """
+    water_stream_x = -water_stream_speed * math.sin(math.radians(water_stream_dir))
+    water_stream_y = -water_stream_speed * math.cos(math.radians(water_stream_dir))
+
+    sin_h = math.sin(math.radians(heading))
+    cos_h = math.cos(math.radians(heading))
+    dx = (velocity_boat[0] * sin_h - velocity_boat[1] * cos_h + water_stream_x) * dt
+    dy = (velocity_boat[0] * cos_h + velocity_boat[1] * sin_h + water_stream_y) * dt
+    return dx, dy
+
+def boat_velocity(speed, velocity_heading, heading):
+    """Velocity in the boat reference system (forward, sideways)"""
+    return (speed * math.cos(math.radians(velocity_heading - heading)),
+            speed * math.sin(math.radians(velocity_heading - heading)))
+
+def apparent_wind(heading, velocity_boat, wind_direction, wind_speed):
+    """Apparent wind (direction, speed) felt on the boat.
+
+    wind_direction is the true wind direction relative to north, and
+    velocity_boat is (forward, sideways) in the boat reference system.
+    """
+    wind_direction_boat = (wind_direction - heading) % 360
+    wind_vector_boat = (wind_speed * math.cos(math.radians(wind_direction_boat)),
+                        - wind_speed * math.sin(math.radians(wind_direction_boat)),)
+
+    wind_apparent = (velocity_boat[0] + wind_vector_boat[0],
+                     velocity_boat[1] + wind_vector_boat[1],)
+
+    wind_speed_apparent = math.sqrt(wind_apparent[0]**2 + wind_apparent[1]**2)
+    wind_direction_apparent = (math.degrees(- math.atan2(wind_apparent[1], wind_apparent[0]))) % 360
+    return wind_direction_apparent, wind_speed_apparent
+
+################
+# Combined simulator
+################
+
+class BoatSimulator(object):
+    """The state of a simulated boat, advanced with step(dt).
+
+    This combines simulation_wind_apparent, simulation_velocity,
+    simulation_heading and simulation_position. Set .rudder, .sailsheet and
+    call update_sailing_state() from the controller before each step.
+    """
+    def __init__(self, sail_table, x=0., y=0., heading=270.,
+                 wind_direction=317., wind_speed=5.,
+                 noise_direction_range=0, noise_speed_range=0,
+                 velocity_coefficient=0.4, velocity_minimum=0.5,
+                 tacking_punishment_time=3, tacking_punishment_coefficient=0.2,
+                 water_stream_speed=0., water_stream_direction=180.,
+                 coef_sailsheet_error=1, heading_coefficient=1.,
+                 polar=None, rng=None):
+        self.sail_table = sail_table
+        self.polar = polar if polar is not None else laser_polar()
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self.wind_direction = wind_direction
+        self.wind_speed = wind_speed
+        self.noise_direction_range = noise_direction_range
+        self.noise_speed_range = noise_speed_range
+        self.velocity_coefficient = velocity_coefficient
+        self.velocity_minimum = velocity_minimum
+        self.tacking_punishment_time = tacking_punishment_time
+        self.tacking_punishment_coef = tacking_punishment_coefficient
+        self.water_stream_speed = water_stream_speed
+        self.water_stream_direction = water_stream_direction
+        self.coef_sailsheet_error = coef_sailsheet_error
+        self.heading_coefficient = heading_coefficient
+        self.rng = rng if rng is not None else np.random.RandomState()
+
+        self.rudder = 0
+        self.sailsheet = 0.
+        self.sailing_state = 'normal'
+        self.punishment = 1
+        self.speed = 0.
+        self.velocity_heading = heading
+        self.wind_direction_apparent = 0.
+        self.wind_speed_apparent = 0.
+        self.time = 0.
+
+    @classmethod
+    def from_params(cls, params, sail_table, x=0., y=0., **kwargs):
+        """Create a simulator from a flat parameter dict (see load_params)"""
+        p = params
+        kw = dict(
+            heading=p.get('simulation/heading_init', 270.),
+            wind_direction=p.get('simulation/wind/direction', 317.),
+            wind_speed=p.get('simulation/wind/speed', 5.),
+            noise_direction_range=p.get('simulation/wind/noise_direction_range', 0),
+            noise_speed_range=p.get('simulation/wind/noise_speed_range', 0),
+            velocity_coefficient=p.get('simulation/velocity/coefficient', 0.4),
+            velocity_minimum=p.get('simulation/velocity/minimum', 0.5),
+            tacking_punishment_time=p.get('simulation/velocity/tacking_punishment_time', 3),
+            tacking_punishment_coefficient=p.get('simulation/velocity/tacking_punishment_coefficient', 0.2),
+            water_stream_speed=p.get('simulation/velocity/water_stream_speed', 0.),
+            water_stream_direction=p.get('simulation/velocity/water_stream_direction', 180.),
+            coef_sailsheet_error=p.get('simulation/vecolity/coef_sailsheet_error', 1),
+            heading_coefficient=p.get('simulation/heading/coefficient', 1.),
+        )
+        if 'polar/twa' in p:
+            kw['polar'] = Polar.from_params(param_group(p, 'polar'))
+        kw.update(kwargs)
+        return cls(sail_table, x=x, y=y, **kw)
+
+    def update_sailing_state(self, sailing_state, dt):
+        """Apply the speed penalty after a tack, as simulation_velocity does"""
+        prev_sailing_state = self.sailing_state
+        self.sailing_state = sailing_state
+        if sailing_state == 'normal':
+            if prev_sailing_state != sailing_state:
+                self.punishment = self.tacking_punishment_coef
+            elif self.punishment < 1:
+                self.punishment += (1 - self.tacking_punishment_coef) * dt \
+                                    / self.tacking_punishment_time
+
+    def step(self, dt):
+        """Advance wind, velocity, heading and position by dt seconds.
+
+        Like the separate nodes, each part uses the values from the end of the
+        previous step.
+        """
+        velocity_boat = boat_velocity(self.speed, self.velocity_heading,
+                                      self.heading)
+
+        if self.noise_direction_range:
+            noise_direction = self.rng.normal(scale=self.noise_direction_range)
+        else:
+            noise_direction = 0
+        if self.noise_speed_range:
+            noise_speed = self.rng.normal(scale=self.noise_speed_range)
+        else:
+            noise_speed = 0
+        wind_direction_apparent, wind_speed_apparent = apparent_wind(
+            self.heading, velocity_boat,
+            self.wind_direction + noise_direction, self.wind_speed + noise_speed)
+
+        speed = boat_speed(self.wind_direction_apparent,
+                           self.wind_speed_apparent, self.sailsheet,
+                           self.sail_table, polar=self.polar,
+                           velocity_coefficient=self.velocity_coefficient,
+                           velocity_minimum=self.velocity_minimum,
+                           coef_sailsheet_error=self.coef_sailsheet_error,
+                           punishment=self.punishment)
+
+        heading = (self.heading_coefficient * heading_change(self.rudder, self.speed * dt)
+                   + self.heading) % 360
+
+        dx, dy = position_change(self.heading, velocity_boat,
+                                 self.water_stream_direction,
+                                 self.water_stream_speed, dt)
+
+        self.x += dx
+        self.y += dy
+        self.heading = heading
+        self.speed = speed
+        self.velocity_heading = heading
+        self.wind_direction_apparent = wind_direction_apparent
+        self.wind_speed_apparent = wind_speed_apparent
+        self.time += dt
+
+################
+# Headless runner
+################
+
+class SimTasksRunner(TasksRunner):
+    """TasksRunner which notices when the last task is completed"""
+    def __init__(self, *args, **kwargs):
+        self.finished = False
+        self.verbose = kwargs.pop('verbose', False)
+        super(SimTasksRunner, self).__init__(*args, **kwargs)
+
+    def log(self, level, msg, *values):
+        if self.verbose:
+            print(msg % values)
+
+    def _make_task(self, taskdict):
+        task = super(SimTasksRunner, self)._make_task(taskdict)
+        task.log = self.log
+        return task
+
+    def start_next_task(self):
+        if (self.active_task is not None) and (not self.on_temporary_task) \
+                and (self.task_ix + 1 >= len(self.tasks)):
+            self.finished = True
+        super(SimTasksRunner, self).start_next_task()
+
+class SimResult(object):
+    """Summary of a simulated run"""
+    def __init__(self):
+        self.finished = False
+        self.time = 0.
+        self.tacks = 0
+        self.safety_zone_excursions = 0
+        self.track = []
+
+    def __repr__(self):
+        return '<SimResult finished={} time={:.1f}s tacks={} excursions={}>'\
+                .format(self.finished, self.time, self.tacks,
+                        self.safety_zone_excursions)
+
+class FastTimeSimulation(object):
+    """Run the task and helming logic against BoatSimulator, without ROS."""
+    def __init__(self, boat, nav, tasks_runner, helm):
+        self.boat = boat
+        self.nav = nav
+        self.tasks_runner = tasks_runner
+        self.helm = helm
+
+    @classmethod
+    def from_params(cls, params, rng=None, verbose=False, quiet=False,
+                    **boat_kwargs):
+        """Build the whole simulation from a flat parameter dict.
+
+        The boat starts at the first waypoint, like simulation_position.
+        """
+        nav = Navigation(**param_group(params, 'navigation'))
+        wp_params = param_group(params, 'wp')
+        tasks_runner = SimTasksRunner(tasks_from_wps(wp_params), nav,
+                                      quiet=quiet, verbose=verbose)
+
+        if 'list' in wp_params:
+            wp0 = wp_params['list'][0]
+        else:
+            wp0 = wp_params['tasks'][0]['waypoint']
+        x, y = nav.latlon_to_utm(*wp_params['table'][wp0])
+
+        sail_table = SailTable(param_group(params, 'sailsettings')['table'],
+                               dense=True)
+        boat = BoatSimulator.from_params(params, sail_table, x=x, y=y,
+                                         rng=rng, **boat_kwargs)
+        # Procedures are timed in simulated time, and learn only within a run
+        helm = HelmingEngine.from_params(param_group(params, 'rudder'),
+                                         param_group(params, 'procedure'),
+                                         sail_table, clock=lambda: boat.time)
+        return cls(boat, nav, tasks_runner, helm)
+
+    def update_nav(self):
+        lon, lat = self.nav.projection(self.boat.x, self.boat.y, inverse=True)
+        self.nav.set_position(lat, lon)
+        self.nav.heading = self.boat.heading
+        self.nav.wind_direction = self.boat.wind_direction_apparent
+
+    def run(self, duration, dt=0.1, record_track=False):
+        """Simulate for up to *duration* seconds, or until all tasks are done.
+
+        Returns a SimResult.
+        """
+        res = SimResult()
+        boat = self.boat
+        tasks_runner = self.tasks_runner
+        self.update_nav()
+        tasks_runner.start_next_task()
+        prev_state = 'normal'
+        prev_zone = 0
+
+        while boat.time < duration:
+            state, goal_heading = tasks_runner.calculate_state_and_goal()
+            if tasks_runner.finished:
+                res.finished = True
+                break
+
+            if state != 'normal' and prev_state == 'normal':
+                res.tacks += 1
+            prev_state = state
+
+            zone = self.nav.check_safety_zone()
+            if zone == 2 and prev_zone != 2:
+                res.safety_zone_excursions += 1
+            prev_zone = zone
+
+            boat.rudder, boat.sailsheet = self.helm.tick(HelmInputs(
+                state, boat.heading, goal_heading,
+                boat.wind_direction_apparent), dt)
+            boat.update_sailing_state(state, dt)
+            boat.step(dt)
+            self.update_nav()
+            if record_track:
+                res.track.append((boat.time, boat.x, boat.y, boat.heading))
+
+        res.time = boat.time
+        return res
+
+################
+# Parameters
+################
+
+def load_params(*filenames):
+    """Load ROS-style parameter YAML files into one flat dict.
+
+    Keys keep their slashes, e.g. 'simulation/wind/speed'.
+    """
+    import yaml
+    params = {}
+    for filename in filenames:
+        with open(filename) as f:
+            params.update(yaml.safe_load(f) or {})
+    return params
+
+def param_group(params, prefix):
+    """Get the parameters under *prefix* as a nested dict, like rospy.get_param
+
+    e.g. param_group(params, 'rudder')['control']['Kp']
+    """
+    res = {}
+    prefix = prefix.rstrip('/') + '/'
+    for key, value in params.items():
+        if not key.startswith(prefix):
+            continue
+        parts = key[len(prefix):].split('/')
+        d = res
+        for part in parts[:-1]:
+            d = d.setdefault(part, {})
+        d[parts[-1]] = value
+    return res
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Run the sailing robot simulation in fast time, without ROS")
+    parser.add_argument('params', nargs='+', help="parameter YAML files")
+    parser.add_argument('--duration', type=float, default=3600,
+                        help="maximum simulated time in seconds")
+    parser.add_argument('--dt', type=float, default=None,
+                        help="time step in seconds (default 1/config/rate)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--profile', action='store_true',
+                        help="time each step of TasksRunner.calculate_state_and_goal")
+    args = parser.parse_args(argv)
+
+    params = load_params(*args.params)
+    dt = args.dt or 1.0 / params.get('config/rate', 10)
+    sim = FastTimeSimulation.from_params(
+        params, rng=np.random.RandomState(args.seed), verbose=args.verbose)
+    if args.profile:
+        profiler = sim.tasks_runner.enable_profiling(PhaseProfiler())
+
+    import time
+    t0 = time.time()
+    res = sim.run(args.duration, dt=dt)
+    elapsed = time.time() - t0
+    print(res)
+    print("Simulated {:.0f}s in {:.2f}s ({:.0f}x real time)".format(
+            res.time, elapsed, res.time / max(elapsed, 1e-9)))
+    if args.profile:
+        print('\n'.join(profiler.report()))
+
+if __name__ == '__main__':
+    main()
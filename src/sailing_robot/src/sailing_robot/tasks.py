@@ -84,6 +84,9 @@ def tasks_from_wps(wp_params):
 
     return res
 
+def _no_lap(phase):
+    pass
+
 class TimedEnd(object):
     def __init__(self, seconds):
         self.seconds = seconds
@@ -96,8 +99,9 @@ class TimedEnd(object):
         return (time.time() > self.ends_at)
 
 class TasksRunner(object):
-    def __init__(self, tasks, nav):
+    def __init__(self, tasks, nav, quiet=False):
         self.task_ix = -1
+        self.quiet = quiet  # No debugging output on stderr
         self.active_task = None
         self.nav = nav
         self._jump_next = None
@@ -152,6 +156,7 @@ class TasksRunner(object):
         return task
     
     on_temporary_task = False
+    profiler = None
 
     def start_next_task(self):
         """Step to the next task, making it the active task.
@@ -168,7 +173,8 @@ class TasksRunner(object):
                     self.task_ix, self.active_task.task_kind, '/'.join(endcond)
         ))
         self.active_task.start()
-        print("DEBUG: Task {} initiated".format(self.task_ix), file=sys.stderr)
+        if not self.quiet:
+            print("DEBUG: Task {} initiated".format(self.task_ix), file=sys.stderr)
 
     def set_jump(self, label):
         '''Jump callback to jump to task on next time step.'''
@@ -219,20 +225,51 @@ class TasksRunner(object):
 
         If a safety zone is specified, also checks if we're (nearly) out of it.
         """
+        return self._calculate_state_and_goal(_no_lap)
+
+    def _calculate_state_and_goal(self, lap):
+        """The steps of calculate_state_and_goal; lap(phase) after each"""
         self.process_jump()
+        lap('process_jump')
 
         if self.active_task.check_end_condition():
             self.start_next_task()
+        lap('check_end_condition')
 
         if self.nav.check_safety_zone() and self.active_task.task_kind != 'return_to_safety_zone':
             # We're about to wander out of the safety zone!
             self.log('warning', 'At edge of safety zone')
             self.insert_task({'kind': 'return_to_safety_zone'})
+        lap('check_safety_zone')
 
         self.debug_pub('task_ix', self.task_ix)
         self.debug_pub('active_task_kind', self.active_task.task_kind)
+        lap('debug_pub')
+
+        res = self.active_task.calculate_state_and_goal()
+        lap('planner')
+        return res
+
+    def _profiled_calculate_state_and_goal(self):
+        timer = self.profiler.start()
+        res = self._calculate_state_and_goal(timer.lap)
+        timer.total()
+        return res
+
+    def enable_profiling(self, profiler=None):
+        """Time each step of calculate_state_and_goal with a PhaseProfiler.
+
+        Returns the profiler. This replaces calculate_state_and_goal on this
+        instance; without it, the only cost is calling a no-op for each step.
+        """
+        from .profiling import PhaseProfiler
+        self.profiler = profiler or PhaseProfiler(window=1000)
+        self.calculate_state_and_goal = self._profiled_calculate_state_and_goal
+        return self.profiler
 
-        return self.active_task.calculate_state_and_goal()
+    def disable_profiling(self):
+        self.profiler = None
+        self.__dict__.pop('calculate_state_and_goal', None)
 
     def debug_pub(self, topic, value):
         pass  # Overridden in subclass to send ROS message
@@ -77,3 +77,31 @@ class RosTasksRunner(TasksRunner):
         task.debug_pub = self.debug_pub
         task.init_ros()
         return task
+
+    def start_profiling(self, interval=10):
+        """Time calculate_state_and_goal, and publish the timings on
+        /diagnostics every *interval* seconds"""
+        from diagnostic_msgs.msg import DiagnosticArray
+        self.enable_profiling()
+        self._diagnostics_pub = rospy.Publisher('diagnostics', DiagnosticArray,
+                                                queue_size=1)
+        rospy.Timer(rospy.Duration(interval), self.publish_profile)
+
+    def publish_profile(self, event=None):
+        """Publish the phase timings, in microseconds, as a DiagnosticArray"""
+        from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+        values = []
+        for phase in self.profiler.phases:
+            summary = self.profiler.histograms[phase].summary()
+            for stat in ('mean', 'p50', 'p95', 'p99', 'max'):
+                values.append(KeyValue('{} {} (us)'.format(phase, stat),
+                                       '{:.1f}'.format(summary[stat] * 1e6)))
+        total = self.profiler.histograms.get('total')
+        message = 'no samples' if total is None else \
+                  'p95 {:.0f}us per tick'.format(total.percentile(95) * 1e6)
+        status = DiagnosticStatus(level=DiagnosticStatus.OK,
+                                  name=rospy.get_name() + ': calculate_state_and_goal',
+                                  message=message, hardware_id='', values=values)
+        msg = DiagnosticArray(status=[status])
+        msg.header.stamp = rospy.Time.now()
+        self._diagnostics_pub.publish(msg)
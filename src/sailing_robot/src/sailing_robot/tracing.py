@@ -0,0 +1,145 @@
+"""Tracing how long sensor data takes to reach the actuators.
+
+The data topics (heading, goal_heading, rudder_control...) are plain std_msgs
+with no timestamps. With trace/enabled set, each node along the way also
+publishes a TraceEvent on /trace when it publishes its output:
+
+- The node reading a sensor starts a trace with a new ID: Tracer.start().
+- Nodes further along listen for the events of their input topics, and
+  after publishing their own output call Tracer.forward(), which passes on
+  the latest trace for each input with this node's output added to the path.
+
+A TraceCollector (run by the debugging_latency_trace node) gathers the
+events, and reports the time from the sensor reading for each path, e.g.
+/heading>/goal_heading>/rudder_control, and each node's processing time.
+
+Trace events travel separately from the data. If the data arrives first, the
+trace is matched when it arrives shortly after, and the received time is NaN
+as the processing time for that step isn't known.
+"""
+from __future__ import division
+
+from collections import namedtuple
+import math
+import time
+
+from .latency import LatencyWindow, format_summary
+
+TraceRecord = namedtuple('TraceRecord', ['trace_id', 'path', 'node',
+                                         'origin_time', 'received', 'published'])
+
+class Tracer(object):
+    """Trace events for one node, publishing *output*.
+
+    inputs are the topics the output is calculated from. publish is called
+    with a TraceRecord for each event.
+    """
+    def __init__(self, node, output, inputs=(), publish=None, clock=time.time,
+                 match_window=0.05):
+        self.node = node
+        self.output = output
+        self.inputs = set(inputs)
+        self.publish = publish or (lambda record: None)
+        self.clock = clock
+        self.match_window = match_window
+        self._next_id = 0
+        self._latest = {}    # path: (record, time received)
+        # Time of a forward() with no traces to pass on, and the paths
+        # matched to it since
+        self._waiting = None
+        self._matched = set()
+
+    def start(self, t_read=None):
+        """Start a trace at a sensor, after publishing data read at t_read"""
+        now = self.clock()
+        if t_read is None:
+            t_read = now
+        record = TraceRecord(self._next_id, self.output, self.node,
+                             t_read, t_read, now)
+        self._next_id = (self._next_id + 1) % 2**32
+        self.publish(record)
+        return record
+
+    def receive(self, record):
+        """Handle a trace event from /trace"""
+        if record.path.rsplit('>', 1)[-1] not in self.inputs:
+            return
+        now = self.clock()
+        if self._waiting is not None and record.path not in self._matched \
+                and record.origin_time <= self._waiting \
+                and now - self._waiting < self.match_window:
+            # The data got here before its trace
+            self._matched.add(record.path)
+            self._emit(record, float('nan'), self._waiting)
+        else:
+            self._latest[record.path] = (record, now)
+
+    def forward(self):
+        """Pass on the traces of the inputs, after publishing the output"""
+        now = self.clock()
+        self._matched.clear()
+        if not self._latest:
+            self._waiting = now
+            return
+        self._waiting = None
+        for record, received in self._latest.values():
+            self._emit(record, received, now)
+        self._latest.clear()
+
+    def _emit(self, record, received, published):
+        self.publish(TraceRecord(record.trace_id,
+                                 record.path + '>' + self.output, self.node,
+                                 record.origin_time, received, published))
+
+def ros_tracer(output, inputs=()):
+    """A Tracer publishing to /trace, or None unless trace/enabled is set.
+
+    Topic names are resolved as rospy does, so remapping is followed. Call
+    after rospy.init_node().
+    """
+    import rospy
+    if not rospy.get_param('trace/enabled', False):
+        return None
+    from sailing_robot.msg import TraceEvent
+    pub = rospy.Publisher('trace', TraceEvent, queue_size=50)
+    tracer = Tracer(rospy.get_name(), rospy.resolve_name(output),
+                    [rospy.resolve_name(i) for i in inputs],
+                    publish=lambda record: pub.publish(TraceEvent(*record)))
+    if inputs:
+        rospy.Subscriber('trace', TraceEvent, lambda msg: tracer.receive(
+                TraceRecord._make(getattr(msg, f) for f in TraceRecord._fields)))
+    return tracer
+
+class TraceCollector(object):
+    """Latency statistics from trace events"""
+    def __init__(self, window=500):
+        self.window = window
+        self.pipeline = {}     # path: LatencyWindow of time since the reading
+        self.processing = {}   # node: LatencyWindow of published - received
+
+    def _add(self, windows, key, value):
+        if key not in windows:
+            windows[key] = LatencyWindow(self.window)
+        windows[key].add(value)
+
+    def add(self, record):
+        if '>' in record.path:
+            self._add(self.pipeline, record.path,
+                      record.published - record.origin_time)
+        if not math.isnan(record.received):
+            self._add(self.processing, record.node,
+                      record.published - record.received)
+
+    def summary(self):
+        """{'pipeline': {path: summary}, 'processing': {node: summary}},
+        with summaries from LatencyWindow.summary()"""
+        return {'pipeline': dict((k, w.summary()) for k, w in self.pipeline.items()),
+                'processing': dict((k, w.summary()) for k, w in self.processing.items())}
+
+    def report(self):
+        """Lines of text describing the latencies"""
+        lines = [format_summary(path, w.summary())
+                 for path, w in sorted(self.pipeline.items())]
+        lines += [format_summary('processing ' + node, w.summary())
+                  for node, w in sorted(self.processing.items())]
+        return lines
@@ -0,0 +1,107 @@
+"""Running a node's computation when new sensor data arrives.
+
+Nodes like tasks and helming recompute from the latest readings in a loop.
+Sleeping on a fixed rate means new data can wait up to a whole period before
+it's used, at each node it passes through. With an EventTrigger, subscriber
+callbacks notify it of new data, and the loop wakes up to use it straight
+away:
+
+    trigger = EventTrigger(rate=10, max_rate=50, event_driven=True)
+    rospy.Subscriber('heading', Float32, trigger.wrap('heading', nav.update_heading))
+
+    while not rospy.is_shutdown():
+        if trigger.wait(timeout=0.5) is None:
+            continue
+        ... calculate and publish ...
+        trigger.done()
+
+Samples arriving closer together than 1/max_rate are coalesced into one run.
+If nothing arrives, it still runs at *rate*, so that timeouts are noticed.
+With event_driven=False, it runs at *rate* like rospy.Rate.
+
+Either way, trigger.latency records the time from the oldest sample used in
+each run to done(), i.e. how long this node adds to the sensor to actuator
+delay.
+"""
+from __future__ import division
+
+import threading
+import time
+
+from .latency import LatencyWindow
+
+class EventTrigger(object):
+    def __init__(self, rate, max_rate=None, event_driven=True, clock=time.time,
+                 window=500):
+        self.period = 1 / rate
+        self.min_interval = 1 / max_rate if max_rate else 0.
+        self.event_driven = event_driven
+        self.clock = clock
+        self.latency = LatencyWindow(window)
+        # Notifications merged into a run which already had new data
+        self.coalesced = 0
+
+        self._cond = threading.Condition()
+        self._pending = {}   # source: time its first unused sample arrived
+        self._batch = {}
+        self._last_run = None
+
+    def notify(self, source='data'):
+        """Record that new data has arrived; called from subscriber callbacks"""
+        with self._cond:
+            if source in self._pending:
+                self.coalesced += 1
+            else:
+                self._pending[source] = self.clock()
+            if self.event_driven:
+                self._cond.notify()
+
+    def wrap(self, source, callback=None):
+        """A subscriber callback which calls *callback* and then notify()"""
+        def notifying_callback(msg):
+            if callback is not None:
+                callback(msg)
+            self.notify(source)
+        return notifying_callback
+
+    def time_to_next(self, now):
+        """Seconds until the computation should run next (0: run now)"""
+        if self._last_run is None:
+            return 0.
+        heartbeat = self._last_run + self.period - now
+        if self.event_driven and self._pending:
+            heartbeat = min(heartbeat, self._last_run + self.min_interval - now)
+        return max(heartbeat, 0.)
+
+    def wait(self, timeout=None):
+        """Block until it's time to run.
+
+        Returns the sorted names of the sources with new data (empty if it's
+        running because nothing arrived for a whole period), or None if
+        *timeout* seconds passed first.
+        """
+        with self._cond:
+            start = self.clock()
+            while True:
+                now = self.clock()
+                delay = self.time_to_next(now)
+                if delay <= 0:
+                    break
+                if timeout is not None:
+                    remaining = start + timeout - now
+                    if remaining <= 0:
+                        return None
+                    delay = min(delay, remaining)
+                self._cond.wait(delay)
+            self._last_run = now
+            self._batch, self._pending = self._pending, {}
+        return sorted(self._batch)
+
+    def done(self):
+        """Call after publishing the output. Returns the latency recorded
+        for this run, or None if there was no new data."""
+        if not self._batch:
+            return None
+        latency = self.clock() - min(self._batch.values())
+        self.latency.add(latency)
+        return latency
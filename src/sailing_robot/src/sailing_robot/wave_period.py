@@ -0,0 +1,167 @@
+"""Wave period from vertical acceleration, one reading at a time.
+
+The readings are smoothed with a Savitzky-Golay filter, and the local maxima,
+minima and upward crossings of the mean level of the smoothed signal are
+picked out as each reading arrives. The wave period is the average spacing
+of the maxima and minima over the last *history* readings, as the
+wave_period node used to calculate it from the whole window every time:
+
+    det = WavePeriodDetector(rate=100)
+    det.update(acc_z)        # for every reading
+    det.period()             # seconds, or None until there are enough extrema
+
+The smoothed value for a reading can only be calculated once half a filter
+window of later readings has arrived, so extrema are found half a window
+(0.25s with the defaults) after they happen.
+"""
+from __future__ import division
+
+from collections import deque
+from math import factorial, fsum
+import numpy as np
+
+def savgol_coeffs(window_size, order, deriv=0, rate=1):
+    """Savitzky-Golay filter coefficients, to be applied as a dot product
+    with the window of readings (oldest first).
+    """
+    window_size = abs(int(window_size))
+    order = abs(int(order))
+    if window_size % 2 != 1 or window_size < 1:
+        raise TypeError("window_size size must be a positive odd number")
+    if window_size < order + 2:
+        raise TypeError("window_size is too small for the polynomials order")
+
+    half_window = (window_size - 1) // 2
+    b = np.array([[k**i for i in range(order + 1)]
+                  for k in range(-half_window, half_window + 1)], dtype=float)
+    return np.linalg.pinv(b)[deriv] * rate**deriv * factorial(deriv)
+
+def savitzky_golay(y, window_size, order, deriv=0, rate=1, coeffs=None):
+    """Smooth a whole array, padding the ends with values mirrored from it.
+
+    Pass precomputed coeffs from savgol_coeffs() to avoid recalculating them.
+    """
+    if coeffs is None:
+        coeffs = savgol_coeffs(window_size, order, deriv, rate)
+    y = np.asarray(y, dtype=float)
+    half_window = (len(coeffs) - 1) // 2
+    firstvals = y[0] - np.abs(y[1:half_window+1][::-1] - y[0])
+    lastvals = y[-1] + np.abs(y[-half_window-1:-1][::-1] - y[-1])
+    y = np.concatenate((firstvals, y, lastvals))
+    return np.convolve(coeffs[::-1], y, mode='valid')
+
+class WavePeriodDetector(object):
+    """Online Savitzky-Golay smoothing with extrema and crossing detection.
+
+    rate is the reading rate in Hz. Extrema and crossings are kept for the
+    last *history* readings; indices count readings since the start.
+    """
+    def __init__(self, rate=100, window_size=51, order=3, history=500):
+        self.rate = rate
+        self.history = history
+        self.coeffs = savgol_coeffs(window_size, order)
+        self.window_size = len(self.coeffs)
+        self.half_window = (self.window_size - 1) // 2
+
+        # Each reading is stored twice, window_size apart, so that the latest
+        # window is always one contiguous slice of the buffer.
+        self._buf = np.zeros(2 * self.window_size)
+        self.count = 0    # readings so far
+        self.smoothed_count = 0
+
+        # Recent smoothed values for the extrema test and the mean level
+        self._prev = None
+        self._prev2 = None
+        self._level_values = deque(maxlen=history)
+        self._level_sum = 0.0
+
+        self.maxima = deque()
+        self.minima = deque()
+        self.crossings = deque()
+
+    def update(self, value):
+        """Add one reading. Returns the newly smoothed value, or None."""
+        i = self.count % self.window_size
+        self._buf[i] = self._buf[i + self.window_size] = value
+        self.count += 1
+        if self.count < self.window_size:
+            return None
+        start = self.count % self.window_size
+        smoothed = float(np.dot(self.coeffs,
+                                self._buf[start:start + self.window_size]))
+        self._add_smoothed(smoothed)
+        return smoothed
+
+    def extend(self, values):
+        """Add a batch of readings, e.g. from the IMU FIFO"""
+        for v in values:
+            self.update(v)
+
+    def _add_smoothed(self, s):
+        # Index of the reading this smoothed value belongs to
+        index = self.smoothed_count + self.half_window
+        self.smoothed_count += 1
+
+        prev, prev2 = self._prev, self._prev2
+        if prev2 is not None:
+            if prev > prev2 and prev > s:
+                self.maxima.append(index - 1)
+            elif prev < prev2 and prev < s:
+                self.minima.append(index - 1)
+
+        # Upward crossings of the mean of the smoothed values
+        if len(self._level_values) == self.history:
+            self._level_sum -= self._level_values[0]
+        self._level_values.append(s)
+        self._level_sum += s
+        if self.smoothed_count % self.history == 0:
+            # Stop rounding errors from accumulating
+            self._level_sum = fsum(self._level_values)
+        if prev is not None:
+            level = self._level_sum / len(self._level_values)
+            if prev < level <= s:
+                self.crossings.append(index)
+
+        self._prev2, self._prev = prev, s
+
+        oldest = self.count - self.history
+        for q in (self.maxima, self.minima, self.crossings):
+            while q and q[0] < oldest:
+                q.popleft()
+
+    @staticmethod
+    def _mean_spacing(indices):
+        if len(indices) < 2:
+            return None
+        return (indices[-1] - indices[0]) / (len(indices) - 1)
+
+    def period(self):
+        """Wave period in seconds from the spacing of maxima and minima"""
+        pmax = self._mean_spacing(self.maxima)
+        pmin = self._mean_spacing(self.minima)
+        if pmax is None or pmin is None:
+            return None
+        return (pmax + pmin) / 2 / self.rate
+
+    def crossing_period(self):
+        """Wave period in seconds from the upward mean-level crossings"""
+        p = self._mean_spacing(self.crossings)
+        return None if p is None else p / self.rate
+
+    def time_since_minimum(self):
+        """Seconds from the latest minimum of the smoothed signal to now"""
+        if not self.minima:
+            return None
+        return (self.count - self.minima[-1]) / self.rate
+
+    def position(self):
+        """Time since the latest minimum as a fraction of the wave period.
+
+        This is what the wave_period node publishes. Returns None until there
+        are enough extrema.
+        """
+        period = self.period()
+        t = self.time_since_minimum()
+        if period is None or t is None:
+            return None
+        return t / period
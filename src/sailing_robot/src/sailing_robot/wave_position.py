@@ -22,9 +22,15 @@ the queue are coppied to ydata variable every time update is called and time fro
 then refresh_time. When this happens, xdata are generated based on the frequency and number of items in ydata.
 Next sine function is fitted to xdata, ydata. Prediction of the position on the wave is made based on this sine
 function and time that has passed from the last refresh.
+
+Wave_position_pll has the same interface, but instead of refitting a window of
+data it tracks amplitude, frequency and phase with a phase-locked loop, which
+costs the same small amount of work for every reading. It suits running at the
+full IMU rate on the Pi, where the curve fit causes CPU spikes every refresh.
 """
 
 from collections import deque
+import math
 import time
 import copy
 import numpy as np
@@ -131,6 +137,90 @@ class Wave_position():
             return "initializing"
 
 
+class Wave_position_pll(object):
+    """Recursive sinusoid tracker with the same interface as Wave_position.
+
+    The readings are modelled as offset + amplitude * cos(phase), and each
+    reading nudges the offset, amplitude, frequency and phase estimates
+    towards it (an enhanced phase-locked loop). The phase is wrapped to
+    0-2pi, and a crest is where it crosses 0, as for the fitted curve.
+
+    frequency is the rate of readings in Hz. For the first time_range
+    seconds of readings, get_position() returns "initializing" while the
+    loop locks on. The gains are per second, so they don't depend on the
+    reading rate; larger gains lock on faster but follow noise more.
+    """
+    def __init__(self, frequency, time_range, wave_frequency=1.0,
+                 min_wave_frequency=0.3, max_wave_frequency=4.0,
+                 amplitude_gain=1.0, frequency_gain=1.0, phase_gain=2.0,
+                 offset_gain=0.5, clock=time.time):
+        # wave_frequency and its limits are in rad/s
+        self.period = 1.0 / frequency
+        self.required_count = frequency * time_range
+        self.count = 0
+        self.initializing = True
+        self.clock = clock
+
+        self.min_wave_frequency = min_wave_frequency
+        self.max_wave_frequency = max_wave_frequency
+        self.amplitude_gain = amplitude_gain
+        self.frequency_gain = frequency_gain
+        self.phase_gain = phase_gain
+        self.offset_gain = offset_gain
+
+        self.offset = None
+        self.amplitude = 1.0
+        self.wave_frequency = wave_frequency
+        self.phase = 0.0
+        self.last_update = None  # time of the latest reading
+
+    def update(self, data_point):
+        # data point, vertical acceleration reading
+        if self.offset is None:
+            self.offset = data_point
+        dt = self.period
+        c = math.cos(self.phase)
+        s = math.sin(self.phase)
+        error = data_point - self.offset - self.amplitude * c
+        # Normalise the phase and frequency corrections by the amplitude, so
+        # that the loop behaves the same in big and small waves.
+        amplitude = max(self.amplitude, 1e-3)
+
+        self.offset += dt * self.offset_gain * error
+        self.amplitude += dt * self.amplitude_gain * error * c
+        w = self.wave_frequency
+        w -= dt * self.frequency_gain * error * s * w * w / amplitude
+        self.wave_frequency = min(max(w, self.min_wave_frequency),
+                                  self.max_wave_frequency)
+        phase = self.phase + dt * (self.wave_frequency
+                                   - self.phase_gain * error * s / amplitude)
+        self.phase = phase % (2 * math.pi)
+        self.last_update = self.clock()
+
+        if self.initializing:
+            self.count += 1
+            if self.count >= self.required_count:
+                self.initializing = False
+
+    @property
+    def wave_period(self):
+        """Current estimate of the wave period in seconds"""
+        return 2 * math.pi / self.wave_frequency
+
+    def get_position(self):
+        """Returns predicted position on the wave (number 0-1).
+
+        As for Wave_position.get_position(), 0 is the crest, 0.5 the trough,
+        and the number increases until the next crest. The phase is
+        extrapolated from the latest reading to now.
+        """
+        if self.initializing:
+            return "initializing"
+        diff = max(self.clock() - self.last_update, 0.0)
+        phase = (self.phase + self.wave_frequency * diff) % (2 * math.pi)
+        return phase / (2 * math.pi)
+
+
 
     ################################################
     ## Debug Methods
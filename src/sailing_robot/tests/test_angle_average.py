@@ -1,6 +1,7 @@
+import random
 import unittest
 
-from sailing_robot.navigation import angle_average
+from sailing_robot.navigation import angle_average, RunningCircularMean
 
 class AngleAverageTests(unittest.TestCase):
     def test_realValues(self):
@@ -16,3 +17,31 @@ class AngleAverageTests(unittest.TestCase):
         angle_average([1,359])
 
         angle_average([90,270])
+
+class RunningCircularMeanTests(unittest.TestCase):
+    def test_matches_angle_average(self):
+        rng = random.Random(42)
+        rcm = RunningCircularMean(50, resync_every=7)
+        angles = []
+        for _ in range(500):
+            a = rng.gauss(0, 40) % 360
+            angles.append(a)
+            rcm.push(a)
+            window = angles[-50:]
+            self.assertEqual(len(rcm), len(window))
+            self.assertAlmostEqual(rcm.mean(), angle_average(window), places=6)
+
+    def test_wraparound(self):
+        rcm = RunningCircularMean(2)
+        rcm.push(100)
+        rcm.push(350)
+        rcm.push(30)
+        self.assertAlmostEqual(rcm.mean(), 10)
+
+    def test_resync_removes_drift(self):
+        rcm = RunningCircularMean(3, resync_every=10**9)
+        for a in [1, 2, 3]:
+            rcm.push(a)
+        rcm.sum_sin += 1e-3
+        rcm.resync()
+        self.assertAlmostEqual(rcm.mean(), 2)
@@ -1,5 +1,16 @@
-from nose.tools import assert_equal
-from sailing_robot.gps_utils import ubx_checksum
+import ctypes
+import math
+import unittest
+from nose.tools import assert_equal, assert_almost_equal, assert_raises
+from sailing_robot.gps_utils import (ubx_checksum, UBXMessage, UbxNmeaParser,
+    decode_ubx, cfg_rate, gps_profile, fix_age, NavPvt, NavSol, UbloxDDC,
+    UBXChecksumError, NAV_PVT, NAV_SOL, CFG_RATE, WGS84_A, WGS84_E2,
+)
+
+try:
+    from smbus2.smbus2 import I2C_M_RD
+except ImportError:
+    I2C_M_RD = None
 
 def test_ubx_checksum():
     assert_equal(ubx_checksum(b'\x06\x01\x08\x00\xF0\x02\x00\x00\x00\x00\x00\x01'),
@@ -14,3 +25,217 @@ def test_ubx_checksum():
                     b'\x01\x2B')
     assert_equal(ubx_checksum(b'\x06\x08\x06\x00\xC8\x00\x01\x00\x01\x00'),
                     b'\xDE\x6A')
+
+def _sample_stream():
+    gga = (b'$GPGGA,092750.000,5321.6802,N,00630.3372,W,1,8,1.03,61.7,M,'
+           b'55.2,M,,*76\r\n')
+    vtg = b'$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n'
+    # serialise() adds 2 bytes after the message, which we don't want here
+    ubx = UBXMessage(b'\x01\x07', b'\x00' * 92).serialise()[:-2]
+    return b'A,N,*2C\r\n' + (gga + ubx + vtg + b'\xb5\x00junk' + gga) * 20
+
+def test_stream_parser_whole():
+    parser = UbxNmeaParser()
+    parser.feed(_sample_stream())
+    msgs = list(parser.get_msgs())
+    assert_equal(len(msgs), 1 + 20 * 5)
+    assert_equal(msgs[0], b'A,N,*2C\r\n')
+    assert_equal(msgs[1].sentence_type, 'GGA')
+    assert_equal(msgs[2][:4], b'\xb5\x62\x01\x07')
+    assert_equal(len(msgs[2]), 100)
+    assert_equal(msgs[3].sentence_type, 'VTG')
+    assert_equal(msgs[4], b'\xb5\x00junk')
+    assert_equal(parser.buffered_bytes, 0)
+
+def test_stream_parser_chunked():
+    import random
+    data = _sample_stream()
+    expected = [str(m) for m in _parse_all(data, [len(data)])]
+    rng = random.Random(1)
+    for _ in range(20):
+        sizes = [rng.randint(1, 40) for _ in range(len(data))]
+        assert_equal([str(m) for m in _parse_all(data, sizes)], expected)
+
+def test_stream_parser_compacts():
+    parser = UbxNmeaParser()
+    gga = (b'$GPGGA,092750.000,5321.6802,N,00630.3372,W,1,8,1.03,61.7,M,'
+           b'55.2,M,,*76\r\n')
+    for _ in range(500):
+        parser.feed(gga)
+        assert_equal(len(list(parser.get_msgs())), 1)
+    parser.feed(gga[:10])
+    assert_equal(list(parser.get_msgs()), [])
+    assert len(parser._buf) < UbxNmeaParser.COMPACT_THRESHOLD * 2
+    assert_equal(parser.buf, gga[:10])
+
+def _parse_all(data, sizes):
+    parser = UbxNmeaParser()
+    msgs = []
+    i = 0
+    for n in sizes:
+        parser.feed(data[i:i+n])
+        msgs.extend(parser.get_msgs())
+        i += n
+        if i >= len(data):
+            break
+    return msgs
+
+def _nav_pvt_frame():
+    payload = NavPvt.STRUCT.pack(
+        475200000, 2017, 10, 12, 9, 27, 50, 0x07, 30, 0, 3, 0x01, 0, 9,
+        -13965000, 508935000, 45000, 30000, 1500, 2500,
+        1000, -1000, 0, 1414, 31500000, 200, 500000, 120) + b'\x00' * 14
+    return UBXMessage(NAV_PVT, payload).serialise()[:-2]
+
+def test_decode_nav_pvt():
+    pvt = decode_ubx(_nav_pvt_frame())
+    assert_equal(pvt.numSV, 9)
+    assert pvt.fix_ok
+    assert pvt.time_valid
+    lat, lon, alt = pvt.position()
+    assert_almost_equal(lat, 50.8935)
+    assert_almost_equal(lon, -1.3965)
+    assert_almost_equal(alt, 30.0)
+    assert_equal(pvt.position_accuracy(), (1.5, 2.5))
+    speed, heading = pvt.ground_velocity()
+    assert_almost_equal(speed, 1.414)
+    assert_almost_equal(heading, 315)
+
+def test_decode_ubx_checksum():
+    frame = bytearray(_nav_pvt_frame())
+    frame[10] ^= 0xff
+    assert_raises(UBXChecksumError, decode_ubx, bytes(frame))
+    # Messages we don't decode are left alone
+    assert_equal(decode_ubx(UBXMessage(b'\x01\x03', b'\x00' * 16).serialise()[:-2]), None)
+
+def test_decode_ubx_poll_request():
+    # A NAV-PVT poll request has the same class & id, with no payload
+    assert_equal(decode_ubx(UBXMessage(NAV_PVT, b'').serialise()[:-2]), None)
+    assert_equal(decode_ubx(UBXMessage(NAV_SOL, b'\x00' * 10).serialise()[:-2]), None)
+
+def test_decode_nav_sol():
+    # Southampton, moving north east at 1 m/s
+    lat, lon, h = math.radians(50.8935), math.radians(-1.3965), 50.
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+    x = (n + h) * math.cos(lat) * math.cos(lon)
+    y = (n + h) * math.cos(lat) * math.sin(lon)
+    z = (n * (1 - WGS84_E2) + h) * math.sin(lat)
+    v_n = v_e = math.sqrt(0.5)
+    vx = -math.sin(lat) * math.cos(lon) * v_n - math.sin(lon) * v_e
+    vy = -math.sin(lat) * math.sin(lon) * v_n + math.cos(lon) * v_e
+    vz = math.cos(lat) * v_n
+    payload = NavSol.STRUCT.pack(
+        475200000, 0, 1970, 3, 0x0d, int(round(x * 100)), int(round(y * 100)),
+        int(round(z * 100)), 250, int(round(vx * 100)), int(round(vy * 100)),
+        int(round(vz * 100)), 30, 150, 0, 8, 0)
+    parser = UbxNmeaParser(decode_ubx=True)
+    parser.feed(UBXMessage(NAV_SOL, payload).serialise()[:-2])
+    sol, = parser.get_msgs()
+    assert isinstance(sol, NavSol)
+    assert sol.fix_ok
+    assert_equal(sol.numSV, 8)
+    lat2, lon2, h2 = sol.position()
+    assert_almost_equal(lat2, 50.8935, places=6)
+    assert_almost_equal(lon2, -1.3965, places=6)
+    assert_almost_equal(h2, 50, places=1)
+    speed, heading = sol.ground_velocity()
+    assert_almost_equal(speed, 1, places=1)
+    assert abs(heading - 45) < 1
+
+def test_cfg_rate():
+    # The same message we used to send to set 5Hz
+    assert_equal(cfg_rate(5).serialise(),
+                 b'\xB5\x62\x06\x08\x06\x00\xC8\x00\x01\x00\x01\x00\xDE\x6A\x10\x13')
+    assert_equal(cfg_rate(10).payload, b'\x64\x00\x01\x00\x01\x00')
+    assert_raises(ValueError, cfg_rate, 20)
+
+def test_gps_profile():
+    msgs = gps_profile(10, {'GGA': 1, 'ZDA': 8, 'NAV-PVT': 1})
+    assert_equal(msgs[0].msg_id, CFG_RATE)
+    rates = dict((m.payload[:2], m.payload[2:]) for m in msgs[1:])
+    assert_equal(rates[b'\xf0\x00'], b'\x01')   # GGA
+    assert_equal(rates[b'\xf0\x08'], b'\x08')   # ZDA
+    assert_equal(rates[b'\xf0\x05'], b'\x00')   # VTG off
+    assert_equal(rates[NAV_PVT], b'\x01')
+    assert NAV_SOL not in rates
+    assert_raises(ValueError, gps_profile, 5, {'XYZ': 1})
+
+def test_fix_age():
+    from datetime import datetime
+    now = datetime(2017, 10, 12, 9, 27, 50, 250000)
+    assert_almost_equal(fix_age(9, 27, 50.1, now), 0.15)
+    # Across midnight
+    now = datetime(2017, 10, 12, 0, 0, 0, 500000)
+    assert_almost_equal(fix_age(23, 59, 59.5, now), 1.0)
+
+class FakeDDCBus(object):
+    """Behaves like an smbus.SMBus attached to a u-blox receiver"""
+    def __init__(self, stream):
+        self.stream = bytearray(stream)
+        self.transactions = 0
+        self.written = []
+
+    def read_i2c_block_data(self, addr, reg, n):
+        self.transactions += 1
+        if reg == 0xFD:
+            avail = len(self.stream)
+            return [avail >> 8, avail & 0xff][:n]
+        assert reg == 0xFF
+        data, self.stream = self.stream[:n], self.stream[n:]
+        return list(data) + [0xff] * (n - len(data))
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self.written.append(bytes(bytearray([reg] + data)))
+
+def test_ubloxddc_read():
+    stream = _sample_stream()[:300]
+    bus = FakeDDCBus(stream)
+    ddc = UbloxDDC(bus, max_read=256)
+    assert_equal(bytes(ddc.read()), stream[:256])
+    # 1 transaction for the byte count, then 32 byte blocks
+    assert_equal(bus.transactions, 1 + 8)
+    assert_equal(bytes(ddc.read()), stream[256:])
+    assert_equal(len(ddc.read()), 0)
+
+class FakeRdwrBus(FakeDDCBus):
+    """Like an smbus2.SMBus, with combined i2c_rdwr transfers"""
+    def __init__(self, stream):
+        super(FakeRdwrBus, self).__init__(stream)
+        self.registers_read = []
+        self.rdwr_lengths = []
+
+    def read_i2c_block_data(self, addr, reg, n):
+        self.registers_read.append(reg)
+        return super(FakeRdwrBus, self).read_i2c_block_data(addr, reg, n)
+
+    def i2c_rdwr(self, *msgs):
+        for msg in msgs:
+            self.transactions += 1
+            assert msg.flags & I2C_M_RD
+            self.rdwr_lengths.append(msg.len)
+            data, self.stream = self.stream[:msg.len], self.stream[msg.len:]
+            ctypes.memmove(msg.buf, bytes(data), len(data))
+
+def test_ubloxddc_read_rdwr():
+    if I2C_M_RD is None:
+        raise unittest.SkipTest("Needs smbus2")
+    stream = _sample_stream()[:300]
+    bus = FakeRdwrBus(stream)
+    ddc = UbloxDDC(bus, max_read=256)
+    assert_equal(bytes(ddc.read()), stream[:256])
+    # The byte count from 0xFD/0xFE, then one transfer for the data
+    assert_equal(bus.registers_read, [0xFD])
+    assert_equal(bus.rdwr_lengths, [256])
+    assert_equal(bytes(ddc.read()), stream[256:])
+    assert_equal(bus.rdwr_lengths, [256, 44])
+
+    # Nothing waiting: only the byte count is read
+    assert_equal(len(ddc.read()), 0)
+    assert_equal(bus.registers_read, [0xFD] * 3)
+    assert_equal(bus.transactions, 5)
+
+def test_ubloxddc_write():
+    bus = FakeDDCBus(b'')
+    msg = cfg_rate(5).serialise()
+    UbloxDDC(bus).write(msg)
+    assert_equal(bus.written, [msg])
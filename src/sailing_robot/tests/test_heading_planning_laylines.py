@@ -42,3 +42,23 @@ class HeadingPlanTests(unittest.TestCase):
         state, goal_heading = self.hp.calculate_state_and_goal()
         self.assertEqual(state, 'switch_to_stbd_tack')
         self.assertAlmostEqual(goal_heading, 180)
+
+def test_between_laylines_matches_polygon():
+    import random
+    from sailing_robot.laylines import between_laylines, lay_triangle
+    random.seed(1)
+    for _ in range(500):
+        wind = random.uniform(0, 360)
+        beating_angle = random.uniform(30, 60)
+        x, y = random.uniform(-200, 200), random.uniform(-200, 200)
+        poly = lay_triangle(0, 0, wind, beating_angle, extent=150)
+        assert_equal(between_laylines(x, y, 0, 0, wind, beating_angle, extent=150),
+                     Point(x, y).within(poly))
+
+def test_lay_triangle_cache():
+    from sailing_robot.laylines import LayTriangleCache
+    cache = LayTriangleCache(threshold=2)
+    p1 = cache.get(0, 0, 180, 45)
+    assert cache.get(0, 0, 181, 45) is p1
+    assert cache.get(0, 0, 185, 45) is not p1
+    assert cache.get(10, 0, 185, 45) is not p1
@@ -0,0 +1,84 @@
+from nose.tools import assert_equal, assert_almost_equal, assert_true
+
+from sailing_robot.helming_engine import (HelmingEngine, HelmInputs,
+        TackBasic, JibeBasic, TackSheetOut, default_procedures)
+from sailing_robot.pid_control import PID
+from sailing_robot.sail_table import SailTable
+
+SAIL_TABLE = SailTable({0: 0, 45: 0.2, 90: 0.6, 180: 1.0})
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+def make_engine(procedures=None, **kwargs):
+    clock = FakeClock()
+    events = []
+    engine = HelmingEngine(SAIL_TABLE, PID(1.0, 0, 0, 40, -40, clock=clock),
+                           40, procedures or default_procedures(),
+                           timeout=15, clock=clock,
+                           on_event=lambda e, p: events.append((e, str(p))),
+                           **kwargs)
+    return engine, clock, events
+
+def test_normal():
+    engine, clock, events = make_engine()
+    # Goal to starboard of the heading: rudder to the left
+    rudder, sheet = engine.tick(HelmInputs('normal', 90, 100, 45), dt=0.1)
+    assert_equal(rudder, -10)
+    assert_almost_equal(sheet, 0.2)
+    # Apparent wind on the other side gives the same sail setting
+    rudder, sheet = engine.tick(HelmInputs('normal', 100, 100, 270), dt=0.1)
+    assert_equal(rudder, 0)
+    assert_almost_equal(sheet, 0.6)
+    assert_equal(events, [])
+
+def test_saturation():
+    engine, clock, events = make_engine()
+    rudder, _ = engine.tick(HelmInputs('normal', 0, 170, 45), dt=0.1)
+    assert_equal(rudder, -40)
+
+def test_procedures():
+    engine, clock, events = make_engine([TackBasic, JibeBasic])
+    rudder, sheet = engine.tick(HelmInputs('switch_to_port_tack', 0, 0, 45))
+    assert_equal(rudder, -40)
+    assert_almost_equal(sheet, 0.2)
+    assert_equal(events, [('start', 'TackBasic')])
+
+    # Timed out: the next procedure is tried
+    clock.t = 16
+    rudder, sheet = engine.tick(HelmInputs('switch_to_port_tack', 0, 0, 45))
+    assert_equal(rudder, 40)
+    assert_almost_equal(sheet, 0.4)
+    assert_equal(events[1:], [('fail', 'TackBasic'), ('start', 'JibeBasic')])
+
+    clock.t = 20
+    engine.tick(HelmInputs('normal', 0, 0, 45))
+    assert_equal(events[3:], [('success', 'JibeBasic')])
+    stats = engine.selector.stats['']
+    assert_almost_equal(stats['TackBasic'].mean, 1.0)
+    assert_almost_equal(stats['JibeBasic'].mean, 4 / 22.5)
+
+    # The quicker procedure is tried first next time
+    engine.tick(HelmInputs('switch_to_starboard_tack', 0, 0, 45))
+    assert_equal(events[4:], [('start', 'JibeBasic')])
+
+def test_switching_state_restarts():
+    engine, clock, events = make_engine([TackSheetOut, TackBasic])
+    engine.tick(HelmInputs('switch_to_port_tack', 0, 0, 45))
+    rudder, _ = engine.tick(HelmInputs('switch_to_starboard_tack', 0, 0, 45))
+    assert_equal(rudder, 40)
+    assert_equal(events, [('start', 'TackSheetOut'), ('start', 'TackSheetOut')])
+
+def test_not_recording():
+    contexts = iter([(0, None), (2, 1)])
+    engine, clock, events = make_engine(context=lambda: next(contexts))
+    engine.record_results = False
+    engine.tick(HelmInputs('switch_to_port_tack', 0, 0, 45))
+    engine.tick(HelmInputs('normal', 0, 0, 45))
+    assert_equal(engine.selector.stats.get('2/1', {}), {})
+    assert_true(engine.current_procedure is None)
+    assert_equal(events, [('start', 'TackBasic')])
@@ -0,0 +1,109 @@
+import struct
+import unittest
+
+try:
+    from sailing_robot import imu_utils
+except ImportError:
+    raise unittest.SkipTest("Needs smbus or smbus2")
+
+LSM, LGD = 0x1d, 0x6b
+
+class FakeBus(object):
+    """Register map for two devices, with auto-increment block reads"""
+    def __init__(self):
+        self.regs = {LSM: bytearray(256), LGD: bytearray(256)}
+        self.fifo = {LSM: bytearray(), LGD: bytearray()}
+        self.transactions = 0
+
+    def queue_samples(self, addr, samples):
+        for xyz in samples:
+            self.fifo[addr] += struct.pack('<hhh', *xyz)
+        self.regs[addr][0x2F] = min(len(self.fifo[addr]) // 6, 31)
+
+    def set_xyz(self, addr, reg, xyz):
+        self.regs[addr][reg:reg+6] = struct.pack('<hhh', *xyz)
+
+    def read_byte_data(self, addr, reg):
+        self.transactions += 1
+        return self.regs[addr][reg]
+
+    def read_i2c_block_data(self, addr, reg, n):
+        self.transactions += 1
+        assert reg & imu_utils.AUTO_INCREMENT
+        reg &= 0x7f
+        if reg == 0x28 and self.fifo[addr]:
+            data, self.fifo[addr] = self.fifo[addr][:n], self.fifo[addr][n:]
+            return list(data)
+        return list(self.regs[addr][reg:reg+n])
+
+    def write_byte_data(self, addr, reg, value):
+        self.regs[addr][reg] = value
+
+class ImuReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeBus()
+        self.bus.set_xyz(LSM, imu_utils.LSM_MAG_X_LSB, (100, -200, 30000))
+        self.bus.set_xyz(LSM, imu_utils.LSM_ACC_X_LSB, (-1, 16000, -16000))
+        self.bus.set_xyz(LGD, imu_utils.LGD_GYRO_X_LSB, (5, 0, -32768))
+        self.imu = imu_utils.ImuReader(1, LSM, LGD, bus=self.bus)
+
+    def test_read_all_matches_field_reads(self):
+        mag, acc, gyro = self.imu.read_all()
+        self.assertEqual(self.bus.transactions, 3)
+        self.assertEqual(mag, self.imu.read_mag_field())
+        self.assertEqual(acc, self.imu.read_acceleration())
+        self.assertEqual(gyro, self.imu.read_gyro())
+        self.assertEqual(gyro, (5, 0, -32768))
+
+    def test_configure_default(self):
+        self.imu.configure_for_reading()
+        regs = self.bus.regs[LSM]
+        self.assertEqual(regs[imu_utils.LSM_CTRL_1], 0b1010111)
+        self.assertEqual(regs[imu_utils.LSM_CTRL_5], 0b01100100)
+
+    def test_configure_for_rate(self):
+        self.imu.configure_for_reading(100)
+        regs = self.bus.regs[LSM]
+        self.assertEqual(regs[imu_utils.LSM_CTRL_1] >> 4, 0b0110)  # 100 Hz
+        self.assertEqual((regs[imu_utils.LSM_CTRL_5] >> 2) & 0b111, 0b101)
+        self.assertRaises(ValueError, self.imu.configure_for_reading, 500)
+
+    def test_fifo(self):
+        self.imu.configure_fifo(acc_odr=100)
+        self.assertEqual(self.bus.regs[LSM][imu_utils.LSM_FIFO_CTRL],
+                         imu_utils.FIFO_MODE_STREAM)
+        samples = [(i, -i, 1000 + i) for i in range(12)]
+        self.bus.queue_samples(LSM, samples)
+        times, block = self.imu.read_acc_fifo()
+        self.assertEqual(block.shape, (12, 3))
+        self.assertEqual(block.tolist(), [list(s) for s in samples])
+        self.assertAlmostEqual(times[1] - times[0], 0.01)
+        # SRC register, then 3 reads of up to 5 samples
+        self.assertEqual(self.bus.transactions, 4)
+
+        times, block = self.imu.read_gyro_fifo()
+        self.assertEqual(block.shape, (0, 3))
+        self.assertEqual(len(times), 0)
+
+    def test_fifo_clock(self):
+        clock = imu_utils.FifoClock(100)
+        t1 = clock.stamp(10, 100.0)
+        self.assertAlmostEqual(t1[-1], 100.0)
+        # The next block carries on evenly despite a little jitter in the read
+        t2 = clock.stamp(10, 100.104)
+        self.assertAlmostEqual(t2[0], 100.01)
+        # After a gap, it starts again from the read time
+        t3 = clock.stamp(5, 101.0)
+        self.assertAlmostEqual(t3[-1], 101.0)
+
+class AccelerationUnitsTests(unittest.TestCase):
+    def test_single_and_batch_agree(self):
+        # About 1g on z, as read at rest
+        raw = (120, -45, 16390)
+        single = imu_utils.acc_to_base_frame(raw)
+        rows = imu_utils.acc_batch_rows([12.5], [raw])
+        self.assertEqual(rows[0, 0], 12.5)
+        for a, b in zip(single, rows[0, 1:]):
+            self.assertAlmostEqual(a, b)
+        # m/s^2, with z flipped into the base frame
+        self.assertAlmostEqual(single[2], -9.8, places=1)
@@ -0,0 +1,19 @@
+from nose.tools import assert_equal, assert_almost_equal
+
+from sailing_robot.latency import LatencyWindow, format_summary
+
+def test_latency_window():
+    w = LatencyWindow(size=100)
+    assert_equal(w.summary(), None)
+    for i in range(1, 201):
+        w.add(i * 0.001)
+    assert_equal(len(w), 100)
+    assert_equal(w.total_count, 200)
+    s = w.summary()
+    assert_equal(s['n'], 100)
+    assert_almost_equal(s['p50'], 0.150)
+    assert_almost_equal(s['p95'], 0.195)
+    assert_almost_equal(s['p99'], 0.199)
+    assert_almost_equal(s['max'], 0.200)
+    assert_almost_equal(s['mean'], 0.1505)
+    assert 'p95=195.0ms' in format_summary('test', s)
@@ -0,0 +1,46 @@
+import os.path
+import unittest
+
+from sailing_robot.montecarlo import run_many, summarise
+from sailing_robot.sim import load_params
+
+PARAMS_DIR = os.path.join(os.path.dirname(__file__), '..', 'launch', 'parameters')
+
+class MonteCarloTests(unittest.TestCase):
+    def test_summarise(self):
+        results = [
+            {'wind_direction': 10, 'finished': True, 'error': None,
+             'time': 100., 'tacks': 2, 'safety_zone_excursions': 0},
+            {'wind_direction': 20, 'finished': False, 'error': None,
+             'time': float('nan'), 'tacks': 6, 'safety_zone_excursions': 1},
+            {'wind_direction': 200, 'finished': True, 'error': None,
+             'time': 300., 'tacks': 1, 'safety_zone_excursions': 0},
+        ]
+        rows = dict(summarise(results, sectors=4))
+        self.assertEqual(sorted(rows), ['  0- 90', '180-270', 'all'])
+        self.assertEqual(rows['  0- 90']['failures'], 1)
+        self.assertEqual(rows['  0- 90']['tacks_mean'], 4)
+        self.assertEqual(rows['all']['finished'], 2)
+        self.assertEqual(rows['all']['time_mean'], 200)
+        self.assertEqual(rows['all']['excursions'], 1)
+
+    def test_run_many_reproducible(self):
+        params = load_params(*[os.path.join(PARAMS_DIR, f) for f in
+            ['default.yaml', 'simulator.yaml', 'sailsettings_laser.yaml',
+             'Calshot_TriangleRace.yaml']])
+        a = run_many(params, 2, processes=1, seed=3, duration=60)
+        b = run_many(params, 2, processes=1, seed=3, duration=60)
+        self.assertEqual([r['index'] for r in a], [0, 1])
+        for ra, rb in zip(a, b):
+            self.assertIsNone(ra['error'])
+            self.assertEqual(ra['wind_direction'], rb['wind_direction'])
+            self.assertEqual(ra['tacks'], rb['tacks'])
+
+    def test_run_many_profile(self):
+        params = load_params(*[os.path.join(PARAMS_DIR, f) for f in
+            ['default.yaml', 'simulator.yaml', 'sailsettings_laser.yaml',
+             'Calshot_TriangleRace.yaml']])
+        results = run_many(params, 1, processes=1, seed=3, duration=10,
+                           profile=True)
+        profile = results[0]['profile']
+        self.assertAlmostEqual(profile.summary()['total']['n'], 100, delta=1)
@@ -44,3 +44,52 @@ def test_safety_zone():
     
     n.update_position(DummyNSFMsg(50.75, 1.02))
     assert_equal(n.check_safety_zone(), 2)
+
+SAFETY_ZONE_LL = [
+    (50.78, 1.00),
+    (50.78, 1.04),
+    (50.82, 1.04),
+    (50.82, 1.00),
+]
+
+def test_batch_matches_scalar():
+    from shapely.geometry import Point
+    n = Navigation(safety_zone_ll=SAFETY_ZONE_LL)
+    lats = [50.8, 50.78001, 50.75, 50.81, 50.7999]
+    lons = [1.02, 1.02, 1.02, 1.039999, 1.0]
+    wp = Point(*n.latlon_to_utm(50.81, 1.03))
+
+    xy = n.latlon_to_utm_many(lats, lons)
+    zone = n.check_safety_zone_many(xy)
+    d, h = n.distance_and_heading_many(xy, wp)
+
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        n.update_position(DummyNSFMsg(lat, lon))
+        assert_almost_equal(xy[i, 0], n.position_xy.x)
+        assert_almost_equal(xy[i, 1], n.position_xy.y)
+        assert_equal(zone[i], n.check_safety_zone())
+        d1, h1 = n.distance_and_heading(wp)
+        assert_almost_equal(d[i], d1)
+        assert_almost_equal(h[i], h1)
+
+def test_batch_no_safety_zone():
+    n = Navigation()
+    xy = n.latlon_to_utm_many([50.8, 50.9], [1.02, 1.03])
+    assert_equal(list(n.check_safety_zone_many(xy)), [0, 0])
+
+def test_position_views():
+    from shapely.geometry import Point
+    n = Navigation(utm_zone=30)
+    n.update_position(DummyNSFMsg(50.927482, -1.408787))
+    x, y = n.latlon_to_utm(50.927482, -1.408787)
+    assert_almost_equal(n.position_x, x)
+    assert_almost_equal(n.position_xy.y, y)
+    assert_almost_equal(n.position_ll.lat.decimal_degree, 50.927482)
+
+    n.position_xy = Point(10, 20)
+    assert_equal((n.position_x, n.position_y), (10, 20))
+    assert_equal(n.distance_and_heading(Point(10, 30)), (10, 0))
+
+    n.position_xy = (30, 40)
+    assert_equal((n.position_x, n.position_y), (30, 40))
+    assert_equal((n.position_xy.x, n.position_xy.y), (30, 40))
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+
+from sailing_robot import navigation
+from sailing_robot.navigation import vec
+
+class VecAngleTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # Mix of floats over a wide range, and integers including the
+        # wrap-around points
+        self.a = np.concatenate([rng.uniform(-720, 720, 1000),
+                                 rng.randint(-360, 720, 200),
+                                 [0, 180, 360, -180, 540]])
+        self.b = np.concatenate([rng.uniform(-720, 720, 1000),
+                                 rng.randint(-360, 720, 200),
+                                 [180, 0, 0, 0, 0]])
+
+    def check_pairwise(self, vec_func, scalar_func):
+        res = vec_func(self.a, self.b)
+        expected = [scalar_func(x, y) for x, y in zip(self.a.tolist(), self.b.tolist())]
+        np.testing.assert_array_equal(res, expected)
+
+    def test_angleSum(self):
+        self.check_pairwise(vec.angleSum, navigation.angleSum)
+
+    def test_angleAbsDistance(self):
+        self.check_pairwise(vec.angleAbsDistance, navigation.angleAbsDistance)
+
+    def test_angle_subtract(self):
+        self.check_pairwise(vec.angle_subtract, navigation.angle_subtract)
+
+    def test_scalars(self):
+        self.assertEqual(vec.angle_subtract(10, 350), 20)
+        self.assertEqual(vec.angleAbsDistance(10, 350), 20)
+
+    def test_angle_average(self):
+        rng = np.random.RandomState(1)
+        angles = rng.uniform(0, 360, (50, 7))
+        res = vec.angle_average(angles, axis=1)
+        for row, r in zip(angles.tolist(), res):
+            self.assertAlmostEqual(r, navigation.angle_average(row))
+        self.assertEqual(vec.angle_average([]), navigation.angle_average([]))
@@ -0,0 +1,73 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from nose.tools import assert_equal, assert_almost_equal
+
+from sailing_robot.pid_control import PID, _clamped_cumsum
+from sailing_robot.navigation_vec import angle_subtract
+
+def _loop(pid, errors, dt, p_states=None):
+    if p_states is None:
+        p_states = [None] * len(errors)
+    return np.array([pid.update_PID(e, dt, p) for e, p in zip(errors, p_states)])
+
+def test_clamped_cumsum():
+    rng = np.random.RandomState(0)
+    steps = rng.normal(0, 1, 2000)
+    expected = []
+    x = 0.0
+    for s in steps:
+        x = min(max(x + s, -5), 3)
+        expected.append(x)
+    assert_allclose(_clamped_cumsum(steps, -5, 3), expected, atol=1e-9)
+
+def test_simulate_matches_update():
+    rng = np.random.RandomState(1)
+    errors = np.cumsum(rng.normal(0, 5, 3000))
+    states = errors + 90
+    for kwargs in [{}, {'d_filter_tau': 0.5},
+                   {'derivative_on_measurement': True, 'd_filter_tau': 0.3}]:
+        pid = PID(0.5, 0.2, 0.1, 20, -20, **kwargs)
+        expected = _loop(pid, errors, 0.1, states)
+        pid.reset()
+        assert_allclose(pid.simulate(errors, 0.1, states), expected,
+                        rtol=1e-9, atol=1e-9)
+    # Negative integral gain swaps which limit applies to the error
+    pid = PID(0.5, -0.2, 0.1, 20, -20)
+    expected = _loop(pid, errors, 0.1)
+    assert_allclose(PID(0.5, -0.2, 0.1, 20, -20).simulate(errors, 0.1),
+                    expected, rtol=1e-9, atol=1e-9)
+
+def test_fixed_step_and_clock():
+    pid = PID(1, 0, 1, 1, -1, fixed_dt=0.5)
+    pid.update_PID(0)
+    assert_almost_equal(pid.update_PID(1), -1 - 2)
+
+    now = [100.0]
+    pid = PID(1, 0, 1, 1, -1, clock=lambda: now[0])
+    assert_equal(pid.update_PID(0), 0)  # No time has passed yet
+    now[0] += 0.25
+    assert_almost_equal(pid.update_PID(1), -1 - 4)
+
+def test_derivative_on_measurement():
+    # Changing the target changes the error, but not the measurement
+    pid = PID(0, 0, 1, 1, -1, fixed_dt=1, derivative_on_measurement=True)
+    pid.update_PID(0, p_state=10)
+    assert_equal(pid.update_PID(20, p_state=10), 0)
+    assert_equal(pid.update_PID(22, p_state=12), -2)
+
+def test_angle_difference():
+    # Heading crossing north: 359 -> 1 is +2 degrees, not -358
+    pid = PID(0, 0, 1, 1, -1, fixed_dt=1, derivative_on_measurement=True,
+              diff=angle_subtract)
+    pid.update_PID(0, p_state=359)
+    assert_almost_equal(pid.update_PID(0, p_state=1), -2)
+    pid.reset()
+    assert_allclose(pid.simulate([0, 0], 1, [359, 1]), [0, -2])
+
+def test_from_params():
+    rudder = {'maxAngle': 30, 'control': {'Kp': 0.5, 'Ki': 0, 'Kd': 0.1,
+                                           'fixed_step': True}}
+    pid = PID.from_params(rudder, rate=10)
+    assert_equal(pid.fixed_dt, 0.1)
+    assert_equal(pid.i_max, 30)
+    assert_equal(PID.from_params(rudder).fixed_dt, None)
@@ -0,0 +1,71 @@
+import os.path
+import numpy as np
+from numpy.testing import assert_allclose
+from nose.tools import assert_equal, assert_almost_equal, assert_raises, assert_true
+
+from sailing_robot.polar import Polar, laser_polar, find_params_file
+from sailing_robot.sim import load_params, param_group
+
+PARAMS_DIR = os.path.join(os.path.dirname(__file__), '..', 'launch', 'parameters')
+
+SIMPLE = dict(twa=[0, 45, 90, 180], tws=[0, 4, 8],
+              boat_speed=[[0, 0, 0, 0],
+                          [0, 2, 3, 2],
+                          [0, 3, 5, 4]])
+
+def test_bilinear():
+    p = Polar(**SIMPLE)
+    assert_almost_equal(p.speed(90, 4), 3)
+    assert_almost_equal(p.speed(67.5, 4), 2.5)
+    assert_almost_equal(p.speed(90, 6), 4)
+    assert_almost_equal(p.speed(67.5, 6), 3.25)
+    # Port and starboard, and angles outside 0-360
+    assert_almost_equal(p.speed(-90, 6), 4)
+    assert_almost_equal(p.speed(270, 6), 4)
+    assert_almost_equal(p.speed(450, 6), 4)
+
+def test_above_max_tws():
+    assert_almost_equal(Polar(**SIMPLE).speed(90, 16), 5)
+    p = Polar(above_max_tws='scale', **SIMPLE)
+    assert_almost_equal(p.speed(90, 16), 10)
+    assert_almost_equal(p.vmg(16)[1], 2 * p.vmg(8)[1])
+    assert_raises(ValueError, Polar, above_max_tws='extrapolate', **SIMPLE)
+
+def test_speed_many():
+    p = Polar(above_max_tws='scale', **SIMPLE)
+    rng = np.random.RandomState(0)
+    twa = rng.uniform(-360, 360, 500)
+    tws = rng.uniform(0, 12, 500)
+    assert_allclose(p.speed_many(twa, tws),
+                    [p.speed(a, s) for a, s in zip(twa, tws)], atol=1e-12)
+    # Broadcasting a sweep of angles against one wind speed
+    assert_equal(p.speed_many(np.arange(181), 5).shape, (181,))
+
+def test_vmg_angles():
+    p = Polar(**SIMPLE)
+    # Upwind: 2*cos(45) > 3*cos(90) = 0, and in between is worse
+    assert_almost_equal(p.beating_angle(4), 45)
+    # Downwind, the extra speed at a broad reach is worth sailing off for
+    angles = np.arange(90, 181)
+    vmg_down = -np.interp(angles, [90, 180], [3, 2]) * np.cos(np.radians(angles))
+    assert_equal(p.running_angle(4), angles[np.argmax(vmg_down)])
+    assert_almost_equal(p.vmg(4)[1], vmg_down.max())
+    assert_almost_equal(p.vmg(4)[0], 2 * np.cos(np.radians(45)))
+    assert_true(np.isnan(p.beating_angle(0)))
+
+def test_find_params_file():
+    assert_equal(os.path.realpath(find_params_file('polar_laser.yaml')),
+                 os.path.realpath(os.path.join(PARAMS_DIR, 'polar_laser.yaml')))
+
+def test_laser_polar():
+    p = laser_polar()
+    params = load_params(os.path.join(PARAMS_DIR, 'polar_laser.yaml'))
+    polar_params = param_group(params, 'polar')
+    angles = np.linspace(0, 180, 721)
+    relative = np.interp(angles, polar_params['twa'], polar_params['boat_speed'][1])
+    # The 1 degree grid is close to interpolating the table directly
+    assert_allclose(p.speed_many(angles, 5), 5 * relative, atol=0.02)
+    assert_equal(p.beating_angle(5), 50)
+    assert_equal(p.running_angle(5), 165)
+    assert_almost_equal(Polar.from_params(polar_params).speed(90, 5),
+                        p.speed(90, 5))
@@ -0,0 +1,94 @@
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal, assert_raises, assert_true
+
+from sailing_robot.procedure_selector import RunningStats, ProcedureSelector, bucket
+
+NAMES = ['TackBasic', 'TackSheetOut', 'Tack_IncreaseAngleToWind', 'JibeBasic']
+
+def test_running_stats():
+    values = np.random.RandomState(0).normal(10, 3, 100)
+    s = RunningStats()
+    for v in values:
+        s.add(v)
+    assert_equal(s.count, 100)
+    assert_almost_equal(s.mean, values.mean())
+    assert_almost_equal(s.variance, values.var(ddof=1))
+
+    # With max_count, the mean follows a change in the values
+    s = RunningStats(max_count=10)
+    for v in [20] * 50 + [5] * 50:
+        s.add(v)
+    assert_true(abs(s.mean - 5) < 0.1)
+
+    # ...and the variance stays that of the values, for at most 10 of them
+    # (averaged, as it's noisy with so few)
+    s = RunningStats(max_count=10)
+    variances = []
+    for v in np.random.RandomState(1).normal(0, 1, 1000):
+        s.add(v)
+        variances.append(s.variance)
+    assert_equal(s.n, 10)
+    assert_true(0.8 < np.mean(variances[100:]) < 1.2, np.mean(variances[100:]))
+
+def test_bucket():
+    assert_equal(bucket(None, [3, 6]), None)
+    assert_equal(bucket(float('nan'), [3, 6]), None)
+    assert_equal(bucket(2.0, [3, 6]), 0)
+    assert_equal(bucket(4.0, [3, 6]), 1)
+    assert_equal(bucket(7.0, [3, 6]), 2)
+
+def _learn(selector, true_costs, context, n=200):
+    for _ in range(n):
+        name = selector.rank(context)[0]
+        selector.update(context, name, true_costs[name] + random.gauss(0, 1))
+
+def test_ucb1():
+    sel = ProcedureSelector(NAMES, cost_scale=22.5, exploration=0.5)
+    # Untried procedures first, in the given order
+    assert_equal(sel.rank((0, 0)), NAMES)
+    sel.update((0, 0), 'TackBasic', 8)
+    assert_equal(sel.rank((0, 0))[-1], 'TackBasic')
+
+    random.seed(0)
+    costs = {'TackBasic': 12, 'TackSheetOut': 6, 'Tack_IncreaseAngleToWind': 9,
+             'JibeBasic': 22.5}
+    _learn(sel, costs, (0, 0))
+    assert_equal(sel.rank((0, 0))[0], 'TackSheetOut')
+    # Other conditions are kept separately
+    assert_equal(sel.rank((2, None)), NAMES)
+
+def test_thompson():
+    sel = ProcedureSelector(NAMES, method='thompson', cost_scale=22.5,
+                            rng=random.Random(1))
+    random.seed(1)
+    costs = {'TackBasic': 15, 'TackSheetOut': 14, 'Tack_IncreaseAngleToWind': 5,
+             'JibeBasic': 22.5}
+    _learn(sel, costs, (1, 1))
+    firsts = [sel.rank((1, 1))[0] for _ in range(50)]
+    assert_true(firsts.count('Tack_IncreaseAngleToWind') > 45)
+
+def test_save_load():
+    d = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(d, 'stats.json')
+        sel = ProcedureSelector(NAMES)
+        assert_equal(sel.load(fn), False)
+        sel.update((1, None), 'JibeBasic', 7)
+        sel.update((1, None), 'JibeBasic', 9)
+        sel.save(fn)
+
+        sel2 = ProcedureSelector(NAMES)
+        assert_equal(sel2.load(fn), True)
+        s = sel2.stats['1/-']['JibeBasic']
+        assert_equal(s.count, 2)
+        assert_almost_equal(s.mean, 8)
+        assert_equal(sel2.rank((1, None)), sel.rank((1, None)))
+    finally:
+        shutil.rmtree(d)
+
+def test_unknown_method():
+    assert_raises(ValueError, ProcedureSelector, NAMES, method='greedy')
@@ -0,0 +1,71 @@
+import math
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal, assert_true, assert_raises
+
+from sailing_robot.profiling import RollingHistogram, PhaseProfiler, log_edges
+
+def test_log_edges():
+    edges = log_edges(1e-6, 1e-3, per_decade=2)
+    assert_equal(len(edges), 7)
+    assert_almost_equal(edges[-1], 1e-3)
+
+def test_percentiles():
+    values = np.random.RandomState(0).lognormal(np.log(50e-6), 0.5, 5000)
+    h = RollingHistogram()
+    for v in values:
+        h.add(v)
+    s = h.summary()
+    assert_equal(s['n'], 5000)
+    assert_almost_equal(s['mean'], values.mean())
+    assert_equal(s['max'], values.max())
+    for p in (50, 95, 99):
+        # Bins are 26% wide
+        exact = np.percentile(values, p)
+        assert_true(abs(s['p%d' % p] - exact) < 0.15 * exact, (p, s, exact))
+
+def test_window():
+    h = RollingHistogram(window=10)
+    for _ in range(100):
+        h.add(1.0)
+    for _ in range(10):
+        h.add(1e-3)
+    assert_equal(h.n, 10)
+    assert_equal(h.max, 1e-3)
+    assert_almost_equal(h.summary()['mean'], 1e-3)
+    assert_true(h.percentile(99) <= 1e-3)
+
+def test_empty():
+    h = RollingHistogram()
+    assert_equal(h.summary(), None)
+    assert_true(math.isnan(h.percentile(50)))
+
+def test_merge():
+    a, b = PhaseProfiler(), PhaseProfiler()
+    a.record('planner', 1e-5)
+    b.record('planner', 3e-5)
+    b.record('total', 4e-5)
+    a.merge(b)
+    assert_equal(a.phases, ['planner', 'total'])
+    s = a.summary()
+    assert_equal(s['planner']['n'], 2)
+    assert_almost_equal(s['planner']['mean'], 2e-5)
+    assert_equal(s['planner']['max'], 3e-5)
+    assert_equal(len(a.report()), 2)
+
+    with assert_raises(ValueError):
+        PhaseProfiler(window=10).merge(b)
+
+def test_phase_timer():
+    t = [0.0]
+    profiler = PhaseProfiler(clock=lambda: t[0])
+    timer = profiler.start()
+    t[0] = 2e-6
+    timer.lap('a')
+    t[0] = 5e-6
+    timer.lap('b')
+    timer.total()
+    s = profiler.summary()
+    assert_equal(profiler.phases, ['a', 'b', 'total'])
+    assert_almost_equal(s['a']['mean'], 2e-6)
+    assert_almost_equal(s['b']['mean'], 3e-6)
+    assert_almost_equal(s['total']['mean'], 5e-6)
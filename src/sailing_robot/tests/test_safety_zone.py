@@ -0,0 +1,36 @@
+import random
+from nose.tools import assert_equal, assert_almost_equal
+from shapely.geometry import Point, Polygon
+
+from sailing_robot.safety_zone import SafetyZoneIndex
+
+SQUARE = [(0, 0), (100, 0), (100, 100), (0, 100)]
+
+def test_check_levels():
+    idx = SafetyZoneIndex(SQUARE, 5)
+    assert_equal(idx.check(50, 50), (0, 50))
+    status, d = idx.check(50, 2)
+    assert_equal(status, 1)
+    assert_almost_equal(d, 2)
+    status, d = idx.check(50, -3)
+    assert_equal(status, 2)
+    assert_almost_equal(d, -3)
+    assert_equal(idx.check(500, 500)[0], 2)
+
+def test_matches_shapely():
+    zone = Polygon([(0, 0), (100, 0), (130, 60), (60, 120), (-10, 70)])
+    idx = SafetyZoneIndex(zone, 5)
+    inner = zone.buffer(-5)
+    random.seed(42)
+    for _ in range(500):
+        x, y = random.uniform(-30, 150), random.uniform(-30, 150)
+        p = Point(x, y)
+        if p.within(inner):
+            expected = 0
+        elif p.within(zone):
+            expected = 1
+        else:
+            expected = 2
+        assert_equal(idx.check(x, y)[0], expected)
+        assert_almost_equal(abs(idx.signed_distance(x, y)),
+                            zone.exterior.distance(p))
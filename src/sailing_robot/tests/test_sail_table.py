@@ -1,3 +1,5 @@
+import numpy as np
+from numpy.testing import assert_allclose
 from nose.tools import assert_equal, assert_almost_equal
 from sailing_robot.sail_table import SailTable, SailData
 
@@ -16,6 +18,28 @@ def test_sail_table():
     assert_almost_equal(st.interpolate_sail_setting(135), 0.7)
     assert_almost_equal(st.interpolate_sail_setting(190), 0.9)
 
+def test_sail_table_extrapolates_below_first_entry():
+    st = SailTable({'30': 0.2, '90': 0.5, '180': 0.9})
+    assert_almost_equal(st.interpolate_sail_setting(20), 0.2 - 0.05)
+    assert_almost_equal(st.interpolate_sail_setting(0), 0.05)
+
+def test_sail_table_duplicate_directions():
+    # '30' and '030' are both 30 degrees; the later entry applies from there
+    st = SailTable({'0': 0, '30': 0.1, '030': 0.3, '90': 0.6})
+    assert_equal(st.directions, [0, 30, 30, 90])
+    assert_almost_equal(st.interpolate_sail_setting(30), 0.3)
+    assert_almost_equal(st.interpolate_sail_setting(60), 0.45)
+
+def test_sail_table_many_and_dense():
+    table = {'0': 0, '30': 0, '45': 0.2, '90': 0.5, '91': 0.55, '180': 0.9}
+    st = SailTable(table)
+    dense = SailTable(table, dense=True)
+    directions = np.concatenate([np.linspace(-20, 200, 2001), [0, 45, 179.5, 180]])
+    scalar = [st.interpolate_sail_setting(d) for d in directions]
+    assert_allclose(st.interpolate_many(directions), scalar, rtol=0, atol=1e-12)
+    assert_allclose([dense.interpolate_sail_setting(d) for d in directions],
+                    scalar, rtol=0, atol=1e-12)
+
 def test_sail_data():
     st = SailTable(SAMPLE_SAIL_TABLE)
     sd = SailData(st)
@@ -0,0 +1,47 @@
+import math
+import numpy as np
+from nose.tools import assert_equal, assert_less, assert_greater, assert_raises
+
+from sailing_robot.sea_state import SeaStateEstimator
+
+RATE = 100
+
+def _heave_acceleration(amplitude, period, seconds=70, noise=0.3, seed=0):
+    """Vertical acceleration for a sinusoidal heave of the given amplitude"""
+    rng = np.random.RandomState(seed)
+    t = np.arange(seconds * RATE) / float(RATE)
+    w = 2 * math.pi / period
+    return 9.8 + amplitude * w**2 * np.cos(w * t) + rng.normal(0, noise, len(t))
+
+def test_regular_waves():
+    for period, amplitude in [(3, 0.2), (5, 0.5), (8, 1.0)]:
+        est = SeaStateEstimator(RATE)
+        est.extend(_heave_acceleration(amplitude, period))
+        s = est.estimate()
+        assert_less(abs(s.period - period), 0.1 * period)
+        # Hs of a sine is 2*sqrt(2) times its amplitude
+        hs = 2 * math.sqrt(2) * amplitude
+        assert_less(abs(s.hs - hs), 0.25 * hs)
+        assert_greater(s.confidence, 0.8)
+
+def test_irregular_waves_less_confident():
+    rng = np.random.RandomState(1)
+    t = np.arange(70 * RATE) / float(RATE)
+    acc = 9.8 + sum(rng.uniform(0.1, 0.5) * (2 * math.pi * f)**2
+                    * np.cos(2 * math.pi * f * t + rng.uniform(0, 2 * math.pi))
+                    for f in rng.uniform(0.08, 0.5, 20))
+    est = SeaStateEstimator(RATE)
+    est.extend(acc)
+    irregular = est.estimate()
+
+    est = SeaStateEstimator(RATE)
+    est.extend(_heave_acceleration(0.5, 5, noise=0))
+    assert_less(irregular.confidence, est.estimate().confidence)
+
+def test_not_ready():
+    est = SeaStateEstimator(RATE, window=30, segment=10)
+    est.extend(_heave_acceleration(0.5, 5, seconds=29))
+    assert_equal(est.estimate(), None)
+    est.extend(_heave_acceleration(0.5, 5, seconds=1))
+    assert est.estimate() is not None
+    assert_raises(ValueError, SeaStateEstimator, RATE, window=10, segment=20)
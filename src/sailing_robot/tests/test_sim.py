@@ -0,0 +1,44 @@
+import os.path
+import unittest
+
+from sailing_robot.sail_table import SailTable
+from sailing_robot.sim import (apparent_wind, heading_change, BoatSimulator,
+    FastTimeSimulation, load_params, param_group,
+)
+
+PARAMS_DIR = os.path.join(os.path.dirname(__file__), '..', 'launch', 'parameters')
+SAIL_TABLE = SailTable({'0': 0, '30': 0, '90': 0.5, '180': 0.9})
+
+class SimTests(unittest.TestCase):
+    def test_apparent_wind_stationary(self):
+        direction, speed = apparent_wind(90, (0, 0), 180, 5)
+        self.assertAlmostEqual(direction, 90)
+        self.assertAlmostEqual(speed, 5)
+
+    def test_heading_change(self):
+        self.assertEqual(heading_change(0, 1), 0)
+        # Positive rudder angles turn the boat to the left
+        self.assertLess(heading_change(20, 0.5), 0)
+        self.assertGreater(heading_change(-20, 0.5), 0)
+
+    def test_boat_moves_with_heading(self):
+        boat = BoatSimulator(SAIL_TABLE, heading=90, wind_direction=0)
+        for _ in range(100):
+            boat.step(0.1)
+        self.assertAlmostEqual(boat.time, 10)
+        self.assertGreater(boat.x, 5)
+        self.assertAlmostEqual(boat.y, 0)
+
+    def test_param_group(self):
+        params = {'rudder/control/Kp': 1, 'rudder/maxAngle': 30, 'other': 2}
+        self.assertEqual(param_group(params, 'rudder'),
+                         {'control': {'Kp': 1}, 'maxAngle': 30})
+
+    def test_run_course(self):
+        params = load_params(*[os.path.join(PARAMS_DIR, f) for f in
+            ['default.yaml', 'simulator.yaml', 'sailsettings_laser.yaml',
+             'Calshot_TriangleRace.yaml']])
+        sim = FastTimeSimulation.from_params(params)
+        res = sim.run(1800)
+        self.assertTrue(res.finished)
+        self.assertGreater(res.tacks, 0)
@@ -37,3 +37,22 @@ class TasksTests(unittest.TestCase):
         self.assertIsInstance(tr.active_task, HeadingPlan)
         #tr.start_next_task()
         #self.assertIsInstance(tr.active_task, StationKeeping)
+
+    def test_profiling(self):
+        nav = Navigation(utm_zone=30)
+        nav.set_position(50.9365, -1.4050)
+        nav.heading = 90
+        nav.wind_direction = 45
+        tr = TasksRunner(tasks_def_1, nav)
+        tr.start_next_task()
+        expected = tr.calculate_state_and_goal()
+
+        profiler = tr.enable_profiling()
+        self.assertEqual(tr.calculate_state_and_goal(), expected)
+        self.assertEqual(profiler.phases, ['process_jump', 'check_end_condition',
+                'check_safety_zone', 'debug_pub', 'planner', 'total'])
+        self.assertEqual(profiler.summary()['total']['n'], 1)
+
+        tr.disable_profiling()
+        self.assertEqual(tr.calculate_state_and_goal(), expected)
+        self.assertEqual(profiler.summary()['total']['n'], 1)
@@ -0,0 +1,83 @@
+import math
+from nose.tools import assert_equal, assert_almost_equal, assert_true
+
+from sailing_robot.tracing import Tracer, TraceCollector, TraceRecord
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+def make_pipeline():
+    clock = FakeClock()
+    records = []
+    sensor = Tracer('/imu', '/heading', publish=records.append, clock=clock)
+    tasks = Tracer('/tasks', '/goal_heading', ['/heading'],
+                   publish=records.append, clock=clock)
+    helming = Tracer('/helming', '/rudder_control', ['/heading', '/goal_heading'],
+                     publish=records.append, clock=clock)
+    return clock, records, sensor, tasks, helming
+
+def test_pipeline():
+    clock, records, sensor, tasks, helming = make_pipeline()
+    start = sensor.start(t_read=clock.t - 0.002)
+    assert_equal(start.path, '/heading')
+
+    clock.t += 0.001
+    tasks.receive(start)
+    helming.receive(start)
+    clock.t += 0.01
+    tasks.forward()
+    goal = records[-1]
+    assert_equal(goal.path, '/heading>/goal_heading')
+    assert_equal(goal.trace_id, start.trace_id)
+    assert_almost_equal(goal.published - goal.received, 0.01)
+
+    helming.receive(goal)
+    clock.t += 0.02
+    helming.forward()
+    paths = sorted(r.path for r in records[-2:])
+    assert_equal(paths, ['/heading>/goal_heading>/rudder_control',
+                         '/heading>/rudder_control'])
+
+    collector = TraceCollector()
+    for r in records:
+        collector.add(r)
+    s = collector.summary()
+    assert_almost_equal(s['pipeline']['/heading>/goal_heading>/rudder_control']['p50'],
+                        0.033)
+    assert_almost_equal(s['processing']['/tasks']['max'], 0.01)
+    assert_equal(len(collector.report()), 6)
+
+    # Nothing new to pass on
+    n = len(records)
+    tasks.forward()
+    assert_equal(len(records), n)
+
+def test_ignores_other_topics():
+    clock, records, sensor, tasks, helming = make_pipeline()
+    tasks.receive(TraceRecord(0, '/position', '/gps', clock.t, clock.t, clock.t))
+    tasks.forward()
+    assert_equal(records, [])
+
+def test_trace_after_data():
+    clock, records, sensor, tasks, helming = make_pipeline()
+    start = sensor.start()
+    clock.t += 0.005
+    tasks.forward()
+    clock.t += 0.001
+    tasks.receive(start)
+    assert_equal(len(records), 2)
+    assert_almost_equal(records[-1].published, start.published + 0.005)
+    assert_true(math.isnan(records[-1].received))
+    # The next reading's trace isn't matched to the same output
+    clock.t += 0.01
+    tasks.receive(sensor.start())
+    assert_equal(len(records), 3)
+
+    collector = TraceCollector()
+    for r in records:
+        collector.add(r)
+    assert_true('/tasks' not in collector.processing)
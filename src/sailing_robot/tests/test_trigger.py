@@ -0,0 +1,66 @@
+import threading
+import time
+from nose.tools import assert_equal, assert_almost_equal, assert_true
+
+from sailing_robot.trigger import EventTrigger
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+def test_time_to_next():
+    clock = FakeClock()
+    trigger = EventTrigger(rate=10, max_rate=50, clock=clock)
+    assert_equal(trigger.wait(), [])
+    # Nothing new: wait for the heartbeat
+    assert_almost_equal(trigger.time_to_next(clock.t), 0.1)
+
+    clock.t += 0.005
+    trigger.notify('heading')
+    assert_almost_equal(trigger.time_to_next(clock.t), 0.015)
+    clock.t += 0.05
+    assert_equal(trigger.time_to_next(clock.t), 0)
+
+def test_fixed_rate_ignores_data():
+    clock = FakeClock()
+    trigger = EventTrigger(rate=10, max_rate=50, event_driven=False, clock=clock)
+    trigger.wait()
+    trigger.notify('heading')
+    clock.t += 0.05
+    assert_almost_equal(trigger.time_to_next(clock.t), 0.05)
+
+def test_coalesce_and_latency():
+    clock = FakeClock()
+    trigger = EventTrigger(rate=10, clock=clock)
+    trigger.notify('heading')
+    clock.t += 0.01
+    trigger.notify('heading')
+    trigger.notify('wind')
+    assert_equal(trigger.coalesced, 1)
+    assert_equal(trigger.wait(), ['heading', 'wind'])
+    clock.t += 0.002
+    # Latency is counted from the oldest sample used
+    assert_almost_equal(trigger.done(), 0.012)
+    assert_equal(len(trigger.latency), 1)
+
+    # A heartbeat run with no new data records nothing
+    clock.t += 0.1
+    assert_equal(trigger.wait(), [])
+    assert_equal(trigger.done(), None)
+    assert_equal(len(trigger.latency), 1)
+
+def test_timeout():
+    trigger = EventTrigger(rate=1)
+    trigger.wait()
+    assert_equal(trigger.wait(timeout=0.01), None)
+
+def test_wakes_on_notify():
+    trigger = EventTrigger(rate=0.5, max_rate=1000)
+    trigger.wait()
+    threading.Timer(0.02, trigger.notify, ['heading']).start()
+    start = time.time()
+    assert_equal(trigger.wait(timeout=1), ['heading'])
+    assert_true(time.time() - start < 0.5)
@@ -0,0 +1,47 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from nose.tools import assert_equal, assert_almost_equal
+from scipy.signal import argrelextrema
+
+from sailing_robot.wave_period import (savgol_coeffs, savitzky_golay,
+                                       WavePeriodDetector)
+
+def _signal(n=2000, rate=100, period=4.0, noise=0.3, seed=0):
+    rng = np.random.RandomState(seed)
+    t = np.arange(n) / float(rate)
+    return 9.8 + 1.5 * np.sin(2 * np.pi * t / period) + rng.normal(0, noise, n)
+
+def test_savgol_coeffs():
+    c = savgol_coeffs(5, 2)
+    assert_allclose(c, np.array([-3, 12, 17, 12, -3]) / 35.)
+    # Preserves polynomials up to the order
+    x = np.arange(-25, 26, dtype=float)
+    assert_almost_equal(np.dot(savgol_coeffs(51, 3), 0.1 * x**3 - x + 2), 2)
+
+def test_online_matches_full_window():
+    y = _signal()
+    det = WavePeriodDetector(rate=100)
+    smoothed = [det.update(v) for v in y]
+    assert_equal(smoothed[:50], [None] * 50)
+    full = savitzky_golay(y, 51, 3)
+    # Away from the padded ends, the smoothed values are the same
+    assert_allclose(smoothed[50:], full[25:-25], rtol=1e-12)
+
+    # Same extrema as argrelextrema finds in the same span
+    interior = full[25:-25]
+    maxima = argrelextrema(interior, np.greater)[0] + 25
+    minima = argrelextrema(interior, np.less)[0] + 25
+    oldest = len(y) - det.history
+    assert_equal(list(det.maxima), [i for i in maxima if i >= oldest])
+    assert_equal(list(det.minima), [i for i in minima if i >= oldest])
+
+def test_period():
+    det = WavePeriodDetector(rate=100)
+    assert_equal(det.period(), None)
+    assert_equal(det.position(), None)
+    det.extend(_signal(period=2.4, noise=0))
+    assert_almost_equal(det.period(), 2.4, places=2)
+    assert_almost_equal(det.crossing_period(), 2.4, places=2)
+    # Minima of the sine at 1.8s + 2.4s * n; the last before 20s is at 18.6s
+    assert_almost_equal(det.time_since_minimum(), 1.4, places=2)
+    assert_almost_equal(det.position(), 1.4 / 2.4, places=2)
@@ -0,0 +1,49 @@
+import math
+import numpy as np
+from nose.tools import assert_equal, assert_less
+
+from sailing_robot.wave_position import Wave_position_pll
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+def _wave_distance(a, b):
+    """Distance between two positions on the wave (0-1), wrapping at 1"""
+    d = abs(a - b) % 1
+    return min(d, 1 - d)
+
+def test_pll_tracks_wave():
+    rate = 100
+    rng = np.random.RandomState(0)
+    for wave_freq in (0.7, 1.2, 2.0):
+        clock = FakeClock()
+        wp = Wave_position_pll(rate, 2.5, clock=clock)
+        assert_equal(wp.get_position(), "initializing")
+        errors = []
+        for i in range(120 * rate):
+            clock.t = i / float(rate)
+            phase = wave_freq * clock.t + 0.3
+            wp.update(9.8 + 1.5 * math.cos(phase) + rng.normal(0, 0.5))
+            if clock.t > 60:
+                # Predict a little ahead of the latest reading
+                clock.t += 0.05
+                expected = ((phase + wave_freq * 0.05) / (2 * math.pi)) % 1
+                pos = wp.get_position()
+                assert 0 <= pos < 1
+                errors.append(_wave_distance(pos, expected))
+        assert_less(abs(wp.wave_frequency - wave_freq), 0.1)
+        assert_less(abs(wp.amplitude - 1.5), 0.2)
+        assert_less(np.mean(errors), 0.03)  # about 10 degrees
+
+def test_pll_initializing():
+    clock = FakeClock()
+    wp = Wave_position_pll(10, 2.5, clock=clock)
+    for i in range(24):
+        wp.update(9.8)
+        assert_equal(wp.get_position(), "initializing")
+    wp.update(9.8)
+    assert 0 <= wp.get_position() < 1
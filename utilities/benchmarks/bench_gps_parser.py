@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""Throughput benchmark for gps_utils.UbxNmeaParser
+
+Feeds raw GPS logs (the gps-raw-nmea_* files written by sensor_driver_gps)
+through the parser in chunks, the way the driver reads the serial port, and
+reports MB/s and messages/s. The parser as it was before it used a bytearray
+with a read cursor is included for comparison.
+
+Usage:
+    python bench_gps_parser.py [files...] [--chunk 64] [--bursty]
+
+With no files, it reads ~/sailing-robot/gps-raw-nmea_*, or makes up a
+stream of NMEA and UBX messages if there are no logs there either.
+--framing-only skips the NMEA field parsing, to measure just splitting the
+stream into messages.
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import os.path
+import random
+import struct
+import timeit
+
+from pynmea2 import ParseError, ChecksumError
+
+from sailing_robot import gps_utils
+from sailing_robot.gps_utils import UBXMessage, UbxNmeaParser
+
+
+class LegacyUbxNmeaParser(object):
+    """UbxNmeaParser as it was, keeping the buffer as immutable bytes"""
+    def __init__(self):
+        self.buf = b''
+
+    def feed(self, data):
+        self.buf += data
+
+    def _take_chunk(self, n):
+        c, self.buf = self.buf[:n], self.buf[n:]
+        return c
+
+    def _take_nmea(self):
+        crlf_ix = self.buf.find(b'\r\n')
+        if crlf_ix == -1:
+            return None
+        data = self._take_chunk(crlf_ix + 2)
+        return gps_utils.NMEASentence.parse(data.decode('ascii'))
+
+    def _take_ubx(self):
+        if len(self.buf) < 6:
+            return None
+        payload_length = struct.unpack('<H', self.buf[4:6])[0]
+        msg_length = payload_length + 8
+        if len(self.buf) >= msg_length:
+            return self._take_chunk(msg_length)
+
+    def _next_msg(self):
+        nmea_start = self.buf.find(b'$')
+        ubx_start = self.buf.find(b'\xb5b')
+        if nmea_start == 0:
+            return self._take_nmea()
+        elif ubx_start == 0:
+            return self._take_ubx()
+        elif (nmea_start > 0) and (ubx_start > 0):
+            return self._take_chunk(min(nmea_start, ubx_start))
+        elif nmea_start > 0:
+            return self._take_chunk(nmea_start)
+        elif ubx_start > 0:
+            return self._take_chunk(ubx_start)
+
+    def get_msgs(self):
+        return iter(self._next_msg, None)
+
+
+class NoParse(object):
+    """Stands in for NMEASentence with --framing-only"""
+    @staticmethod
+    def parse(line):
+        return line
+
+
+def synthetic_stream(seconds=3600):
+    """About an hour of 5Hz output with NMEA and UBX messages mixed"""
+    gga = (b'$GPGGA,092750.000,5321.6802,N,00630.3372,W,1,8,1.03,61.7,M,'
+           b'55.2,M,,*76\r\n')
+    vtg = b'$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n'
+    zda = b'$GPZDA,092750.00,12,10,2017,00,00*69\r\n'
+    nav_pvt = UBXMessage(b'\x01\x07', b'\x00' * 92).serialise()[:-2]
+    return (gga + vtg + nav_pvt + zda) * (seconds * 5)
+
+
+def load_logs(filenames):
+    data = []
+    for fn in filenames:
+        with open(fn, 'rb') as f:
+            data.append(f.read())
+    return b''.join(data)
+
+
+def make_chunks(data, chunk, bursty):
+    if not bursty:
+        return [data[i:i+chunk] for i in range(0, len(data), chunk)]
+    # Bursts of up to 64 reads' worth of data at once, as happens when the
+    # node is held up and the serial buffer fills.
+    chunks = []
+    i = 0
+    while i < len(data):
+        n = chunk * random.choice([1, 1, 1, 4, 16, 64])
+        chunks.append(data[i:i+n])
+        i += n
+    return chunks
+
+
+def bench(parser_cls, chunks, repeat):
+    counts = []
+    def run():
+        parser = parser_cls()
+        n = 0
+        for c in chunks:
+            parser.feed(c)
+            # Recover from bad data like sensor_driver_gps does
+            try:
+                for _ in parser.get_msgs():
+                    n += 1
+            except (ParseError, ChecksumError, UnicodeError):
+                parser = parser_cls()
+        counts.append(n)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best, counts[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--chunk', type=int, default=64,
+                        help="bytes per read (sensor_driver_gps reads 64)")
+    parser.add_argument('--bursty', action='store_true',
+                        help="sometimes deliver many reads' worth at once")
+    parser.add_argument('--framing-only', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(
+                os.path.expanduser('~/sailing-robot/gps-raw-nmea_*')))
+    if files:
+        data = load_logs(files)
+        print('{} log file(s), {:.2f} MB'.format(len(files), len(data) / 1e6))
+    else:
+        data = synthetic_stream()
+        print('No logs found; synthetic stream of {:.2f} MB'.format(len(data) / 1e6))
+
+    if args.framing_only:
+        gps_utils.NMEASentence = NoParse
+
+    random.seed(0)
+    chunks = make_chunks(data, args.chunk, args.bursty)
+
+    cases = [
+        ('legacy (bytes)', LegacyUbxNmeaParser),
+        ('UbxNmeaParser', UbxNmeaParser),
+    ]
+    results = []
+    for name, cls in cases:
+        t, n = bench(cls, chunks, args.repeat)
+        results.append(t)
+        print('{:16s} {:8.2f} MB/s {:10.0f} msgs/s  ({} msgs)'.format(
+            name, len(data) / t / 1e6, n / t, n))
+
+    print('speedup: {:.1f}x'.format(results[0] / results[1]))
+
+
+if __name__ == '__main__':
+    main()
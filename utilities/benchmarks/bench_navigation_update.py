@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Micro-benchmark for Navigation.update_position
+
+Compares the old update path (a LatLon object and a shapely Point built for
+every fix) with the current one (plain floats, views built on demand), and
+shows what fraction of one control tick each costs.
+
+Usage:
+    python bench_navigation_update.py [--rate 10] [--slowdown 1] [-n 20000]
+
+Run it on the Pi itself with --slowdown 1. On a desktop machine, --slowdown
+scales the timings by a rough factor (a Pi 3 core is ~10x slower than a
+modern laptop core) to estimate the Pi budget.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from LatLon23 import LatLon
+from shapely.geometry import Point
+
+from sailing_robot.navigation import Navigation
+
+
+class Fix(object):
+    def __init__(self, lat, lon):
+        self.latitude = lat
+        self.longitude = lon
+
+
+def legacy_update_position(nav, msg):
+    """The update path as it was before positions were stored as floats"""
+    nav.position_ll = LatLon(msg.latitude, msg.longitude)
+    x, y = nav.latlon_to_utm(msg.latitude, msg.longitude)
+    nav.position_xy = Point(x, y)
+
+
+def make_fixes(n):
+    return [Fix(50.8 + random.uniform(-0.01, 0.01),
+                1.02 + random.uniform(-0.01, 0.01)) for _ in range(n)]
+
+
+def bench(func, nav, fixes, repeat):
+    def run():
+        for msg in fixes:
+            func(nav, msg)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(fixes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=20000, help="fixes per run")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rate', type=float, default=10,
+                        help="control loop rate in Hz (config/rate)")
+    parser.add_argument('--slowdown', type=float, default=1,
+                        help="multiply timings to estimate a slower CPU")
+    args = parser.parse_args()
+
+    nav = Navigation()
+    fixes = make_fixes(args.n)
+    tick = 1.0 / args.rate
+
+    cases = [
+        ('legacy (LatLon + Point)', legacy_update_position),
+        ('update_position (floats)', Navigation.update_position),
+    ]
+    results = []
+    for name, func in cases:
+        per_update = bench(func, nav, fixes, args.repeat) * args.slowdown
+        results.append(per_update)
+        print('{:28s} {:8.2f} us/update  {:6.3f}% of a {:g} Hz tick'.format(
+            name, per_update * 1e6, 100 * per_update / tick, args.rate))
+
+    print('speedup: {:.1f}x'.format(results[0] / results[1]))
+
+
+if __name__ == '__main__':
+    main()
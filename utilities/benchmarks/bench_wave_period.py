@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""CPU cost of the wave_period node's calculation, old and new
+
+The wave_period node used to smooth its whole 500 reading window with a
+freshly calculated Savitzky-Golay filter and search it for extrema 10 times
+a second. It now uses sailing_robot.wave_period.WavePeriodDetector, which
+does a little work for each reading. This replays vertical acceleration
+through both, at the node's 10 Hz publishing rate, and reports the time
+spent per second of data.
+
+Usage:
+    python bench_wave_period.py [recording.bag | acc_z.txt ...] [--rate 100]
+
+.bag files are read with rosbag, taking linear_acceleration.z from /imu/data.
+Text files have one reading per line (or the last column is used). With no
+files, it makes up an hour of noisy 4s waves.
+"""
+from __future__ import division, print_function
+
+import argparse
+import collections
+import timeit
+from math import factorial
+
+import numpy as np
+from scipy.signal import argrelextrema
+
+from sailing_robot.wave_period import WavePeriodDetector
+
+
+def legacy_savitzky_golay(y, window_size, order, deriv=0, rate=1):
+    """savitzky_golay as it was in the node (np.int and np.mat are gone
+    from recent numpy, so this uses int and np.asmatrix)"""
+    window_size = np.abs(int(window_size))
+    order = np.abs(int(order))
+    order_range = range(order+1)
+    half_window = (window_size -1) // 2
+    b = np.asmatrix([[k**i for i in order_range] for k in range(-half_window, half_window+1)])
+    m = np.linalg.pinv(b).A[deriv] * rate**deriv * factorial(deriv)
+    firstvals = y[0] - np.abs( y[1:half_window+1][::-1] - y[0] )
+    lastvals = y[-1] + np.abs(y[-half_window-1:-1][::-1] - y[-1])
+    y = np.concatenate((firstvals, y, lastvals))
+    return np.convolve( m[::-1], y, mode='valid')
+
+
+def legacy_run(data, rate):
+    acc_z = collections.deque(maxlen=500)
+    every = int(rate // 10)
+    out = []
+    for i, v in enumerate(data):
+        acc_z.append(v)
+        if i % every or len(acc_z) < 500:
+            continue
+        signal = np.array(acc_z)
+        smooth = legacy_savitzky_golay(signal, 51, 3)
+        index_max = argrelextrema(smooth, np.greater)[0]
+        index_min = argrelextrema(smooth, np.less)[0]
+        wave_period_max = (index_max[-1]-index_max[0])/(len(index_max)-1)
+        wave_period_min = (index_min[-1]-index_min[0])/(len(index_min)-1)
+        wave_period = (wave_period_max + wave_period_min)/2.0/rate
+        t_cress = (len(signal) - index_min[-1]) / rate
+        out.append(t_cress/wave_period)
+    return out
+
+
+def detector_run(data, rate):
+    det = WavePeriodDetector(rate=rate)
+    every = int(rate // 10)
+    out = []
+    for i, v in enumerate(data):
+        det.update(v)
+        if i % every == 0:
+            out.append(det.position())
+    return out
+
+
+def load(filenames):
+    values = []
+    for fn in filenames:
+        if fn.endswith('.bag'):
+            import rosbag
+            with rosbag.Bag(fn) as bag:
+                for _, msg, _ in bag.read_messages(topics=['/imu/data']):
+                    values.append(msg.linear_acceleration.z)
+        else:
+            a = np.loadtxt(fn, ndmin=2)
+            values.extend(a[:, -1])
+    return np.array(values)
+
+
+def synthetic(seconds, rate):
+    rng = np.random.RandomState(0)
+    t = np.arange(int(seconds * rate)) / rate
+    return 9.8 + 1.5 * np.sin(2 * np.pi * t / 4.0) + rng.normal(0, 0.3, len(t))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--rate', type=float, default=100,
+                        help="IMU reading rate in Hz")
+    parser.add_argument('--seconds', type=float, default=600,
+                        help="length of the synthetic recording")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.files:
+        data = load(args.files)
+        print('{} readings from {} file(s)'.format(len(data), len(args.files)))
+    else:
+        data = synthetic(args.seconds, args.rate)
+        print('No recordings given; {:.0f}s of synthetic waves'.format(args.seconds))
+    data = [float(v) for v in data]
+    seconds = len(data) / args.rate
+
+    results = []
+    for name, fn in [('legacy (full window)', legacy_run),
+                     ('WavePeriodDetector', detector_run)]:
+        t = min(timeit.repeat(lambda: fn(data, args.rate), number=1,
+                              repeat=args.repeat))
+        results.append(t)
+        print('{:22s} {:8.3f} ms CPU per second of data'.format(
+            name, t / seconds * 1e3))
+
+    print('speedup: {:.1f}x'.format(results[0] / results[1]))
+
+
+if __name__ == '__main__':
+    main()